@@ -0,0 +1,120 @@
+"""Store FAQ embeddings as binary vectors instead of JSON
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+Existing databases were created by init_db() with JSON embedding columns.
+This revision adds binary columns, re-encodes every row in batches, and then
+swaps the new columns into place. Databases created after the change already
+have binary columns and are left untouched.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+from app.models.embedding import encode_embedding, coerce_embedding
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def _embedding_columns_are_binary(bind) -> bool:
+    inspector = sa.inspect(bind)
+    if "faqs" not in inspector.get_table_names():
+        return True
+    columns = {column["name"]: column for column in inspector.get_columns("faqs")}
+    return isinstance(columns["question_embedding"]["type"], sa.LargeBinary)
+
+
+def _copy_embeddings(bind, source_type, target_type, convert):
+    faqs = sa.table(
+        "faqs",
+        sa.column("id", sa.Integer),
+        sa.column("question_embedding", source_type),
+        sa.column("answer_embedding", source_type),
+        sa.column("question_embedding_new", target_type),
+        sa.column("answer_embedding_new", target_type),
+    )
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(faqs.c.id, faqs.c.question_embedding, faqs.c.answer_embedding)
+            .where(faqs.c.id > last_id)
+            .order_by(faqs.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        bind.execute(
+            faqs.update()
+            .where(faqs.c.id == sa.bindparam("faq_id"))
+            .values(
+                question_embedding_new=sa.bindparam("question"),
+                answer_embedding_new=sa.bindparam("answer"),
+            ),
+            [
+                {
+                    "faq_id": row.id,
+                    "question": convert(row.question_embedding),
+                    "answer": convert(row.answer_embedding),
+                }
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+
+def _swap_columns(target_type):
+    with op.batch_alter_table("faqs") as batch_op:
+        batch_op.drop_column("question_embedding")
+        batch_op.drop_column("answer_embedding")
+        batch_op.alter_column(
+            "question_embedding_new", new_column_name="question_embedding", existing_type=target_type
+        )
+        batch_op.alter_column(
+            "answer_embedding_new", new_column_name="answer_embedding", existing_type=target_type
+        )
+
+
+def _to_binary(value):
+    vector = coerce_embedding(value)
+    return None if vector is None else encode_embedding(vector)
+
+
+def _to_json(value):
+    vector = coerce_embedding(value)
+    return None if vector is None else json.dumps(vector.astype(float).tolist())
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if _embedding_columns_are_binary(bind):
+        return
+
+    with op.batch_alter_table("faqs") as batch_op:
+        batch_op.add_column(sa.Column("question_embedding_new", sa.LargeBinary()))
+        batch_op.add_column(sa.Column("answer_embedding_new", sa.LargeBinary()))
+
+    _copy_embeddings(bind, sa.Text(), sa.LargeBinary(), _to_binary)
+    _swap_columns(sa.LargeBinary())
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if not _embedding_columns_are_binary(bind):
+        return
+
+    with op.batch_alter_table("faqs") as batch_op:
+        batch_op.add_column(sa.Column("question_embedding_new", sa.JSON()))
+        batch_op.add_column(sa.Column("answer_embedding_new", sa.JSON()))
+
+    _copy_embeddings(bind, sa.LargeBinary(), sa.Text(), _to_json)
+    _swap_columns(sa.JSON())
@@ -0,0 +1,64 @@
+"""Composite indexes for conversation, message and FAQ access patterns
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+- messages (conversation_id, created_at, id): the history window query
+- conversations (user_id, last_message_at): a user's recent conversations
+- faqs (status, language, category_id): FAQ retrieval filters
+
+On PostgreSQL the indexes are built concurrently so large tables stay
+writable. Indexes that already exist (databases created by init_db() after
+the models declared them) are skipped.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_messages_conversation_created", "messages", ["conversation_id", "created_at", "id"]),
+    ("ix_conversations_user_last_message", "conversations", ["user_id", "last_message_at"]),
+    ("ix_faqs_status_language_category", "faqs", ["status", "language", "category_id"]),
+]
+
+
+def _existing_indexes(bind):
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    return tables, {
+        (table, index["name"])
+        for table in tables
+        for index in inspector.get_indexes(table)
+    }
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    tables, existing = _existing_indexes(bind)
+    concurrently = bind.dialect.name == "postgresql"
+
+    for name, table, columns in INDEXES:
+        if table not in tables or (table, name) in existing:
+            continue
+        if concurrently:
+            # CREATE INDEX CONCURRENTLY can't run inside a transaction
+            with op.get_context().autocommit_block():
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+        else:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    tables, existing = _existing_indexes(bind)
+
+    for name, table, _ in INDEXES:
+        if (table, name) in existing:
+            op.drop_index(name, table_name=table)
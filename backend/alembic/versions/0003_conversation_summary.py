@@ -0,0 +1,52 @@
+"""Rolling conversation summaries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds conversations.summary and conversations.summary_message_count. Existing
+conversations start without a summary and are summarized as they continue.
+Columns that already exist (databases created by init_db()) are skipped.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns(bind):
+    inspector = sa.inspect(bind)
+    if "conversations" not in inspector.get_table_names():
+        return None
+    return {column["name"] for column in inspector.get_columns("conversations")}
+
+
+def upgrade() -> None:
+    columns = _existing_columns(op.get_bind())
+    if columns is None:
+        return
+
+    with op.batch_alter_table("conversations") as batch_op:
+        if "summary" not in columns:
+            batch_op.add_column(sa.Column("summary", sa.Text(), nullable=True))
+        if "summary_message_count" not in columns:
+            batch_op.add_column(
+                sa.Column("summary_message_count", sa.Integer(), nullable=True, server_default=sa.text("0"))
+            )
+
+
+def downgrade() -> None:
+    columns = _existing_columns(op.get_bind())
+    if columns is None:
+        return
+
+    with op.batch_alter_table("conversations") as batch_op:
+        if "summary_message_count" in columns:
+            batch_op.drop_column("summary_message_count")
+        if "summary" in columns:
+            batch_op.drop_column("summary")
@@ -0,0 +1,96 @@
+"""Tag FAQ embeddings with the model that produced them
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds faqs.embedding_model (indexed, so rows still on an old model can be
+found for re-embedding) and fills it from the model id in each binary
+embedding's header. Rows without a readable header or model id stay NULL
+and are re-embedded by the next re-embedding job. A column or index that
+already exists (databases created by init_db()) is skipped.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.models.embedding import embedding_model, is_encoded_embedding
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+INDEX_NAME = "ix_faqs_embedding_model"
+
+
+def _existing(bind):
+    inspector = sa.inspect(bind)
+    if "faqs" not in inspector.get_table_names():
+        return None, None
+    columns = {column["name"] for column in inspector.get_columns("faqs")}
+    indexes = {index["name"] for index in inspector.get_indexes("faqs")}
+    return columns, indexes
+
+
+def _backfill(bind):
+    faqs = sa.table(
+        "faqs",
+        sa.column("id", sa.Integer),
+        sa.column("question_embedding", sa.LargeBinary),
+        sa.column("embedding_model", sa.String),
+    )
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(faqs.c.id, faqs.c.question_embedding)
+            .where(faqs.c.id > last_id, faqs.c.embedding_model.is_(None))
+            .order_by(faqs.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        tagged = [
+            {"faq_id": row.id, "model": model}
+            for row in rows
+            if is_encoded_embedding(row.question_embedding)
+            and (model := embedding_model(bytes(row.question_embedding)))
+        ]
+        if tagged:
+            bind.execute(
+                faqs.update()
+                .where(faqs.c.id == sa.bindparam("faq_id"))
+                .values(embedding_model=sa.bindparam("model")),
+                tagged,
+            )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    columns, indexes = _existing(bind)
+    if columns is None:
+        return
+
+    if "embedding_model" not in columns:
+        with op.batch_alter_table("faqs") as batch_op:
+            batch_op.add_column(sa.Column("embedding_model", sa.String(255), nullable=True))
+    if INDEX_NAME not in indexes:
+        op.create_index(INDEX_NAME, "faqs", ["embedding_model"])
+    _backfill(bind)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    columns, indexes = _existing(bind)
+    if columns is None:
+        return
+
+    if INDEX_NAME in indexes:
+        op.drop_index(INDEX_NAME, table_name="faqs")
+    if "embedding_model" in columns:
+        with op.batch_alter_table("faqs") as batch_op:
+            batch_op.drop_column("embedding_model")
@@ -0,0 +1,91 @@
+"""Content hashes of embedded FAQ texts
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds faqs.question_hash and faqs.answer_hash, the content_hash of the text
+each stored embedding was computed from, so updates can skip re-embedding
+text that didn't change. Existing embeddings are assumed to match their
+current text; rows without an embedding keep a NULL hash. Columns that
+already exist (databases created by init_db()) are skipped.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.models.faq import content_hash
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+FIELDS = ("question", "answer")
+
+
+def _columns(bind):
+    inspector = sa.inspect(bind)
+    if "faqs" not in inspector.get_table_names():
+        return None
+    return {column["name"] for column in inspector.get_columns("faqs")}
+
+
+def _backfill(bind, field):
+    faqs = sa.table(
+        "faqs",
+        sa.column("id", sa.Integer),
+        sa.column(field, sa.Text),
+        sa.column(f"{field}_embedding", sa.LargeBinary),
+        sa.column(f"{field}_hash", sa.String),
+    )
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(faqs.c.id, faqs.c[field])
+            .where(
+                faqs.c.id > last_id,
+                faqs.c[f"{field}_embedding"].isnot(None),
+                faqs.c[f"{field}_hash"].is_(None),
+            )
+            .order_by(faqs.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        bind.execute(
+            faqs.update()
+            .where(faqs.c.id == sa.bindparam("faq_id"))
+            .values({f"{field}_hash": sa.bindparam("text_hash")}),
+            [{"faq_id": row.id, "text_hash": content_hash(row[1])} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    columns = _columns(bind)
+    if columns is None:
+        return
+
+    with op.batch_alter_table("faqs") as batch_op:
+        for field in FIELDS:
+            if f"{field}_hash" not in columns:
+                batch_op.add_column(sa.Column(f"{field}_hash", sa.String(64), nullable=True))
+    for field in FIELDS:
+        _backfill(bind, field)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    columns = _columns(bind)
+    if columns is None:
+        return
+
+    with op.batch_alter_table("faqs") as batch_op:
+        for field in FIELDS:
+            if f"{field}_hash" in columns:
+                batch_op.drop_column(f"{field}_hash")
@@ -0,0 +1,52 @@
+"""Per-user FAQ feedback
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds faq_feedback, one row per user and FAQ with the helpful vote and any
+comment. The aggregate helpful/not helpful counts on faqs stay as they are;
+feedback counted before this revision has no per-user rows. The table is
+skipped if it already exists (databases created by init_db()).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(bind) -> bool:
+    return "faq_feedback" in sa.inspect(bind).get_table_names()
+
+
+def upgrade() -> None:
+    if _has_table(op.get_bind()):
+        return
+
+    op.create_table(
+        "faq_feedback",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("faq_id", sa.Integer(), sa.ForeignKey("faqs.id"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("is_helpful", sa.Boolean(), nullable=False),
+        sa.Column("feedback_text", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.UniqueConstraint("faq_id", "user_id", name="uq_faq_feedback_faq_user"),
+    )
+    op.create_index("ix_faq_feedback_id", "faq_feedback", ["id"])
+    op.create_index("ix_faq_feedback_user_id", "faq_feedback", ["user_id"])
+
+
+def downgrade() -> None:
+    if not _has_table(op.get_bind()):
+        return
+
+    op.drop_index("ix_faq_feedback_user_id", table_name="faq_feedback")
+    op.drop_index("ix_faq_feedback_id", table_name="faq_feedback")
+    op.drop_table("faq_feedback")
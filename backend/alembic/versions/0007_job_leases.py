@@ -0,0 +1,40 @@
+"""Cross-worker job leases
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds job_leases, named locks with an expiry that let one worker run a
+background job (FAQ re-embedding) while the others wait for it. The table
+is skipped if it already exists (databases created by init_db()).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(bind) -> bool:
+    return "job_leases" in sa.inspect(bind).get_table_names()
+
+
+def upgrade() -> None:
+    if _has_table(op.get_bind()):
+        return
+
+    op.create_table(
+        "job_leases",
+        sa.Column("name", sa.String(100), primary_key=True),
+        sa.Column("owner", sa.String(255), nullable=False),
+        sa.Column("expires_at", sa.Float(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    if _has_table(op.get_bind()):
+        op.drop_table("job_leases")
@@ -0,0 +1,39 @@
+"""Reserved id blocks
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds id_blocks, one counter per table whose ids are reserved in blocks
+before the rows are written (chat messages queued for write-behind). The
+table is skipped if it already exists (databases created by init_db()).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(bind) -> bool:
+    return "id_blocks" in sa.inspect(bind).get_table_names()
+
+
+def upgrade() -> None:
+    if _has_table(op.get_bind()):
+        return
+
+    op.create_table(
+        "id_blocks",
+        sa.Column("name", sa.String(100), primary_key=True),
+        sa.Column("next_id", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    if _has_table(op.get_bind()):
+        op.drop_table("id_blocks")
@@ -1,7 +1,9 @@
 from .auth import router as auth_router
 from .chat import router as chat_router
+from .faq import router as faq_router
 
 __all__ = [
     "auth_router",
-    "chat_router"
+    "chat_router",
+    "faq_router"
 ] 
\ No newline at end of file
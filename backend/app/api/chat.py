@@ -1,13 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from app.database import get_db
+from app.database import get_db, AsyncSessionLocal
 from app.models.user import User
-from app.models.conversation import Conversation, Message, MessageType, MessageStatus
 from app.schemas.conversation import ChatRequest, ChatResponse, ConversationResponse, MessageResponse
-from app.auth import get_current_user
-from app.services.ai_service import AIService
-from typing import List, Dict, Any
+from app.auth import get_current_user, verify_token
+from app.services.ai_service import AIService, get_ai_service
+from app.services.inference_pool import InferenceOverloadedError
+from app.services.chat_store import load_turn, save_turn, save_user_message
+from app.services.connection_manager import ClientConnection, connection_manager as manager
+from app.config import settings
+from typing import List, Dict, Any, Optional, Set
+import asyncio
 import json
 import logging
 from datetime import datetime
@@ -16,89 +21,35 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+# WebSocket turns run as tasks so the socket keeps reading; keep them referenced until done
+_websocket_turns: Set[asyncio.Task] = set()
 
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
 
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+async def _save_unanswered(db: AsyncSession, conversation, user_id: int, chat_request: ChatRequest):
+    """Keep the user's message of a turn whose reply was never generated"""
+    try:
+        await save_user_message(db, conversation, user_id, chat_request)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Failed to save unanswered message: {e}")
 
-    async def send_personal_message(self, message: str, user_id: int):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_text(message)
 
-manager = ConnectionManager()
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 
 @router.post("/send", response_model=ChatResponse)
 async def send_message(
     chat_request: ChatRequest,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     """Send a message and get AI response"""
+    conversation = ai_response = None
     try:
-        ai_service = AIService()
-        
-        # Get or create conversation
-        conversation = None
-        if chat_request.conversation_id:
-            result = await db.execute(
-                select(Conversation).where(
-                    Conversation.id == chat_request.conversation_id,
-                    Conversation.user_id == current_user.id
-                )
-            )
-            conversation = result.scalar_one_or_none()
-        
-        if not conversation:
-            # Create new conversation
-            conversation = Conversation(
-                user_id=current_user.id,
-                language=chat_request.language,
-                context=chat_request.context,
-                title=chat_request.message[:50] + "..." if len(chat_request.message) > 50 else chat_request.message
-            )
-            db.add(conversation)
-            await db.commit()
-            await db.refresh(conversation)
-        
-        # Save user message
-        user_message = Message(
-            conversation_id=conversation.id,
-            user_id=current_user.id,
-            content=chat_request.message,
-            message_type=MessageType.USER,
-            status=MessageStatus.SENT
-        )
-        db.add(user_message)
-        await db.commit()
-        await db.refresh(user_message)
-        
-        # Get conversation history for context
-        result = await db.execute(
-            select(Message)
-            .where(Message.conversation_id == conversation.id)
-            .order_by(Message.created_at.desc())
-            .limit(10)
-        )
-        history = result.scalars().all()
-        history.reverse()
-        
-        # Prepare conversation history for AI
-        conversation_history = []
-        for msg in history:
-            conversation_history.append({
-                "content": msg.content,
-                "message_type": msg.message_type.value,
-                "created_at": msg.created_at.isoformat()
-            })
+        conversation, conversation_history = await load_turn(db, current_user.id, chat_request)
         
         # Generate AI response
         ai_response = await ai_service.generate_response(
@@ -108,35 +59,8 @@ async def send_message(
             language=chat_request.language
         )
         
-        # Save AI response
-        bot_message = Message(
-            conversation_id=conversation.id,
-            user_id=current_user.id,  # Same user_id for bot messages
-            content=ai_response["content"],
-            message_type=MessageType.BOT,
-            status=MessageStatus.SENT,
-            tokens_used=ai_response.get("tokens_used", 0),
-            model_used=ai_response.get("model_used"),
-            response_time_ms=ai_response.get("response_time_ms"),
-            metadata={
-                "prompt_tokens": ai_response.get("prompt_tokens", 0),
-                "completion_tokens": ai_response.get("completion_tokens", 0),
-                "relevant_faqs": ai_response.get("relevant_faqs", [])
-            }
-        )
-        db.add(bot_message)
-        
-        # Update conversation metrics
-        conversation.message_count += 2  # User + Bot message
-        conversation.total_tokens += ai_response.get("tokens_used", 0)
-        conversation.last_message_at = datetime.utcnow()
-        
-        await db.commit()
-        await db.refresh(bot_message)
-        await db.refresh(conversation)
-        
-        # Analytics tracking would go here in production
-        # For now, we'll skip analytics to keep the app running
+        bot_message = await save_turn(db, conversation, current_user.id, chat_request, ai_response)
+        ai_service.summarizer.schedule(conversation)
         
         # Prepare response
         suggested_questions = await _generate_suggested_questions(ai_response["content"])
@@ -148,42 +72,255 @@ async def send_message(
             related_faqs=ai_response.get("relevant_faqs", [])
         )
         
+    except InferenceOverloadedError as e:
+        await db.rollback()
+        logger.warning(f"Chat message rejected: {e}")
+        if conversation is not None:
+            await _save_unanswered(db, conversation, current_user.id, chat_request)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The assistant is busy, please retry shortly",
+            headers={"Retry-After": "2"}
+        )
     except Exception as e:
         await db.rollback()
         logger.error(f"Chat message processing failed: {e}")
+        if conversation is not None and ai_response is None:
+            await _save_unanswered(db, conversation, current_user.id, chat_request)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process message"
         )
 
 
+@router.post("/send/stream")
+async def send_message_stream(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """Send a message and stream the AI response as server-sent events.
+    
+    Emits ``token`` events with text chunks as they are generated, then one
+    ``done`` event with the saved message, or an ``error`` event.
+    """
+    try:
+        # load_turn closes the session, so the conversation is detached and
+        # the reply can be saved from a separate session inside the stream
+        conversation, conversation_history = await load_turn(db, current_user.id, chat_request)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Chat message processing failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to process message"
+        )
+    
+    async def events():
+        answered = False
+        try:
+            async for event in ai_service.stream_response(
+                message=chat_request.message,
+                conversation_history=conversation_history,
+                user_context=conversation.context,
+                language=chat_request.language
+            ):
+                if event["type"] == "token":
+                    yield _sse_event("token", {"content": event["content"]})
+                    continue
+                
+                # The request-scoped session may already be closed once streaming starts
+                answered = True
+                async with AsyncSessionLocal() as session:
+                    bot_message = await save_turn(session, conversation, current_user.id, chat_request, event)
+                    ai_service.summarizer.schedule(conversation)
+                    yield _sse_event("done", {
+                        "message": MessageResponse.from_orm(bot_message).model_dump(mode="json"),
+                        "conversation": ConversationResponse.from_orm(conversation).model_dump(mode="json"),
+                        "suggested_questions": await _generate_suggested_questions(event["content"]),
+                        "related_faqs": event.get("relevant_faqs", [])
+                    })
+        except InferenceOverloadedError as e:
+            logger.warning(f"Chat message rejected: {e}")
+            async with AsyncSessionLocal() as session:
+                await _save_unanswered(session, conversation, current_user.id, chat_request)
+            yield _sse_event("error", {"detail": "The assistant is busy, please retry shortly"})
+        except Exception as e:
+            logger.error(f"Chat stream failed: {e}")
+            if not answered:
+                async with AsyncSessionLocal() as session:
+                    await _save_unanswered(session, conversation, current_user.id, chat_request)
+            yield _sse_event("error", {"detail": "Failed to process message"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _authenticate_websocket(websocket: WebSocket, user_id: int) -> Optional[User]:
+    """Resolve the socket's user from an access token.
+    
+    The token may come from the ``token`` query parameter, an ``Authorization``
+    header, or a first ``{"type": "auth", "token": ...}`` frame. It must belong
+    to the user in the path.
+    """
+    token = websocket.query_params.get("token")
+    authorization = websocket.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    
+    if not token:
+        try:
+            data = await asyncio.wait_for(websocket.receive_text(), settings.WS_AUTH_TIMEOUT_SECONDS)
+            frame = json.loads(data)
+        except (asyncio.TimeoutError, ValueError, WebSocketDisconnect):
+            return None
+        if isinstance(frame, dict) and frame.get("type") == "auth":
+            token = frame.get("token")
+    
+    payload = verify_token(token) if isinstance(token, str) and token else None
+    if not payload or payload.get("type") != "access" or str(payload.get("sub")) != str(user_id):
+        return None
+    
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
+    if user is None or user.status.value != "active":
+        return None
+    return user
+
+
+async def _run_websocket_turn(
+    connection: ClientConnection,
+    user: User,
+    chat_request: ChatRequest,
+    ai_service: AIService,
+    turn_lock: asyncio.Lock
+):
+    """Run one chat turn and fan its frames out to all of the user's sockets"""
+    # Turns from one socket are answered in order
+    async with turn_lock:
+        conversation = None
+        answered = False
+        try:
+            async with AsyncSessionLocal() as db:
+                conversation, conversation_history = await load_turn(db, user.id, chat_request)
+                
+                async for event in ai_service.stream_response(
+                    message=chat_request.message,
+                    conversation_history=conversation_history,
+                    user_context=conversation.context,
+                    language=chat_request.language
+                ):
+                    if event["type"] == "token":
+                        manager.send_personal_message({
+                            "type": "token",
+                            "conversation_id": conversation.id,
+                            "content": event["content"]
+                        }, user.id)
+                        continue
+                    
+                    answered = True
+                    bot_message = await save_turn(db, conversation, user.id, chat_request, event)
+                    ai_service.summarizer.schedule(conversation)
+                    manager.send_personal_message({
+                        "type": "message",
+                        "conversation_id": conversation.id,
+                        "message": MessageResponse.from_orm(bot_message).model_dump(mode="json"),
+                        "related_faqs": event.get("relevant_faqs", []),
+                        "timestamp": datetime.utcnow().isoformat()
+                    }, user.id)
+        except InferenceOverloadedError:
+            if conversation is not None:
+                async with AsyncSessionLocal() as db:
+                    await _save_unanswered(db, conversation, user.id, chat_request)
+            connection.enqueue(json.dumps({
+                "type": "error",
+                "detail": "The assistant is busy, please retry shortly"
+            }))
+        except Exception as e:
+            logger.error(f"WebSocket chat turn failed: {e}")
+            if conversation is not None and not answered:
+                async with AsyncSessionLocal() as db:
+                    await _save_unanswered(db, conversation, user.id, chat_request)
+            connection.enqueue(json.dumps({
+                "type": "error",
+                "detail": "Failed to process message"
+            }))
+
+
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int, db: AsyncSession = Depends(get_db)):
-    """WebSocket endpoint for real-time chat"""
-    await manager.connect(websocket, user_id)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: int,
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """WebSocket endpoint for real-time chat.
+    
+    Clients send ``{"message": ..., "conversation_id": ..., "language": ...}``
+    and receive ``token`` frames while the reply is generated, then a
+    ``message`` frame with the saved reply. Every socket the user has open
+    receives the frames. Messages sent while a reply is generating wait
+    their turn; beyond ``WS_MAX_QUEUED_TURNS`` waiting they get an error
+    frame instead. The server sends ``{"type": "ping"}`` periodically
+    and expects ``{"type": "pong"}`` (or any other frame) in return.
+    """
+    await websocket.accept()
+    user = await _authenticate_websocket(websocket, user_id)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    connection = await manager.connect(websocket, user_id)
+    turn_lock = asyncio.Lock()
+    # This socket's unfinished turns: the one generating plus those waiting for turn_lock
+    turns: Set[asyncio.Task] = set()
     
     try:
         while True:
             # Receive message from client
             data = await websocket.receive_text()
-            message_data = json.loads(data)
+            connection.touch()
+            
+            try:
+                frame = json.loads(data)
+                if not isinstance(frame, dict):
+                    raise ValueError("frame must be a JSON object")
+                frame_type = frame.pop("type", "message")
+                if frame_type == "pong":
+                    continue
+                if frame_type == "ping":
+                    connection.enqueue(json.dumps({"type": "pong"}))
+                    continue
+                chat_request = ChatRequest(**frame)
+            except (ValueError, TypeError) as e:
+                connection.enqueue(json.dumps({"type": "error", "detail": f"Invalid message: {e}"}))
+                continue
             
-            # Process message (similar to send_message endpoint)
-            # This is a simplified version - in production you'd want more robust handling
+            if len(turns) > settings.WS_MAX_QUEUED_TURNS:
+                connection.enqueue(json.dumps({
+                    "type": "error",
+                    "detail": "Too many messages waiting for a reply, please wait for the current one"
+                }))
+                continue
             
-            # Send response back to client
-            response = {
-                "type": "message",
-                "content": "Message received via WebSocket",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            await websocket.send_text(json.dumps(response))
+            # Keep reading (heartbeats, queued turns) while this turn generates
+            task = asyncio.create_task(_run_websocket_turn(connection, user, chat_request, ai_service, turn_lock))
+            _websocket_turns.add(task)
+            task.add_done_callback(_websocket_turns.discard)
+            turns.add(task)
+            task.add_done_callback(turns.discard)
             
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        manager.disconnect(user_id)
+    finally:
+        # In-flight turns still finish and reach the user's other sockets
+        await manager.disconnect(connection)
 
 
 async def _generate_suggested_questions(bot_response: str) -> List[str]:
@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.models.user import User
+from app.auth.jwt import get_current_admin_user, get_current_user
+from app.schemas.faq import FAQFeedback
+from app.services.ai_service import AIService, get_ai_service
+from app.services.faq_import import FAQImporter, detect_format, read_records
+from app.services import reembedding
+from typing import Any, Dict, Optional
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/faqs", tags=["FAQs"])
+
+
+@router.post("/import")
+async def import_faqs(
+    file: UploadFile = File(...),
+    publish: bool = False,
+    category_id: Optional[int] = None,
+    language: str = "en",
+    current_user: User = Depends(get_current_admin_user),
+    ai_service: AIService = Depends(get_ai_service)
+) -> Dict[str, Any]:
+    """Bulk-import FAQs from an uploaded JSONL or CSV file.
+    
+    The upload is streamed through the importer; re-uploading after a failure
+    skips FAQs whose slug was already imported.
+    """
+    try:
+        fmt = detect_format(file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    importer = FAQImporter(ai_service, publish=publish, default_category_id=category_id, default_language=language)
+    records = read_records(io.TextIOWrapper(file.file, encoding="utf-8", newline=""), fmt)
+    try:
+        report = await importer.run(records)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unreadable import file: {e}")
+    
+    logger.info(f"User {current_user.id} imported {report.inserted} FAQs from {file.filename}")
+    return report.as_dict()
+
+
+@router.post("/feedback", status_code=status.HTTP_202_ACCEPTED)
+async def submit_feedback(
+    feedback: FAQFeedback,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service)
+) -> Dict[str, Any]:
+    """Record whether an FAQ answer was helpful.
+    
+    Each user has one vote per FAQ; submitting again replaces it. The vote
+    and comment are stored right away, the FAQ's counts in batches.
+    """
+    try:
+        entry = await ai_service.faq_service.record_feedback(
+            db, feedback.faq_id, current_user.id, feedback.is_helpful, feedback.feedback_text
+        )
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Feedback for this FAQ is already being recorded"
+        )
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="FAQ not found")
+    return {"status": "accepted"}
+
+
+@router.post("/reembed", status_code=status.HTTP_202_ACCEPTED)
+async def start_reembedding(
+    current_user: User = Depends(get_current_admin_user),
+    ai_service: AIService = Depends(get_ai_service)
+) -> Dict[str, Any]:
+    """Re-embed FAQs not yet on LOCAL_EMBEDDING_MODEL in the background.
+    
+    To switch models, change LOCAL_EMBEDDING_MODEL and restart the workers;
+    this endpoint restarts a failed or cancelled migration without a restart.
+    """
+    try:
+        job = await reembedding.start_reembedding(ai_service)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    logger.info(f"User {current_user.id} started re-embedding FAQs with {job.model_name}")
+    return job.status()
+
+
+@router.get("/reembed")
+async def reembedding_status(current_user: User = Depends(get_current_admin_user)) -> Dict[str, Any]:
+    """Progress of the current or last re-embedding job"""
+    job = reembedding.current_job()
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No re-embedding job has run")
+    return job.status()
@@ -20,6 +20,39 @@ class Settings(BaseSettings):
     DATABASE_POOL_SIZE: int = 20
     DATABASE_MAX_OVERFLOW: int = 30
     
+    # Chat message write-behind
+    CHAT_WRITE_BEHIND: bool = False  # Queue message inserts and flush them in the background
+    CHAT_WRITE_BEHIND_JOURNAL: str = "data/message_journal.jsonl"  # Replayed on startup; extra workers use .1, .2, ...
+    CHAT_WRITE_BEHIND_BATCH_SIZE: int = 200
+    CHAT_WRITE_BEHIND_FLUSH_MS: float = 200.0
+    CHAT_WRITE_BEHIND_MAX_PENDING: int = 10000  # Beyond this, turns are written synchronously
+    CHAT_WRITE_BEHIND_FSYNC: bool = False  # fsync the journal on every turn
+    CHAT_WRITE_BEHIND_MAX_ATTEMPTS: int = 3  # Failed flushes of a batch before its rows are written one by one
+    CHAT_WRITE_BEHIND_ID_BLOCK: int = 100  # Message ids each worker reserves at a time for queued turns
+    
+    # Conversation history cache
+    HISTORY_CACHE_MAX_CONVERSATIONS: int = 10000  # In-process LRU size
+    HISTORY_CACHE_REDIS: bool = False  # Share history windows between workers via REDIS_URL
+    HISTORY_CACHE_TTL_SECONDS: int = 3600
+    
+    # Prompt assembly
+    PROMPT_TOKEN_BUDGET: int = 384  # Summary, history, FAQs and the new message together
+    PROMPT_MESSAGE_MAX_TOKENS: int = 128  # Longer history messages and FAQ answers are cut
+    CONVERSATION_SUMMARY_EVERY_N_TURNS: int = 3  # 0 disables rolling summaries
+    CONVERSATION_SUMMARY_MAX_TOKENS: int = 160
+    
+    # Token accounting
+    TOKEN_COUNT_TOKENIZER: str = "gpt2"  # Used when the provider loads no tokenizer (OpenAI); empty approximates
+    TOKEN_COUNT_CACHE_SIZE: int = 4096  # Distinct texts whose counts are memoized
+    TOKEN_METRICS_PER_USER: bool = False  # Label chat_tokens_total by user; exact per-user totals are in messages.tokens_used
+    TOKEN_METRICS_MAX_USERS: int = 100  # Users with their own series when per-user labels are on; the rest share "other"
+    
+    # Response cache (first messages of a conversation only)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5000
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_SIMILARITY: float = 0.95  # Cosine similarity of questions treated as the same
+    
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
     REDIS_DB: int = 0
@@ -34,6 +67,79 @@ class Settings(BaseSettings):
     LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     LOCAL_CHAT_MODEL: str = "microsoft/DialoGPT-medium"  # Free alternative
     
+    # CPU inference
+    MODEL_QUANTIZATION: str = "none"  # none, int8 (dynamic int8 linear layers for the chat and embedding models)
+    TORCH_INFERENCE_MODE: bool = True  # Run model calls under torch.inference_mode()
+    TORCH_NUM_THREADS: int = 0  # Intra-op threads per worker process; 0 = torch default (all cores)
+    TORCH_NUM_INTEROP_THREADS: int = 0
+    MODEL_STARTUP_REPORT: bool = True  # Log model memory and tokens/sec after warm-up
+    
+    # Batched local generation
+    GENERATION_BATCHING: bool = True  # Continuous batching of concurrent local generations
+    GENERATION_MAX_BATCH_SIZE: int = 8  # Sequences decoded together per forward pass
+    GENERATION_MAX_WAIT_MS: float = 10.0  # How long an idle model waits for more prompts to batch
+    GENERATION_MAX_NEW_TOKENS: int = 64  # Per-response generation limit
+    
+    # Embeddings
+    EMBEDDING_STORAGE_DTYPE: str = "float32"  # float32, float16
+    EMBEDDING_CACHE_MAX_MB: int = 64  # In-memory LRU budget
+    EMBEDDING_CACHE_PATH: str = ""  # e.g. models/embedding_cache.sqlite3; empty disables the persistent tier
+    EMBEDDING_CACHE_MAX_PERSISTED: int = 200000
+    EMBEDDING_BATCH_SIZE: int = 64  # Texts per model forward pass
+    EMBEDDING_MICROBATCH_MAX_SIZE: int = 32  # Concurrent requests coalesced per encode; 1 disables
+    EMBEDDING_MICROBATCH_MAX_WAIT_MS: float = 5.0
+    
+    # Embedding model migration
+    EMBEDDING_REEMBED_ON_STARTUP: bool = True  # Re-embed FAQs stored with another model in the background
+    EMBEDDING_REEMBED_LEASE_SECONDS: float = 60.0  # One worker runs the job under this lease; the others wait for it
+    EMBEDDING_REEMBED_BATCH_SIZE: int = 64  # FAQs per re-embedding batch
+    EMBEDDING_REEMBED_PAUSE_MS: float = 100.0  # Pause between batches so chat embeddings aren't starved
+    
+    # Inference worker pools
+    INFERENCE_MAX_WORKERS: int = 2  # Concurrent generation jobs
+    EMBEDDING_MAX_WORKERS: int = 1  # Concurrent embedding batches
+    INFERENCE_MAX_QUEUE: int = 16  # Waiting jobs before new requests are rejected
+    INFERENCE_TIMEOUT_SECONDS: float = 30.0
+    
+    # FAQ retrieval index
+    FAQ_INDEX_BACKEND: str = "exact"  # exact, ivf, faiss
+    FAQ_INDEX_PATH: str = "models/faq_index/"  # Persisted ANN structures
+    FAQ_ANN_MIN_PARTITION_SIZE: int = 5000  # Smaller partitions are always scored exactly
+    FAQ_ANN_RERANK_FACTOR: int = 4  # Candidates fetched per requested result
+    FAQ_IVF_NLIST: int = 0  # 0 = sqrt(partition size)
+    FAQ_IVF_NPROBE: int = 8
+    FAQ_HNSW_M: int = 32
+    FAQ_HNSW_EF_CONSTRUCTION: int = 80
+    FAQ_HNSW_EF_SEARCH: int = 64
+    
+    # Hybrid FAQ search
+    FAQ_HYBRID_SEARCH: bool = True  # Fuse BM25 keyword matches with vector matches
+    FAQ_HYBRID_CANDIDATES: int = 20  # Results taken from each ranking before fusion
+    FAQ_RRF_K: int = 60  # Reciprocal-rank fusion constant; larger flattens rank differences
+    FAQ_BM25_K1: float = 1.2
+    FAQ_BM25_B: float = 0.75
+    
+    # FAQ bulk import
+    FAQ_IMPORT_BATCH_SIZE: int = 256  # Records per embedding call and bulk insert
+    
+    # FAQ view/feedback counters
+    FAQ_COUNTER_FLUSH_MS: float = 2000.0  # Increments are summed in memory and written this often
+    
+    # FAQ confidence gate (on the top FAQ's similarity)
+    FAQ_DIRECT_ANSWER_THRESHOLD: float = 0.9  # At or above: reply with the FAQ answer, no generation
+    FAQ_GROUNDING_THRESHOLD: float = 0.6  # At or above: generate grounded on that FAQ; below: generate freely
+    
+    # WebSockets
+    WS_SEND_QUEUE_SIZE: int = 256  # Frames buffered per socket before a slow client is dropped
+    WS_HEARTBEAT_INTERVAL_SECONDS: float = 20.0
+    WS_HEARTBEAT_TIMEOUT_SECONDS: float = 60.0  # Close sockets silent for this long
+    WS_AUTH_TIMEOUT_SECONDS: float = 10.0  # Wait for an auth frame when no token is in the URL
+    WS_MAX_QUEUED_TURNS: int = 2  # Messages a socket may send while a reply is generating; more are rejected
+    WS_FANOUT_BACKEND: str = "memory"  # memory (single worker), redis (uses REDIS_URL)
+    WS_FANOUT_BATCH_SIZE: int = 64  # Frames per cross-worker publish
+    WS_FANOUT_BATCH_WAIT_MS: float = 2.0
+    WS_PRESENCE_TTL_SECONDS: float = 90.0
+    
     # Translation - Free alternatives
     TRANSLATION_PROVIDER: str = "local"  # local, google, libre
     GOOGLE_TRANSLATE_API_KEY: str = ""  # Optional
@@ -2,20 +2,30 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
+from prometheus_client import make_asgi_app
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import structlog
 import logging
 import time
+import asyncio
 from datetime import datetime
 from contextlib import asynccontextmanager
 
 from app.config import settings
-from app.database import init_db, close_db
+from app.database import init_db, close_db, AsyncSessionLocal
+from app.services.ai_service import get_ai_service
+from app.services.connection_manager import connection_manager
+from app.services.pubsub import create_fanout_bus
+from app.services.message_writer import message_writer
+from app.services.faq_counters import faq_counters
+from app.services.chat_store import history_cache
+from app.services import reembedding
 from app.api import (
     auth_router,
-    chat_router
+    chat_router,
+    faq_router
 )
 
 # Configure structured logging
@@ -51,10 +61,45 @@ async def lifespan(app: FastAPI):
     await init_db()
     logger.info("Database initialized")
     
+    if settings.CHAT_WRITE_BEHIND:
+        await message_writer.start()
+        logger.info("Chat write-behind started", journal=settings.CHAT_WRITE_BEHIND_JOURNAL)
+    
+    # Load and warm the shared AI models once per worker, off the event loop
+    ai_service = await asyncio.to_thread(get_ai_service)
+    await asyncio.to_thread(ai_service.warm_up)
+    logger.info("AI service ready", provider=ai_service.ai_provider)
+    
+    async with AsyncSessionLocal() as db:
+        await ai_service.faq_service.load_index(db)
+    logger.info("FAQ index loaded", size=len(ai_service.faq_service.index))
+    
+    faq_counters.start()
+    
+    if settings.EMBEDDING_REEMBED_ON_STARTUP:
+        job = await reembedding.resume_if_needed(ai_service)
+        if job:
+            logger.info("FAQ re-embedding started", model=job.model_name, serving=ai_service.embedding_model_version)
+    
+    await connection_manager.start(create_fanout_bus())
+    logger.info("WebSocket fan-out started", backend=settings.WS_FANOUT_BACKEND, worker=connection_manager.bus.worker_id)
+    
     yield
     
     # Shutdown
     logger.info("Shutting down AI Chatbot API")
+    await connection_manager.close()
+    await ai_service.summarizer.close()
+    await reembedding.shutdown()
+    await faq_counters.close()
+    ai_service.faq_service.index.save()
+    ai_service.embedding_cache.close()
+    if ai_service.generation_scheduler:
+        ai_service.generation_scheduler.shutdown()
+    ai_service.inference_pool.shutdown()
+    ai_service.embedding_pool.shutdown()
+    await message_writer.close()
+    await history_cache.close()
     await close_db()
     logger.info("Database connections closed")
 
@@ -138,6 +183,11 @@ async def global_exception_handler(request: Request, exc: Exception):
 # Include routers
 app.include_router(auth_router, prefix="/api/v1")
 app.include_router(chat_router, prefix="/api/v1")
+app.include_router(faq_router, prefix="/api/v1")
+
+# Prometheus metrics (cache hit rates, latencies, ...)
+if settings.ENABLE_METRICS:
+    app.mount("/metrics", make_asgi_app())
 
 
 @app.get("/")
@@ -1,8 +1,10 @@
 from .user import User
 from .conversation import Conversation, Message
-from .faq import FAQ, FAQCategory
+from .faq import FAQ, FAQCategory, FAQFeedbackEntry
 from .analytics import UserAnalytics, ConversationAnalytics
 from .audit import AuditLog
+from .lease import JobLease
+from .id_block import IdBlock
 
 __all__ = [
     "User",
@@ -10,7 +12,10 @@ __all__ = [
     "Message",
     "FAQ",
     "FAQCategory",
+    "FAQFeedbackEntry",
     "UserAnalytics",
     "ConversationAnalytics",
-    "AuditLog"
+    "AuditLog",
+    "JobLease",
+    "IdBlock"
 ] 
\ No newline at end of file
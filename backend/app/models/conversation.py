@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -20,6 +20,10 @@ class MessageStatus(str, enum.Enum):
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # A user's conversations, most recent first
+        Index("ix_conversations_user_last_message", "user_id", "last_message_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -29,6 +33,8 @@ class Conversation(Base):
     # Conversation metadata
     context = Column(JSON)  # Store conversation context, user preferences, etc.
     tags = Column(JSON)  # Store conversation tags for categorization
+    summary = Column(Text)  # Rolling summary of messages older than the prompt window
+    summary_message_count = Column(Integer, default=0)  # Messages folded into the summary
     
     # Analytics
     message_count = Column(Integer, default=0)
@@ -54,6 +60,10 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # History window: filter by conversation, order by (created_at, id)
+        Index("ix_messages_conversation_created", "conversation_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
@@ -70,7 +80,7 @@ class Message(Base):
     response_time_ms = Column(Integer)
     
     # Metadata
-    message_metadata = Column(JSON)  # Store additional data like intent, confidence, etc.
+    message_metadata = Column(JSON(none_as_null=True))  # Store additional data like intent, confidence, etc.
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,107 @@
+from sqlalchemy.types import TypeDecorator, LargeBinary
+from typing import Any, List, Optional, Union
+from app.config import settings
+import numpy as np
+import struct
+import json
+
+# Binary layout: 12-byte header, UTF-8 model id, padding to a 4-byte boundary,
+# then the little-endian vector data. The model id is the version of the model
+# that produced the vector, or empty when the writer didn't say.
+#   magic (4s) | dtype code (B) | reserved (x) | model id length (H) | dimension (I)
+EMBEDDING_MAGIC = b"EMB\x01"
+_HEADER = struct.Struct("<4sBxHI")
+
+_DTYPES = {
+    0: np.dtype("<f4"),
+    1: np.dtype("<f2"),
+}
+_DTYPE_CODES = {"float32": 0, "float16": 1}
+
+EmbeddingInput = Union[bytes, np.ndarray, List[float]]
+
+
+def _data_offset(model_length: int) -> int:
+    offset = _HEADER.size + model_length
+    return offset + (-offset % 4)
+
+
+def encode_embedding(
+    vector: Union[np.ndarray, List[float]],
+    model: Optional[str] = None,
+    dtype: Optional[str] = None
+) -> bytes:
+    """Pack a vector into the compact binary embedding format.
+    
+    ``model`` is the version of the model that produced the vector; leave it
+    out only when that isn't known.
+    """
+    dtype = dtype or settings.EMBEDDING_STORAGE_DTYPE
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    code = _DTYPE_CODES[dtype]
+
+    array = np.asarray(vector, dtype=_DTYPES[code])
+    if array.ndim != 1:
+        raise ValueError(f"Embedding must be one-dimensional, got shape {array.shape}")
+
+    model_bytes = (model or "").encode("utf-8")
+    header = _HEADER.pack(EMBEDDING_MAGIC, code, len(model_bytes), array.shape[0])
+    padding = b"\x00" * (_data_offset(len(model_bytes)) - _HEADER.size - len(model_bytes))
+    return header + model_bytes + padding + array.tobytes()
+
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    """Return a read-only NumPy view over an encoded embedding without copying"""
+    magic, code, model_length, dim = _HEADER.unpack_from(blob)
+    if magic != EMBEDDING_MAGIC:
+        raise ValueError("Not an encoded embedding")
+    return np.frombuffer(blob, dtype=_DTYPES[code], count=dim, offset=_data_offset(model_length))
+
+
+def embedding_model(blob: bytes) -> Optional[str]:
+    """Read the embedding model identity from the header; None if it wasn't recorded"""
+    magic, _, model_length, _ = _HEADER.unpack_from(blob)
+    if magic != EMBEDDING_MAGIC:
+        raise ValueError("Not an encoded embedding")
+    return bytes(blob[_HEADER.size:_HEADER.size + model_length]).decode("utf-8") or None
+
+
+def is_encoded_embedding(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:4]) == EMBEDDING_MAGIC
+
+
+def coerce_embedding(value: Any) -> Optional[np.ndarray]:
+    """Turn an encoded blob or a legacy JSON vector into a NumPy array"""
+    if value is None:
+        return None
+    if is_encoded_embedding(value):
+        return decode_embedding(bytes(value))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value).decode("utf-8")
+    if isinstance(value, str):
+        value = json.loads(value)
+    if value is None:
+        return None
+    return np.asarray(value, dtype=np.float32)
+
+
+class EmbeddingVector(TypeDecorator):
+    """Column type storing embeddings in the binary format and loading them as NumPy arrays.
+    
+    Plain vectors are stored without a model id; writers that know the model
+    pass ``encode_embedding(vector, model=version)`` instead.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[EmbeddingInput], dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        if is_encoded_embedding(value):
+            return bytes(value)
+        return encode_embedding(value)
+
+    def process_result_value(self, value: Any, dialect) -> Optional[np.ndarray]:
+        return coerce_embedding(value)
@@ -1,8 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float, Enum, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.models.embedding import EmbeddingVector
 import enum
+import hashlib
+
+
+def content_hash(text: str) -> str:
+    """Fingerprint of an embedded text, to tell whether it needs embedding again"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
 class FAQStatus(str, enum.Enum):
@@ -13,6 +20,10 @@ class FAQStatus(str, enum.Enum):
 
 class FAQ(Base):
     __tablename__ = "faqs"
+    __table_args__ = (
+        # Retrieval filters: published FAQs by language, optionally by category
+        Index("ix_faqs_status_language_category", "status", "language", "category_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     category_id = Column(Integer, ForeignKey("faq_categories.id"), nullable=False)
@@ -23,8 +34,11 @@ class FAQ(Base):
     keywords = Column(JSON)  # Store keywords for better search
     
     # Vector embeddings for semantic search
-    question_embedding = Column(JSON)  # Store vector embedding
-    answer_embedding = Column(JSON)  # Store vector embedding
+    question_embedding = Column(EmbeddingVector)  # Binary float32/float16 vector with model header
+    answer_embedding = Column(EmbeddingVector)  # Binary float32/float16 vector with model header
+    embedding_model = Column(String(255), index=True)  # Model version that produced both embeddings
+    question_hash = Column(String(64))  # content_hash of the question text behind question_embedding
+    answer_hash = Column(String(64))  # content_hash of the answer text behind answer_embedding
     
     # Metadata
     status = Column(Enum(FAQStatus), default=FAQStatus.DRAFT)
@@ -82,4 +96,25 @@ class FAQCategory(Base):
     children = relationship("FAQCategory", back_populates="parent", overlaps="parent")
     
     def __repr__(self):
-        return f"<FAQCategory(id={self.id}, name='{self.name}')>" 
\ No newline at end of file
+        return f"<FAQCategory(id={self.id}, name='{self.name}')>"
+
+
+class FAQFeedbackEntry(Base):
+    __tablename__ = "faq_feedback"
+    __table_args__ = (
+        # One vote per user and FAQ; submitting again changes it
+        UniqueConstraint("faq_id", "user_id", name="uq_faq_feedback_faq_user"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    faq_id = Column(Integer, ForeignKey("faqs.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    is_helpful = Column(Boolean, nullable=False)
+    feedback_text = Column(Text)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<FAQFeedbackEntry(faq_id={self.faq_id}, user_id={self.user_id}, is_helpful={self.is_helpful})>"
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String
+from app.database import Base
+
+
+class IdBlock(Base):
+    """Next unreserved id of a table whose ids are handed out before the rows are written"""
+    __tablename__ = "id_blocks"
+
+    name = Column(String(100), primary_key=True)
+    next_id = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<IdBlock(name='{self.name}', next_id={self.next_id})>"
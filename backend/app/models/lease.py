@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Float, String
+from app.database import Base
+
+
+class JobLease(Base):
+    """A named lock shared by all workers; the holder renews it before it expires"""
+    __tablename__ = "job_leases"
+
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(255), nullable=False)
+    expires_at = Column(Float, nullable=False)  # Unix time; a lapsed lease can be taken over
+
+    def __repr__(self):
+        return f"<JobLease(name='{self.name}', owner='{self.owner}')>"
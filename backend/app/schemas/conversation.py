@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, AliasChoices
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from app.models.conversation import MessageType, MessageStatus
@@ -41,7 +41,10 @@ class ConversationResponse(ConversationBase):
 class MessageBase(BaseModel):
     content: str
     message_type: MessageType
-    metadata: Optional[Dict[str, Any]] = None
+    # The model column is message_metadata (``metadata`` is reserved by SQLAlchemy)
+    metadata: Optional[Dict[str, Any]] = Field(
+        None, validation_alias=AliasChoices("message_metadata", "metadata")
+    )
 
 
 class MessageCreate(MessageBase):
@@ -1,9 +1,10 @@
-from .ai_service import AIService
+from .ai_service import AIService, get_ai_service
 from .faq_service import FAQService
 from .notification_service import NotificationService
 
 __all__ = [
     "AIService",
+    "get_ai_service",
     "FAQService", 
     "NotificationService"
 ] 
\ No newline at end of file
@@ -1,10 +1,13 @@
 import openai
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Tuple
 from datetime import datetime
 import time
+import asyncio
 import logging
+import threading
 import numpy as np
-from transformers import AutoTokenizer, AutoModel, pipeline
+from prometheus_client import Counter
+from transformers import AutoTokenizer, TextStreamer, pipeline
 
 # Try to import sentence_transformers, fallback if not available
 try:
@@ -17,18 +20,95 @@ except ImportError:
 from app.config import settings
 from app.models.conversation import MessageType
 from app.services.faq_service import FAQService
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.inference_pool import (
+    EmbeddingUnavailableError, InferencePool, InferenceOverloadedError, InferenceTimeoutError
+)
+from app.services.token_counter import TokenCounter, load_tokenizer
+from app.services.conversation_summary import ConversationSummarizer
+from app.services.chat_store import HISTORY_LIMIT
+from app.services.response_cache import ResponseCache
+from app.services.generation_scheduler import GenerationScheduler
+from app.services.model_loader import (
+    configure_threads, inference_context, load_chat_model, prepare_embedding_model, startup_report
+)
 
 logger = logging.getLogger(__name__)
 
+# Embedding model of the huggingface provider (the local provider uses LOCAL_EMBEDDING_MODEL)
+HUGGINGFACE_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+CONFIDENCE_TIERS = Counter(
+    "chat_confidence_tier_total",
+    "Chat turns by FAQ confidence tier (direct, grounded, free)",
+    ["tier"]
+)
+
+
+class _AsyncQueueStreamer(TextStreamer):
+    """Text streamer that hands decoded chunks from the model thread to an asyncio queue"""
+    
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = loop
+        self.queue = queue
+    
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+        if stream_end:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
 
 class AIService:
-    def __init__(self):
+    def __init__(self, embeddings_only: bool = False):
         self.faq_service = FAQService()
         self.ai_provider = settings.AI_PROVIDER
+        self.embedding_model = None
+        self.embedding_model_name = settings.LOCAL_EMBEDDING_MODEL
+        self.embedding_cache = EmbeddingCache(
+            max_bytes=settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+            persist_path=settings.EMBEDDING_CACHE_PATH or None,
+            max_persisted_entries=settings.EMBEDDING_CACHE_MAX_PERSISTED
+        )
+        self.embedding_batcher = EmbeddingBatcher(
+            # generate_embeddings has already missed the cache for these texts
+            self._embed_uncached,
+            max_batch_size=settings.EMBEDDING_MICROBATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_MICROBATCH_MAX_WAIT_MS
+        ) if settings.EMBEDDING_MICROBATCH_MAX_SIZE > 1 else None
+        
+        # Blocking model calls run here so they never stall the event loop
+        self.inference_pool = InferencePool(
+            "generation",
+            max_workers=settings.INFERENCE_MAX_WORKERS,
+            max_queue=settings.INFERENCE_MAX_QUEUE,
+            timeout_seconds=settings.INFERENCE_TIMEOUT_SECONDS
+        )
+        self.embedding_pool = InferencePool(
+            "embedding",
+            max_workers=settings.EMBEDDING_MAX_WORKERS,
+            max_queue=settings.INFERENCE_MAX_QUEUE,
+            timeout_seconds=settings.INFERENCE_TIMEOUT_SECONDS
+        )
+        
+        # Concurrent local generations share forward passes through this when enabled
+        self.generation_scheduler = None
         
         # Set the AI service in FAQ service to avoid circular imports
         self.faq_service.set_ai_service(self)
         
+        if embeddings_only:
+            # Offline tools such as the bulk importer only need vectors: no
+            # chat model, tokenizer, summarizer or response cache
+            configure_threads()
+            if self.ai_provider in ("local", "huggingface"):
+                self._initialize_embedding_model(
+                    HUGGINGFACE_EMBEDDING_MODEL if self.ai_provider == "huggingface" else settings.LOCAL_EMBEDDING_MODEL
+                )
+            return
+        
         # Initialize local models
         if self.ai_provider == "local":
             self._initialize_local_models()
@@ -37,31 +117,41 @@ class AIService:
             openai.api_key = settings.OPENAI_API_KEY
         elif self.ai_provider == "huggingface":
             self._initialize_huggingface_models()
+        
+        # Prompt budgets are measured with the generating model's tokenizer when there is one
+        tokenizer = getattr(self, "tokenizer", None)
+        if tokenizer is None and getattr(self, "text_generator", None) is not None:
+            tokenizer = self.text_generator.tokenizer
+        if tokenizer is None:
+            tokenizer = load_tokenizer(settings.TOKEN_COUNT_TOKENIZER)
+        self.token_counter = TokenCounter(tokenizer)
+        self.summarizer = ConversationSummarizer(self, window=HISTORY_LIMIT - 1)
+        self.response_cache = ResponseCache(self.faq_service.index) if settings.RESPONSE_CACHE_ENABLED else None
     
     def _initialize_local_models(self):
         """Initialize local models for free AI processing"""
         try:
-            # Initialize embedding model if available
-            if SENTENCE_TRANSFORMERS_AVAILABLE:
-                self.embedding_model = SentenceTransformer(settings.LOCAL_EMBEDDING_MODEL)
-            else:
-                self.embedding_model = None
-                logger.warning("sentence_transformers not available, using fallback embeddings")
+            configure_threads()
+            self._initialize_embedding_model(settings.LOCAL_EMBEDDING_MODEL)
             
-            # Initialize chat model
+            # Initialize chat model once; the pipeline shares the same instance
             self.tokenizer = AutoTokenizer.from_pretrained(settings.LOCAL_CHAT_MODEL)
-            self.chat_model = AutoModel.from_pretrained(settings.LOCAL_CHAT_MODEL)
+            self.chat_model = load_chat_model(settings.LOCAL_CHAT_MODEL)
             
             # Initialize text generation pipeline
             self.text_generator = pipeline(
                 "text-generation",
-                model=settings.LOCAL_CHAT_MODEL,
+                model=self.chat_model,
                 tokenizer=self.tokenizer,
-                max_length=100,
+                max_new_tokens=settings.GENERATION_MAX_NEW_TOKENS,
                 do_sample=True,
                 temperature=0.7
             )
             
+            if settings.GENERATION_BATCHING:
+                self.generation_scheduler = GenerationScheduler(self.chat_model, self.tokenizer)
+                self.generation_scheduler.start()
+            
             logger.info("Local AI models initialized successfully")
             
         except Exception as e:
@@ -70,6 +160,15 @@ class AIService:
             self.embedding_model = None
             self.text_generator = None
     
+    def _initialize_embedding_model(self, name: str):
+        """Load the sentence-transformers embedding model, or fall back to simple embeddings"""
+        self.embedding_model_name = name
+        if SENTENCE_TRANSFORMERS_AVAILABLE:
+            self.embedding_model = prepare_embedding_model(SentenceTransformer(name))
+        else:
+            self.embedding_model = None
+            logger.warning("sentence_transformers not available, using fallback embeddings")
+    
     def _initialize_huggingface_models(self):
         """Initialize HuggingFace models (free tier)"""
         try:
@@ -77,14 +176,14 @@ class AIService:
             if settings.HUGGINGFACE_API_KEY:
                 login(settings.HUGGINGFACE_API_KEY)
             
+            configure_threads()
+            
             # Use smaller, free models if available
-            if SENTENCE_TRANSFORMERS_AVAILABLE:
-                self.embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-            else:
-                self.embedding_model = None
-                logger.warning("sentence_transformers not available, using fallback embeddings")
+            self._initialize_embedding_model(HUGGINGFACE_EMBEDDING_MODEL)
             
-            self.text_generator = pipeline("text-generation", model="gpt2")
+            self.tokenizer = AutoTokenizer.from_pretrained("gpt2")
+            self.chat_model = load_chat_model("gpt2")
+            self.text_generator = pipeline("text-generation", model=self.chat_model, tokenizer=self.tokenizer)
             
             logger.info("HuggingFace models initialized successfully")
             
@@ -103,43 +202,347 @@ class AIService:
         start_time = time.time()
         
         try:
+            cacheable = self._is_cacheable(message, conversation_history, user_context)
+            if cacheable:
+                cached = await self.response_cache.get(message, language, self._cache_embedder())
+                if cached is not None:
+                    return self._cached_result(cached, start_time)
+            faq_version = self.faq_service.index.version
+            
             # Get relevant FAQs
-            relevant_faqs = await self.faq_service.search_semantic(message, limit=3)
+            relevant_faqs = await self.faq_service.search_semantic(message, limit=3, language=language)
+            tier, grounding = self._confidence_gate(relevant_faqs)
+            if tier == "direct":
+                return self._direct_result(grounding[0], relevant_faqs, start_time)
+            prompt_tokens = self._prompt_tokens(message, conversation_history, grounding)
+            usage = None
             
             # Generate response based on provider
-            if self.ai_provider == "local":
-                response = self._generate_local_response(message, conversation_history, relevant_faqs)
-            elif self.ai_provider == "openai":
-                response = await self._generate_openai_response(message, conversation_history, relevant_faqs)
-            elif self.ai_provider == "huggingface":
-                response = self._generate_huggingface_response(message, conversation_history, relevant_faqs)
-            else:
-                response = self._generate_fallback_response(message, relevant_faqs)
+            try:
+                if self.ai_provider == "local" and self.generation_scheduler:
+                    response = await self._generate_batched_response(message, conversation_history, grounding)
+                elif self.ai_provider == "local":
+                    response = await self.inference_pool.run(
+                        self._generate_local_response, message, conversation_history, grounding
+                    )
+                elif self.ai_provider == "openai":
+                    response, usage = await self._generate_openai_response(message, conversation_history, grounding)
+                elif self.ai_provider == "huggingface":
+                    response = await self.inference_pool.run(
+                        self._generate_huggingface_response, message, conversation_history, grounding
+                    )
+                else:
+                    response = self._generate_simple_response(message, grounding)
+            except InferenceTimeoutError as e:
+                logger.warning(f"{e}; answering without the model")
+                response = self._generate_simple_response(message, grounding)
+                cacheable = False
             
-            # Calculate metrics
-            response_time = int((time.time() - start_time) * 1000)
-            
-            return {
-                "content": response,
-                "tokens_used": len(message.split()),  # Rough estimation
-                "prompt_tokens": len(message.split()),
-                "completion_tokens": len(response.split()),
-                "model_used": f"{self.ai_provider}-local",
-                "response_time_ms": response_time,
-                "relevant_faqs": relevant_faqs
-            }
+            result = self._response_result(response, relevant_faqs, start_time, prompt_tokens, usage)
+            if cacheable:
+                await self._cache_response(message, language, result, faq_version)
+            return result
             
+        except InferenceOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"AI response generation failed: {e}")
-            return {
-                "content": "I apologize, but I'm having trouble processing your request right now. Please try again in a moment.",
-                "tokens_used": 0,
-                "prompt_tokens": 0,
-                "completion_tokens": 0,
-                "model_used": f"{self.ai_provider}-fallback",
-                "response_time_ms": int((time.time() - start_time) * 1000),
-                "error": str(e)
-            }
+            return self._error_result(e, start_time)
+    
+    async def stream_response(
+        self,
+        message: str,
+        conversation_history: List[Dict[str, Any]] = None,
+        user_context: Dict[str, Any] = None,
+        language: str = "en"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Generate an AI response incrementally.
+        
+        Yields ``{"type": "token", "content": ...}`` events as text is produced,
+        then one ``{"type": "done", ...}`` event carrying the same fields as
+        ``generate_response``.
+        """
+        start_time = time.time()
+        
+        try:
+            cacheable = self._is_cacheable(message, conversation_history, user_context)
+            if cacheable:
+                cached = await self.response_cache.get(message, language, self._cache_embedder())
+                if cached is not None:
+                    result = self._cached_result(cached, start_time)
+                    yield {"type": "token", "content": result["content"]}
+                    yield {"type": "done", **result}
+                    return
+            faq_version = self.faq_service.index.version
+            
+            relevant_faqs = await self.faq_service.search_semantic(message, limit=3, language=language)
+            tier, grounding = self._confidence_gate(relevant_faqs)
+            if tier == "direct":
+                result = self._direct_result(grounding[0], relevant_faqs, start_time)
+                yield {"type": "token", "content": result["content"]}
+                yield {"type": "done", **result}
+                return
+            prompt_tokens = self._prompt_tokens(message, conversation_history, grounding)
+            
+            chunks: List[str] = []
+            try:
+                async for chunk in self._stream_tokens(message, conversation_history, grounding):
+                    chunks.append(chunk)
+                    yield {"type": "token", "content": chunk}
+            except InferenceTimeoutError as e:
+                logger.warning(f"{e}; ending stream early")
+                cacheable = False
+            
+            response = "".join(chunks).strip()
+            if not response:
+                response = self._generate_simple_response(message, grounding)
+                yield {"type": "token", "content": response}
+            
+            result = self._response_result(response, relevant_faqs, start_time, prompt_tokens)
+            if cacheable:
+                await self._cache_response(message, language, result, faq_version)
+            yield {"type": "done", **result}
+            
+        except InferenceOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"AI response streaming failed: {e}")
+            result = self._error_result(e, start_time)
+            yield {"type": "token", "content": result["content"]}
+            yield {"type": "done", **result}
+    
+    async def _stream_tokens(
+        self,
+        message: str,
+        conversation_history: List[Dict[str, Any]],
+        relevant_faqs: List[Dict[str, Any]]
+    ) -> AsyncIterator[str]:
+        """Yield response text chunks from the configured provider"""
+        context = self._build_context(message, conversation_history, relevant_faqs)
+        
+        if self.ai_provider == "local" and self.generation_scheduler:
+            async for chunk in self._stream_batched(context):
+                yield chunk
+        elif self.ai_provider == "local" and self.text_generator:
+            def generate(streamer):
+                inputs = self.tokenizer.encode(context, return_tensors="pt", max_length=512, truncation=True)
+                with inference_context():
+                    self.chat_model.generate(
+                        inputs,
+                        max_new_tokens=settings.GENERATION_MAX_NEW_TOKENS,
+                        do_sample=True,
+                        temperature=0.7,
+                        streamer=streamer
+                    )
+            
+            async for chunk in self._stream_from_model(generate, self.tokenizer):
+                yield chunk
+        elif self.ai_provider == "huggingface" and self.text_generator:
+            def generate(streamer):
+                with inference_context():
+                    self.text_generator(
+                        context, max_new_tokens=settings.GENERATION_MAX_NEW_TOKENS, do_sample=True, streamer=streamer
+                    )
+            
+            async for chunk in self._stream_from_model(generate, self.text_generator.tokenizer):
+                yield chunk
+        elif self.ai_provider == "openai":
+            async for chunk in self._stream_openai_response(message, conversation_history, relevant_faqs):
+                yield chunk
+        else:
+            yield self._generate_simple_response(message, relevant_faqs)
+    
+    async def _stream_from_model(self, generate: Callable[[TextStreamer], Any], tokenizer) -> AsyncIterator[str]:
+        """Run a blocking generate call on the inference pool and relay its streamed text"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        streamer = _AsyncQueueStreamer(tokenizer, loop, queue)
+        
+        job = asyncio.ensure_future(self.inference_pool.run(generate, streamer))
+        # Wake the reader even if generation fails before the streamer finishes
+        job.add_done_callback(lambda _: queue.put_nowait(None))
+        
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+        
+        await job
+    
+    async def _stream_openai_response(
+        self,
+        message: str,
+        conversation_history: List[Dict[str, Any]],
+        relevant_faqs: List[Dict[str, Any]]
+    ) -> AsyncIterator[str]:
+        """Relay streamed OpenAI deltas"""
+        import openai
+        
+        messages = self._build_conversation_context(message, conversation_history, relevant_faqs)
+        
+        response = await openai.ChatCompletion.acreate(
+            model="gpt-3.5-turbo",  # Use cheaper model
+            messages=messages,
+            max_tokens=100,
+            temperature=0.7,
+            stream=True
+        )
+        
+        async for chunk in response:
+            delta = chunk.choices[0].delta.get("content")
+            if delta:
+                yield delta
+    
+    def _confidence_gate(self, relevant_faqs: List[Dict[str, Any]]) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """Decide how far to trust the top FAQ and which FAQs to ground generation on.
+        
+        At or above ``FAQ_DIRECT_ANSWER_THRESHOLD`` its answer is returned as is
+        (tier ``direct``); from ``FAQ_GROUNDING_THRESHOLD`` the model answers from
+        that FAQ only (``grounded``); below it the model answers without FAQs
+        (``free``). Scores from fallback embeddings mean nothing, so then every
+        retrieved FAQ is passed on as before and no tier applies.
+        
+        Hybrid search ranks by fused rank, so the top FAQ here is the most
+        similar one rather than the first.
+        """
+        if not relevant_faqs:
+            CONFIDENCE_TIERS.labels(tier="free").inc()
+            return "free", []
+        scored = [faq for faq in relevant_faqs if faq.get("similarity") is not None]
+        if not scored or self.embedding_model_version == "simple-fallback":
+            return None, relevant_faqs
+        top = max(scored, key=lambda faq: faq["similarity"])
+        similarity = top["similarity"]
+        
+        if similarity >= settings.FAQ_DIRECT_ANSWER_THRESHOLD:
+            tier, grounding = "direct", [top]
+        elif similarity >= settings.FAQ_GROUNDING_THRESHOLD:
+            tier, grounding = "grounded", [top]
+        else:
+            tier, grounding = "free", []
+        CONFIDENCE_TIERS.labels(tier=tier).inc()
+        return tier, grounding
+    
+    def _direct_result(self, top_faq: Dict[str, Any], relevant_faqs: List[Dict[str, Any]], start_time: float) -> Dict[str, Any]:
+        """Answer with the top FAQ verbatim; no model runs"""
+        self._record_views(relevant_faqs)
+        return {
+            "content": top_faq.get("answer", ""),
+            "tokens_used": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "model_used": "faq-direct",
+            "response_time_ms": int((time.time() - start_time) * 1000),
+            "relevant_faqs": relevant_faqs
+        }
+    
+    def _record_views(self, relevant_faqs: Optional[List[Dict[str, Any]]]):
+        """Count a view for each FAQ returned with an answer"""
+        for faq in relevant_faqs or []:
+            if faq.get("id") is not None:
+                self.faq_service.increment_view_count(faq["id"])
+    
+    def _is_cacheable(
+        self,
+        message: str,
+        conversation_history: List[Dict[str, Any]],
+        user_context: Dict[str, Any]
+    ) -> bool:
+        """Only answers that depend on nothing but the question can be shared"""
+        if self.response_cache is None or user_context:
+            return False
+        # load_turn appends the new message itself; anything else is prior context
+        return all(
+            msg.get("message_type") == MessageType.USER.value and msg.get("content") == message
+            for msg in conversation_history or []
+        )
+    
+    def _cache_embedder(self) -> Optional[Callable[[str], Any]]:
+        """Embeds questions for the similarity tier, unless only fallback embeddings exist"""
+        if self.embedding_model_version == "simple-fallback":
+            return None
+        return self._embed_for_cache
+    
+    async def _embed_for_cache(self, text: str) -> Optional[List[float]]:
+        """Question embedding for the cache; None if the model failed, so only the exact tier is used"""
+        try:
+            return await self.generate_embeddings(text)
+        except EmbeddingUnavailableError:
+            return None
+    
+    async def _cache_response(self, message: str, language: str, result: Dict[str, Any], faq_version: int):
+        embed = self._cache_embedder()
+        # The embedding cache already holds this question's vector from the FAQ search
+        embedding = await embed(message) if embed is not None else None
+        self.response_cache.put(message, language, embedding, result, faq_version)
+    
+    def _cached_result(self, cached: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """A cached answer costs no model tokens"""
+        self._record_views(cached.get("relevant_faqs"))
+        return {
+            **cached,
+            "tokens_used": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "model_used": "response-cache",
+            "response_time_ms": int((time.time() - start_time) * 1000)
+        }
+    
+    def _prompt_tokens(
+        self,
+        message: str,
+        conversation_history: List[Dict[str, Any]],
+        relevant_faqs: List[Dict[str, Any]]
+    ) -> int:
+        """Tokens in the prompt the configured provider is sent"""
+        if self.ai_provider == "openai":
+            return self.token_counter.count_messages(
+                self._build_conversation_context(message, conversation_history, relevant_faqs)
+            )
+        if getattr(self, "text_generator", None) is not None:
+            return self.token_counter.count(self._build_context(message, conversation_history, relevant_faqs))
+        return 0  # Rule-based replies don't run a model
+    
+    def _response_result(
+        self,
+        response: str,
+        relevant_faqs: List[Dict[str, Any]],
+        start_time: float,
+        prompt_tokens: int,
+        usage: Optional[Dict[str, int]] = None
+    ) -> Dict[str, Any]:
+        """Assemble the response payload and its metrics.
+        
+        ``usage`` is the provider's own token report (OpenAI); without it the
+        reply is counted with the tokenizer.
+        """
+        if usage:
+            prompt_tokens = usage.get("prompt_tokens", prompt_tokens)
+            completion_tokens = usage.get("completion_tokens", 0)
+        else:
+            completion_tokens = self.token_counter.count(response)
+        self._record_views(relevant_faqs)
+        return {
+            "content": response,
+            "tokens_used": prompt_tokens + completion_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "model_used": f"{self.ai_provider}-local",
+            "response_time_ms": int((time.time() - start_time) * 1000),
+            "relevant_faqs": relevant_faqs
+        }
+    
+    def _error_result(self, error: Exception, start_time: float) -> Dict[str, Any]:
+        return {
+            "content": "I apologize, but I'm having trouble processing your request right now. Please try again in a moment.",
+            "tokens_used": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "model_used": f"{self.ai_provider}-fallback",
+            "response_time_ms": int((time.time() - start_time) * 1000),
+            "error": str(error)
+        }
     
     def _generate_local_response(self, message: str, conversation_history: List[Dict[str, Any]], relevant_faqs: List[Dict[str, Any]]) -> str:
         """Generate response using local models"""
@@ -150,7 +553,10 @@ class AIService:
             # Generate response using local model
             if self.text_generator:
                 inputs = self.tokenizer.encode(context, return_tensors="pt", max_length=512, truncation=True)
-                outputs = self.chat_model.generate(inputs, max_length=100, do_sample=True, temperature=0.7)
+                with inference_context():
+                    outputs = self.chat_model.generate(
+                        inputs, max_new_tokens=settings.GENERATION_MAX_NEW_TOKENS, do_sample=True, temperature=0.7
+                    )
                 response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
                 
                 # Clean up response
@@ -166,13 +572,48 @@ class AIService:
             logger.error(f"Local response generation failed: {e}")
             return self._generate_simple_response(message, relevant_faqs)
     
+    async def _generate_batched_response(self, message: str, conversation_history: List[Dict[str, Any]], relevant_faqs: List[Dict[str, Any]]) -> str:
+        """Generate a local response as part of the scheduler's running batch"""
+        context = self._build_context(message, conversation_history, relevant_faqs)
+        timeout = settings.INFERENCE_TIMEOUT_SECONDS
+        try:
+            response = await asyncio.wait_for(self.generation_scheduler.generate(context), timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeoutError(f"generation inference timed out after {timeout}s")
+        except InferenceOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Batched response generation failed: {e}")
+            response = ""
+        return response.strip() or self._generate_simple_response(message, relevant_faqs)
+    
+    async def _stream_batched(self, context: str) -> AsyncIterator[str]:
+        """Relay the scheduler's text for ``context``, giving up after the inference timeout"""
+        timeout = settings.INFERENCE_TIMEOUT_SECONDS
+        deadline = time.monotonic() + timeout
+        chunks = self.generation_scheduler.stream(context)
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(deadline - time.monotonic(), 0))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise InferenceTimeoutError(f"generation inference timed out after {timeout}s")
+                yield chunk
+        finally:
+            await chunks.aclose()
+    
     def _generate_huggingface_response(self, message: str, conversation_history: List[Dict[str, Any]], relevant_faqs: List[Dict[str, Any]]) -> str:
         """Generate response using HuggingFace models"""
         try:
             context = self._build_context(message, conversation_history, relevant_faqs)
             
             if self.text_generator:
-                response = self.text_generator(context, max_length=100, do_sample=True)[0]['generated_text']
+                with inference_context():
+                    response = self.text_generator(
+                        context, max_new_tokens=settings.GENERATION_MAX_NEW_TOKENS, do_sample=True
+                    )[0]['generated_text']
                 response = response.replace(context, "").strip()
                 if not response:
                     response = self._generate_simple_response(message, relevant_faqs)
@@ -185,8 +626,13 @@ class AIService:
             logger.error(f"HuggingFace response generation failed: {e}")
             return self._generate_simple_response(message, relevant_faqs)
     
-    async def _generate_openai_response(self, message: str, conversation_history: List[Dict[str, Any]], relevant_faqs: List[Dict[str, Any]]) -> str:
-        """Generate response using OpenAI (if API key is provided)"""
+    async def _generate_openai_response(
+        self,
+        message: str,
+        conversation_history: List[Dict[str, Any]],
+        relevant_faqs: List[Dict[str, Any]]
+    ) -> Tuple[str, Optional[Dict[str, int]]]:
+        """Generate response using OpenAI (if API key is provided), with its token usage"""
         try:
             import openai
             
@@ -200,11 +646,15 @@ class AIService:
                 stream=False
             )
             
-            return response.choices[0].message.content
+            usage = response.get("usage")
+            if usage:
+                usage = {"prompt_tokens": usage["prompt_tokens"], "completion_tokens": usage["completion_tokens"]}
+            return response.choices[0].message.content, usage
             
         except Exception as e:
             logger.error(f"OpenAI response generation failed: {e}")
-            return self._generate_simple_response(message, relevant_faqs)
+            # Nothing was billed for a failed call
+            return self._generate_simple_response(message, relevant_faqs), {"prompt_tokens": 0, "completion_tokens": 0}
     
     def _generate_simple_response(self, message: str, relevant_faqs: List[Dict[str, Any]]) -> str:
         """Generate simple response when AI models are not available"""
@@ -225,20 +675,76 @@ class AIService:
         else:
             return "I understand your question. Let me help you find the information you need. Could you please provide more details?"
     
+    def _fit_prompt(
+        self,
+        message: str,
+        conversation_history: List[Dict[str, Any]],
+        relevant_faqs: List[Dict[str, Any]]
+    ) -> Tuple[str, Optional[str], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Choose what goes into the prompt within ``PROMPT_TOKEN_BUDGET``.
+        
+        The new message comes first, then the top FAQs, the conversation
+        summary, and as many recent messages as still fit, newest first. Long
+        history messages and FAQ answers are cut to ``PROMPT_MESSAGE_MAX_TOKENS``.
+        Returns the message, summary, history and FAQs to use.
+        """
+        counter = self.token_counter
+        per_message = settings.PROMPT_MESSAGE_MAX_TOKENS
+        
+        history = list(conversation_history or [])
+        summary = None
+        if history and history[0].get("message_type") == MessageType.SYSTEM.value:
+            summary = history.pop(0).get("content") or None
+        # load_turn already appended the new message to the history
+        if history and history[-1].get("message_type") == MessageType.USER.value and history[-1].get("content") == message:
+            history.pop()
+        
+        budget = settings.PROMPT_TOKEN_BUDGET
+        message = counter.truncate(message, max(budget // 2, 1))
+        budget -= counter.count(message)
+        
+        faqs = []
+        for faq in (relevant_faqs or [])[:2]:  # Top 2 FAQs
+            faq = {**faq, "answer": counter.truncate(faq.get("answer", ""), per_message)}
+            cost = counter.count(faq.get("question", "")) + counter.count(faq["answer"])
+            if cost > budget:
+                break
+            faqs.append(faq)
+            budget -= cost
+        
+        if summary:
+            summary = counter.truncate(summary, min(budget, settings.CONVERSATION_SUMMARY_MAX_TOKENS))
+            budget -= counter.count(summary)
+        
+        recent = []
+        for msg in reversed(history):
+            content = counter.truncate(msg.get("content", ""), per_message)
+            cost = counter.count(content) + 2  # Role label
+            if cost > budget:
+                break
+            recent.append({**msg, "content": content})
+            budget -= cost
+        recent.reverse()
+        
+        return message, summary or None, recent, faqs
+    
     def _build_context(self, message: str, conversation_history: List[Dict[str, Any]], relevant_faqs: List[Dict[str, Any]]) -> str:
         """Build context for AI response"""
+        message, summary, history, faqs = self._fit_prompt(message, conversation_history, relevant_faqs)
         context_parts = []
         
+        if summary:
+            context_parts.append(f"Earlier in this conversation:\n{summary}")
+        
         # Add conversation history
-        if conversation_history:
-            for msg in conversation_history[-5:]:  # Last 5 messages
-                role = "User" if msg.get("message_type") == "user" else "Assistant"
-                context_parts.append(f"{role}: {msg.get('content', '')}")
+        for msg in history:
+            role = "User" if msg.get("message_type") == "user" else "Assistant"
+            context_parts.append(f"{role}: {msg.get('content', '')}")
         
         # Add relevant FAQs
-        if relevant_faqs:
+        if faqs:
             faq_context = "Relevant information:\n"
-            for faq in relevant_faqs[:2]:  # Top 2 FAQs
+            for faq in faqs:
                 faq_context += f"Q: {faq.get('question', '')}\nA: {faq.get('answer', '')}\n"
             context_parts.append(faq_context)
         
@@ -250,21 +756,28 @@ class AIService:
     
     def _build_conversation_context(self, message: str, conversation_history: List[Dict[str, Any]], relevant_faqs: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         """Build conversation context for OpenAI"""
+        message, summary, history, faqs = self._fit_prompt(message, conversation_history, relevant_faqs)
+        system_prompt = "You are a helpful AI assistant. Provide concise and helpful responses."
+        if summary:
+            system_prompt += f"\n\nSummary of the earlier conversation:\n{summary}"
+        if faqs:
+            system_prompt += "\n\nAnswer using this information where it applies:\n" + "".join(
+                f"Q: {faq.get('question', '')}\nA: {faq.get('answer', '')}\n" for faq in faqs
+            )
         messages = [
             {
                 "role": "system",
-                "content": "You are a helpful AI assistant. Provide concise and helpful responses."
+                "content": system_prompt
             }
         ]
         
         # Add conversation history
-        if conversation_history:
-            for msg in conversation_history[-10:]:
-                role = "user" if msg.get("message_type") == "user" else "assistant"
-                messages.append({
-                    "role": role,
-                    "content": msg.get("content", "")
-                })
+        for msg in history:
+            role = "user" if msg.get("message_type") == "user" else "assistant"
+            messages.append({
+                "role": role,
+                "content": msg.get("content", "")
+            })
         
         # Add current message
         messages.append({
@@ -274,19 +787,118 @@ class AIService:
         
         return messages
     
+    @property
+    def embedding_model_version(self) -> str:
+        """Identity of the model that produces embeddings right now (cache key and FAQ embedding tag)"""
+        return self._model_version(self.embedding_model, self.embedding_model_name)
+    
+    @staticmethod
+    def _model_version(model, name: str) -> str:
+        if model and SENTENCE_TRANSFORMERS_AVAILABLE:
+            if settings.MODEL_QUANTIZATION != "none":
+                # Quantized vectors differ slightly; keep them apart in the cache
+                return f"{name}+{settings.MODEL_QUANTIZATION}"
+            return name
+        return "simple-fallback"
+    
+    def load_embedding_model(self, name: str) -> Tuple[Any, str]:
+        """Load another embedding model without using it yet; returns it with its version.
+        
+        Blocking. Without sentence_transformers the model is None and the version is the fallback.
+        """
+        model = None
+        if SENTENCE_TRANSFORMERS_AVAILABLE:
+            model = prepare_embedding_model(SentenceTransformer(name))
+        return model, self._model_version(model, name)
+    
+    def swap_embedding_model(self, model, name: str):
+        """Serve embeddings from ``model`` from now on"""
+        self.embedding_model = model
+        self.embedding_model_name = name
+        logger.info(f"Embedding model switched to {self.embedding_model_version}")
+    
     async def generate_embeddings(self, text: str) -> List[float]:
         """Generate embeddings using local models"""
+        cached = await self.embedding_cache.get(text, self.embedding_model_version)
+        if cached is not None:
+            return cached.tolist()
+        
+        if self.embedding_batcher is not None:
+            # Concurrent requests are coalesced into one encode call
+            return await self.embedding_batcher.submit(text)
+        
+        return (await self.generate_embeddings_batch([text]))[0]
+    
+    async def generate_embeddings_batch(self, texts: List[str], cache: bool = True) -> List[List[float]]:
+        """Generate embeddings for many texts with a single model call.
+        
+        ``cache=False`` bypasses the embedding cache, for one-off texts such as bulk imports.
+        """
+        model_version = self.embedding_model_version
+        cached = await self.embedding_cache.get_many(texts, model_version) if cache else {}
+        vectors: Dict[str, List[float]] = {text: vector.tolist() for text, vector in cached.items()}
+        missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+        
+        if missing:
+            vectors.update(zip(missing, await self._embed_uncached(missing, cache)))
+        
+        return [vectors[text] for text in texts]
+    
+    async def _embed_uncached(self, texts: List[str], cache: bool = True) -> List[List[float]]:
+        """Encode texts without looking them up; with ``cache`` the results are stored.
+        
+        Raises EmbeddingUnavailableError when the model fails or times out.
+        Hash vectors instead would have the model's dimensions and be stored or
+        scored as its embeddings.
+        """
+        model_version = self.embedding_model_version
         try:
-            if self.embedding_model and SENTENCE_TRANSFORMERS_AVAILABLE:
-                embeddings = self.embedding_model.encode(text)
-                return embeddings.tolist()
-            else:
-                # Simple fallback embedding
-                return self._simple_embedding(text)
-                
+            encoded = await self.embedding_pool.run(self._encode_batch, texts)
+        except InferenceOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"Embedding generation failed: {e}")
-            return self._simple_embedding(text)
+            raise EmbeddingUnavailableError(f"{model_version} could not embed {len(texts)} texts: {e}") from e
+        
+        if cache:
+            for text, embedding in zip(texts, encoded):
+                self.embedding_cache.put(text, model_version, embedding)
+        return [embedding.tolist() for embedding in encoded]
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Blocking batched encode; runs off the event loop"""
+        return self.encode_with(self.embedding_model, texts)
+    
+    def encode_with(self, model, texts: List[str]) -> np.ndarray:
+        """Blocking batched encode with a given embedding model (None for the fallback)"""
+        if model and SENTENCE_TRANSFORMERS_AVAILABLE:
+            with inference_context():
+                embeddings = model.encode(texts, batch_size=settings.EMBEDDING_BATCH_SIZE)
+            return np.asarray(embeddings, dtype=np.float32)
+        # Simple fallback embedding
+        return np.asarray([self._simple_embedding(text) for text in texts], dtype=np.float32)
+    
+    def warm_up(self):
+        """Run one tiny inference pass so the first chat turn doesn't pay for lazy init"""
+        chat_model = getattr(self, "chat_model", None) if getattr(self, "text_generator", None) is not None else None
+        embedding_model = getattr(self, "embedding_model", None)
+        try:
+            with inference_context():
+                if embedding_model is not None:
+                    embedding_model.encode("warm up")
+                if chat_model is not None:
+                    inputs = self.tokenizer.encode("Hello", return_tensors="pt")
+                    chat_model.generate(inputs, max_length=inputs.shape[-1] + 1)
+            logger.info("AI models warmed up")
+        except Exception as e:
+            logger.warning(f"Model warm-up failed: {e}")
+            return
+        
+        if settings.MODEL_STARTUP_REPORT and (chat_model is not None or embedding_model is not None):
+            try:
+                logger.info(f"Model report: {startup_report(chat_model, self.tokenizer if chat_model is not None else None, embedding_model)}")
+            except Exception as e:
+                logger.warning(f"Model report failed: {e}")
     
     def _simple_embedding(self, text: str) -> List[float]:
         """Simple fallback embedding using basic text features"""
@@ -323,4 +935,20 @@ class AIService:
             "flagged": flagged,
             "categories": {"inappropriate": flagged},
             "category_scores": {"inappropriate": 0.8 if flagged else 0.1}
-        } 
\ No newline at end of file
+        }
+
+
+# One model registry per worker process: models are loaded once and shared by
+# every request instead of being re-read from disk on each chat turn.
+_ai_service: Optional[AIService] = None
+_ai_service_lock = threading.Lock()
+
+
+def get_ai_service() -> AIService:
+    """Dependency returning the process-wide AIService, creating it on first use"""
+    global _ai_service
+    if _ai_service is None:
+        with _ai_service_lock:
+            if _ai_service is None:
+                _ai_service = AIService()
+    return _ai_service
@@ -0,0 +1,254 @@
+from typing import List, Dict, Optional, Sequence
+import logging
+import os
+import numpy as np
+
+# Try to import faiss, fallback if not available
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+
+class ANNIndex:
+    """Candidate generator for approximate nearest neighbour search.
+
+    Implementations index one or more normalized vectors per FAQ id and return
+    candidate ids for a query; the caller re-scores candidates exactly.
+    """
+
+    kind = "base"
+
+    def build(self, ids: np.ndarray, vectors: Sequence[np.ndarray]):
+        raise NotImplementedError
+
+    def add(self, faq_id: int, vectors: Sequence[np.ndarray]):
+        raise NotImplementedError
+
+    def remove(self, faq_id: int):
+        raise NotImplementedError
+
+    def candidates(self, query: np.ndarray, k: int) -> np.ndarray:
+        raise NotImplementedError
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return False
+
+    def save(self, path: str):
+        raise NotImplementedError
+
+    def load(self, path: str, ids: np.ndarray, vectors: Sequence[np.ndarray]) -> bool:
+        """Restore persisted state for the given rows; return False if it can't be reused"""
+        raise NotImplementedError
+
+
+class IVFIndex(ANNIndex):
+    """Inverted-file index over spherical k-means centroids.
+
+    Each FAQ id is listed under the nearest centroid of each of its vectors.
+    A query probes the ``nprobe`` closest lists, so latency and recall are
+    traded off by ``nprobe`` relative to ``nlist``.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, iterations: int = 10, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[set] = []
+        self._arrays: Dict[int, np.ndarray] = {}
+        self.assignments: Dict[int, List[int]] = {}
+        self.trained_size = 0
+
+    def _train(self, data: np.ndarray):
+        rng = np.random.default_rng(self.seed)
+        nlist = self.nlist or max(1, int(np.sqrt(data.shape[0])))
+        nlist = min(nlist, data.shape[0])
+
+        # k-means does not need every point; cap the sample like FAISS does
+        sample_size = min(data.shape[0], nlist * 256)
+        sample = data[rng.choice(data.shape[0], sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        columns = np.ascontiguousarray(sample.T)
+
+        for _ in range(self.iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            # Per-dimension weighted bincount is far faster than np.add.at for cluster sums
+            sums = np.stack(
+                [np.bincount(assign, weights=column, minlength=nlist) for column in columns],
+                axis=1
+            ).astype(np.float32)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self.centroids = centroids
+
+    def _assign(self, ids: np.ndarray, vectors: Sequence[np.ndarray]):
+        self.lists = [set() for _ in range(self.centroids.shape[0])]
+        self._arrays = {}
+        self.assignments = {}
+        nearest = [np.argmax(matrix @ self.centroids.T, axis=1) for matrix in vectors]
+        for row, faq_id in enumerate(ids.tolist()):
+            buckets = sorted({int(lists[row]) for lists in nearest})
+            for bucket in buckets:
+                self.lists[bucket].add(faq_id)
+            self.assignments[faq_id] = buckets
+        self.trained_size = len(ids)
+
+    def build(self, ids: np.ndarray, vectors: Sequence[np.ndarray]):
+        self._train(np.concatenate(vectors))
+        self._assign(ids, vectors)
+
+    def add(self, faq_id: int, vectors: Sequence[np.ndarray]):
+        self.remove(faq_id)
+        buckets = sorted({int(np.argmax(self.centroids @ vector)) for vector in vectors})
+        for bucket in buckets:
+            self.lists[bucket].add(faq_id)
+            self._arrays.pop(bucket, None)
+        self.assignments[faq_id] = buckets
+
+    def remove(self, faq_id: int):
+        for bucket in self.assignments.pop(faq_id, []):
+            self.lists[bucket].discard(faq_id)
+            self._arrays.pop(bucket, None)
+
+    def _list_array(self, bucket: int) -> np.ndarray:
+        array = self._arrays.get(bucket)
+        if array is None:
+            array = np.fromiter(self.lists[bucket], dtype=np.int64, count=len(self.lists[bucket]))
+            self._arrays[bucket] = array
+        return array
+
+    def candidates(self, query: np.ndarray, k: int) -> np.ndarray:
+        nprobe = min(self.nprobe, len(self.lists))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.unique(np.concatenate([self._list_array(int(i)) for i in probe]))
+
+    @property
+    def needs_rebuild(self) -> bool:
+        # Centroids trained on a much smaller corpus give badly unbalanced lists
+        return len(self.assignments) > 4 * max(self.trained_size, 1)
+
+    def save(self, path: str):
+        np.save(f"{path}.npy", self.centroids)
+
+    def load(self, path: str, ids: np.ndarray, vectors: Sequence[np.ndarray]) -> bool:
+        if not os.path.exists(f"{path}.npy"):
+            return False
+        centroids = np.load(f"{path}.npy")
+        if centroids.shape[1] != vectors[0].shape[1]:
+            return False
+        # Only the trained quantizer is persisted; assigning rows is a single matmul
+        self.centroids = centroids.astype(np.float32)
+        self._assign(ids, vectors)
+        return True
+
+
+class FaissHNSWIndex(ANNIndex):
+    """HNSW graph index backed by FAISS (optional dependency).
+
+    HNSW graphs cannot delete points, so removals are tombstoned and filtered
+    out of results; the graph asks to be rebuilt once tombstones pile up.
+    """
+
+    kind = "faiss"
+
+    def __init__(self, m: int = 32, ef_construction: int = 80, ef_search: int = 64):
+        if not FAISS_AVAILABLE:
+            raise RuntimeError("faiss is not installed; use the 'ivf' or 'exact' FAQ index backend")
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = None
+        self.live: set = set()
+        self.tombstones: set = set()
+        self.stale = False
+
+    def _new_index(self, dim: int):
+        hnsw = faiss.IndexHNSWFlat(dim, self.m, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = self.ef_construction
+        return faiss.IndexIDMap2(hnsw)
+
+    def build(self, ids: np.ndarray, vectors: Sequence[np.ndarray]):
+        self.index = self._new_index(vectors[0].shape[1])
+        for matrix in vectors:
+            self.index.add_with_ids(np.ascontiguousarray(matrix, dtype=np.float32), ids.astype(np.int64))
+        self.live = set(ids.tolist())
+        self.tombstones = set()
+        self.stale = False
+
+    def add(self, faq_id: int, vectors: Sequence[np.ndarray]):
+        if faq_id in self.live or faq_id in self.tombstones:
+            # The old vectors are still in the graph; rebuild rather than serve them
+            self.stale = True
+        self.tombstones.discard(faq_id)
+        self.live.add(faq_id)
+        ids = np.array([faq_id], dtype=np.int64)
+        for vector in vectors:
+            self.index.add_with_ids(np.ascontiguousarray(vector[None, :], dtype=np.float32), ids)
+
+    def remove(self, faq_id: int):
+        if faq_id in self.live:
+            self.live.discard(faq_id)
+            self.tombstones.add(faq_id)
+
+    def candidates(self, query: np.ndarray, k: int) -> np.ndarray:
+        self.index.index.hnsw.efSearch = max(self.ef_search, k)
+        # Each id is stored once per vector, so over-fetch to cover duplicates and tombstones
+        fetch = 2 * k + len(self.tombstones)
+        _, labels = self.index.search(np.ascontiguousarray(query[None, :], dtype=np.float32), fetch)
+        labels = labels[0]
+        labels = labels[labels >= 0]
+        if self.tombstones:
+            labels = labels[~np.isin(labels, np.fromiter(self.tombstones, dtype=np.int64))]
+        return np.unique(labels)
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self.stale or len(self.tombstones) > 0.1 * max(len(self.live), 1)
+
+    def save(self, path: str):
+        faiss.write_index(self.index, f"{path}.faiss")
+        np.save(f"{path}.ids.npy", np.fromiter(self.live, dtype=np.int64))
+
+    def load(self, path: str, ids: np.ndarray, vectors: Sequence[np.ndarray]) -> bool:
+        if not os.path.exists(f"{path}.faiss") or not os.path.exists(f"{path}.ids.npy"):
+            return False
+        saved_ids = np.load(f"{path}.ids.npy")
+        if not np.array_equal(np.sort(saved_ids), np.sort(ids)):
+            return False
+        self.index = faiss.read_index(f"{path}.faiss")
+        self.live = set(ids.tolist())
+        self.tombstones = set()
+        self.stale = False
+        return True
+
+
+def create_ann_index(
+    backend: str,
+    nlist: int = 0,
+    nprobe: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 80,
+    ef_search: int = 64
+) -> Optional[ANNIndex]:
+    """Build an empty ANN index for the configured backend, or None for exact search"""
+    if backend == "exact":
+        return None
+    if backend == "ivf":
+        return IVFIndex(nlist=nlist, nprobe=nprobe)
+    if backend == "faiss":
+        return FaissHNSWIndex(m=hnsw_m, ef_construction=ef_construction, ef_search=ef_search)
+    raise ValueError(f"Unknown FAQ index backend: {backend}")
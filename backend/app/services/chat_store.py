@@ -0,0 +1,307 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+from sqlalchemy import Select, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.conversation import Conversation, Message, MessageType, MessageStatus
+from app.schemas.conversation import ChatRequest
+from app.services.history_cache import HistoryCache
+from app.services.message_writer import message_writer
+from app.services.token_counter import record_token_usage
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Messages (including the new one) sent to the model as context
+HISTORY_LIMIT = 10
+
+history_cache = HistoryCache(
+    window=HISTORY_LIMIT - 1,
+    redis_url=settings.REDIS_URL if settings.HISTORY_CACHE_REDIS else None
+)
+
+
+def new_conversation(user_id: int, chat_request: ChatRequest) -> Conversation:
+    """Build an unsaved conversation for the first message of a chat"""
+    message = chat_request.message
+    return Conversation(
+        user_id=user_id,
+        language=chat_request.language,
+        context=chat_request.context,
+        title=message[:50] + "..." if len(message) > 50 else message,
+        message_count=0,
+        total_tokens=0
+    )
+
+
+async def load_turn(
+    db: AsyncSession,
+    user_id: int,
+    chat_request: ChatRequest
+) -> Tuple[Conversation, List[Dict[str, Any]]]:
+    """Load the conversation and its recent history without writing anything.
+
+    A new conversation is returned unsaved; ``save_turn`` inserts it together
+    with the messages.
+    """
+    conversation = None
+    if chat_request.conversation_id:
+        result = await db.execute(
+            select(Conversation).where(
+                Conversation.id == chat_request.conversation_id,
+                Conversation.user_id == user_id
+            )
+        )
+        conversation = result.scalar_one_or_none()
+
+    conversation_history: List[Dict[str, Any]] = []
+    if conversation is None:
+        conversation = new_conversation(user_id, chat_request)
+    else:
+        message_count = conversation.message_count or 0
+        conversation_history = await history_cache.get(conversation.id, message_count)
+        if conversation_history is None:
+            conversation_history = await _load_history(db, conversation.id)
+            await history_cache.put(conversation.id, message_count, conversation_history)
+
+    # Release the connection while the model runs. Closing ends the read
+    # without a COMMIT and leaves the loaded objects usable, detached;
+    # save_turn attaches the conversation again.
+    await db.close()
+
+    if conversation.summary:
+        # Older messages reach the model through the rolling summary
+        conversation_history.insert(0, _history_entry(conversation.summary, MessageType.SYSTEM, datetime.utcnow()))
+    conversation_history.append(_history_entry(chat_request.message, MessageType.USER, datetime.utcnow()))
+    return conversation, conversation_history
+
+
+def history_query(conversation_id: int) -> Select:
+    """Most recent messages of a conversation, newest first"""
+    return (
+        select(Message)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(HISTORY_LIMIT - 1)
+    )
+
+
+async def _load_history(db: AsyncSession, conversation_id: int) -> List[Dict[str, Any]]:
+    """Read the recent history window from the database"""
+    result = await db.execute(history_query(conversation_id))
+    history = list(result.scalars().all())
+    history.reverse()
+    conversation_history = [_history_entry(msg.content, msg.message_type, msg.created_at) for msg in history]
+
+    if message_writer.running:
+        # Include turns that are still waiting in the write-behind queue
+        stored = {(entry["message_type"], entry["content"]) for entry in conversation_history}
+        for row in message_writer.pending(conversation_id):
+            entry = _history_entry(row["content"], row["message_type"], row["created_at"])
+            if (entry["message_type"], entry["content"]) not in stored:
+                conversation_history.append(entry)
+        conversation_history = conversation_history[-(HISTORY_LIMIT - 1):]
+    return conversation_history
+
+
+def _history_entry(content: str, message_type: MessageType, created_at: datetime) -> Dict[str, Any]:
+    return {
+        "content": content,
+        "message_type": message_type.value,
+        "created_at": created_at.isoformat()
+    }
+
+
+def _turn_rows(
+    conversation_id: int,
+    user_id: int,
+    chat_request: ChatRequest,
+    ai_response: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Column values for the user message and bot reply of a turn.
+
+    Both rows carry the same columns so they can share one INSERT.
+    """
+    return [
+        {
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "content": chat_request.message,
+            "message_type": MessageType.USER,
+            "status": MessageStatus.SENT,
+            "tokens_used": 0,
+            "model_used": None,
+            "response_time_ms": None,
+            "message_metadata": None
+        },
+        {
+            "conversation_id": conversation_id,
+            "user_id": user_id,  # Same user_id for bot messages
+            "content": ai_response["content"],
+            "message_type": MessageType.BOT,
+            "status": MessageStatus.SENT,
+            "tokens_used": ai_response.get("tokens_used", 0),
+            "model_used": ai_response.get("model_used"),
+            "response_time_ms": ai_response.get("response_time_ms"),
+            "message_metadata": {
+                "prompt_tokens": ai_response.get("prompt_tokens", 0),
+                "completion_tokens": ai_response.get("completion_tokens", 0),
+                "relevant_faqs": ai_response.get("relevant_faqs", [])
+            }
+        }
+    ]
+
+
+async def save_turn(
+    db: AsyncSession,
+    conversation: Conversation,
+    user_id: int,
+    chat_request: ChatRequest,
+    ai_response: Dict[str, Any]
+) -> Message:
+    """Persist the user message, bot reply and conversation counters in one transaction.
+
+    Generated ids, server defaults and the updated counters come back through
+    ``RETURNING``, so nothing needs refreshing afterwards. With write-behind
+    enabled the messages are queued instead and the bot message is returned
+    unsaved, carrying its reserved id.
+    """
+    tokens_used = ai_response.get("tokens_used", 0)
+    now = datetime.utcnow()
+    record_token_usage(user_id, ai_response)
+
+    if message_writer.running:
+        bot_message = await _queue_turn(db, conversation, user_id, chat_request, ai_response, now)
+        if bot_message is not None:
+            return bot_message
+
+    if conversation.id is None:
+        conversation.message_count = 2  # User + Bot message
+        conversation.total_tokens = tokens_used
+        conversation.last_message_at = now
+        db.add(conversation)
+        await db.flush()
+    else:
+        db.add(conversation)
+        # Increment in SQL so concurrent turns on one conversation don't lose
+        # updates; RETURNING refreshes the loaded object in the same statement
+        await db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation.id)
+            .values(
+                message_count=Conversation.message_count + 2,
+                total_tokens=Conversation.total_tokens + tokens_used,
+                last_message_at=now
+            )
+            .returning(Conversation)
+        )
+
+    rows = _turn_rows(conversation.id, user_id, chat_request, ai_response)
+    await _assign_ids(rows)
+    user_message, bot_message = (Message(**row) for row in rows)
+    # Added in order so the user message gets the lower id
+    db.add_all([user_message, bot_message])
+
+    await db.commit()
+    await _remember_turn(conversation, rows, now, conversation.message_count)
+    return bot_message
+
+
+async def save_user_message(
+    db: AsyncSession,
+    conversation: Conversation,
+    user_id: int,
+    chat_request: ChatRequest
+) -> Message:
+    """Persist only the user message of a turn that produced no reply.
+
+    Used when generation is rejected or fails, so the message the user sent
+    is kept in the conversation even though no bot message follows.
+    """
+    now = datetime.utcnow()
+    if conversation.id is None:
+        conversation.message_count = 1
+        conversation.last_message_at = now
+        db.add(conversation)
+        await db.flush()
+    else:
+        db.add(conversation)
+        await db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation.id)
+            .values(message_count=Conversation.message_count + 1, last_message_at=now)
+            .returning(Conversation)
+        )
+
+    row = _turn_rows(conversation.id, user_id, chat_request, {"content": None})[0]
+    await _assign_ids([row])
+    user_message = Message(**row)
+    db.add(user_message)
+
+    await db.commit()
+    # With write-behind the stored count lags behind queued turns, so extend
+    # whatever window is cached instead of matching counts
+    await _remember_turn(conversation, [row], now, None if message_writer.running else conversation.message_count)
+    return user_message
+
+
+async def _assign_ids(rows: List[Dict[str, Any]]):
+    """Give rows reserved ids while write-behind runs, so they can't collide with queued ones"""
+    if message_writer.running:
+        for row, message_id in zip(rows, await message_writer.reserve_ids(len(rows))):
+            row["id"] = message_id
+
+
+async def _remember_turn(
+    conversation: Conversation,
+    rows: List[Dict[str, Any]],
+    now: datetime,
+    message_count: Optional[int]
+) -> Optional[int]:
+    """Extend the cached history window with a saved or queued turn"""
+    return await history_cache.append(
+        conversation.id,
+        [_history_entry(row["content"], row["message_type"], now) for row in rows],
+        message_count
+    )
+
+
+async def _queue_turn(
+    db: AsyncSession,
+    conversation: Conversation,
+    user_id: int,
+    chat_request: ChatRequest,
+    ai_response: Dict[str, Any],
+    now: datetime
+) -> Optional[Message]:
+    """Hand the turn's messages to the write-behind queue.
+
+    Returns the unsaved bot message, with its reserved id, or None if the
+    queue is full and the caller should write synchronously.
+    """
+    is_new = conversation.id is None
+    if is_new:
+        # Created inline so the client gets a conversation id to continue with;
+        # the flusher adds the message counts
+        conversation.last_message_at = now
+        db.add(conversation)
+        await db.commit()
+
+    rows = _turn_rows(conversation.id, user_id, chat_request, ai_response)
+    await _assign_ids(rows)
+    for row in rows:
+        row["created_at"] = now
+    if not message_writer.enqueue(rows):
+        logger.warning("Write-behind queue is full; saving the turn synchronously")
+        return None
+
+    # Reflect the queued turn in the returned conversation without writing it.
+    # The stored count lags behind queued messages, so prefer the cache's count.
+    # The streaming endpoint hands over a conversation already detached from its session
+    if conversation in db:
+        db.expunge(conversation)
+    new_count = await _remember_turn(conversation, rows, now, 2 if is_new else None)
+    conversation.message_count = new_count or (conversation.message_count or 0) + 2
+    conversation.total_tokens += ai_response.get("tokens_used", 0)
+    conversation.last_message_at = now
+    return Message(**rows[1])
@@ -0,0 +1,196 @@
+from typing import Any, Dict, Optional, Set, Union
+from fastapi import WebSocket, status
+from prometheus_client import Counter, Gauge
+from app.config import settings
+from app.services.pubsub import FanoutBus
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections",
+    "Open chat WebSocket connections in this worker"
+)
+WEBSOCKET_DROPPED = Counter(
+    "websocket_dropped_connections_total",
+    "WebSocket connections closed by the server (slow_client, heartbeat_timeout)",
+    ["reason"]
+)
+
+
+class ClientConnection:
+    """One accepted socket with its own bounded outbound queue.
+
+    Frames are written by a dedicated sender task, so a client that reads
+    slowly only fills its own queue instead of blocking whoever is sending.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._sender: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._sender = asyncio.create_task(self._send_loop())
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, frame: str) -> bool:
+        """Queue a frame without waiting; False if the socket is closed or its queue is full"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _send_loop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket send to user {self.user_id} failed: {e}")
+            self.closed = True
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        if self.closed and self._sender is None:
+            return
+        self.closed = True
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            # Already closed by the client
+            pass
+
+
+class ConnectionManager:
+    """Tracks every open chat socket per user and fans frames out to all of them.
+
+    A user may hold several connections (tabs, devices), possibly spread over
+    several workers; see ``FanoutBus``. Sockets that stop answering heartbeats
+    or can't keep up with their send queue are closed.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = settings.WS_SEND_QUEUE_SIZE,
+        heartbeat_interval: float = settings.WS_HEARTBEAT_INTERVAL_SECONDS,
+        heartbeat_timeout: float = settings.WS_HEARTBEAT_TIMEOUT_SECONDS
+    ):
+        self.queue_size = queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.active_connections: Dict[int, Set[ClientConnection]] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._closing: Set[asyncio.Task] = set()
+        self.bus: Optional[FanoutBus] = None
+
+    async def start(self, bus: FanoutBus):
+        """Route frames for users connected to other workers through ``bus``"""
+        self.bus = bus
+        await bus.start(self._deliver_local, lambda: list(self.active_connections))
+
+    async def connect(self, websocket: WebSocket, user_id: int) -> ClientConnection:
+        """Track an accepted, authenticated socket"""
+        connection = ClientConnection(websocket, user_id, self.queue_size)
+        connection.start()
+        first = user_id not in self.active_connections
+        self.active_connections.setdefault(user_id, set()).add(connection)
+        WEBSOCKET_CONNECTIONS.inc()
+
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        if first and self.bus is not None:
+            await self.bus.join(user_id)
+        return connection
+
+    async def disconnect(self, connection: ClientConnection, code: int = status.WS_1000_NORMAL_CLOSURE):
+        connections = self.active_connections.get(connection.user_id)
+        if connections is not None and connection in connections:
+            connections.discard(connection)
+            WEBSOCKET_CONNECTIONS.dec()
+            if not connections:
+                del self.active_connections[connection.user_id]
+                if self.bus is not None:
+                    await self.bus.leave(connection.user_id)
+        await connection.close(code)
+
+    def is_connected(self, user_id: int) -> bool:
+        return bool(self.active_connections.get(user_id))
+
+    def send_personal_message(self, message: Union[str, Dict[str, Any]], user_id: int) -> int:
+        """Send a frame to every socket of a user, on this worker and others.
+
+        Returns how many local sockets accepted it.
+        """
+        frame = message if isinstance(message, str) else json.dumps(message, default=str)
+        if self.bus is not None:
+            self.bus.publish(user_id, frame)
+        return self._deliver_local(user_id, frame)
+
+    def _deliver_local(self, user_id: int, frame: str) -> int:
+        delivered = 0
+        for connection in list(self.active_connections.get(user_id, ())):
+            if connection.enqueue(frame):
+                delivered += 1
+            elif not connection.closed:
+                logger.warning(f"Dropping slow WebSocket client for user {user_id}")
+                WEBSOCKET_DROPPED.labels(reason="slow_client").inc()
+                self._close_later(connection, status.WS_1013_TRY_AGAIN_LATER)
+        return delivered
+
+    def _close_later(self, connection: ClientConnection, code: int):
+        connection.closed = True
+        task = asyncio.create_task(self.disconnect(connection, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _heartbeat_loop(self):
+        ping = json.dumps({"type": "ping"})
+        while self.active_connections:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for connections in list(self.active_connections.values()):
+                for connection in list(connections):
+                    if now - connection.last_seen > self.heartbeat_timeout:
+                        logger.info(f"WebSocket for user {connection.user_id} missed heartbeats")
+                        WEBSOCKET_DROPPED.labels(reason="heartbeat_timeout").inc()
+                        self._close_later(connection, status.WS_1001_GOING_AWAY)
+                    elif not connection.enqueue(ping) and not connection.closed:
+                        WEBSOCKET_DROPPED.labels(reason="slow_client").inc()
+                        self._close_later(connection, status.WS_1013_TRY_AGAIN_LATER)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self.active_connections),
+            "connections": sum(len(c) for c in self.active_connections.values()),
+        }
+
+    async def close(self):
+        """Close every socket, e.g. on shutdown"""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                await self.disconnect(connection, status.WS_1001_GOING_AWAY)
+        if self.bus is not None:
+            await self.bus.close()
+            self.bus = None
+
+
+connection_manager = ConnectionManager()
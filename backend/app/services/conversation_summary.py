@@ -0,0 +1,162 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.conversation import Conversation, Message, MessageType
+from app.services.token_counter import TokenCounter
+import asyncio
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Tokens kept per message in an extractive summary line
+SUMMARY_LINE_TOKENS = 40
+
+_FIRST_SENTENCE = re.compile(r"(.+?[.!?])(\s|$)", re.S)
+
+
+class ConversationSummarizer:
+    """Folds messages that have left the prompt window into a rolling summary.
+
+    The summary is stored on the conversation together with the number of
+    messages it covers, and is brought up to date in the background once at
+    least ``every_n_turns`` turns have dropped out of the history window, so
+    each update only reads the new messages.
+    """
+
+    def __init__(
+        self,
+        ai_service,
+        window: int,
+        every_n_turns: int = settings.CONVERSATION_SUMMARY_EVERY_N_TURNS,
+        max_tokens: int = settings.CONVERSATION_SUMMARY_MAX_TOKENS,
+        session_factory=AsyncSessionLocal
+    ):
+        self.ai_service = ai_service
+        self.window = window
+        self.every_n_messages = every_n_turns * 2
+        self.max_tokens = max_tokens
+        self.session_factory = session_factory
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        return self.ai_service.token_counter
+
+    def due(self, conversation: Conversation) -> bool:
+        """Whether enough messages have left the window to update the summary"""
+        if self.every_n_messages <= 0 or conversation.id is None:
+            return False
+        unsummarized = (conversation.message_count or 0) - self.window - (conversation.summary_message_count or 0)
+        return unsummarized >= self.every_n_messages
+
+    def schedule(self, conversation: Conversation):
+        """Update the conversation's summary in the background if it is due"""
+        if not self.due(conversation) or conversation.id in self._tasks:
+            return
+        task = asyncio.create_task(self.update(conversation.id))
+        self._tasks[conversation.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(conversation.id, None))
+
+    async def update(self, conversation_id: int):
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(
+                        Conversation.summary,
+                        Conversation.summary_message_count,
+                        Conversation.message_count
+                    ).where(Conversation.id == conversation_id)
+                )
+                row = result.one_or_none()
+                if row is None:
+                    return
+                summary, covered, message_count = row
+                covered = covered or 0
+                target = (message_count or 0) - self.window
+                if target <= covered:
+                    return
+
+                result = await db.execute(
+                    select(Message.content, Message.message_type)
+                    .where(Message.conversation_id == conversation_id)
+                    .order_by(Message.created_at, Message.id)
+                    .offset(covered)
+                    .limit(target - covered)
+                )
+                messages = result.all()
+                if not messages:
+                    return
+
+                new_summary = await self.summarize(summary, messages)
+                # Only apply it if no other worker updated the summary meanwhile
+                await db.execute(
+                    update(Conversation)
+                    .where(
+                        Conversation.id == conversation_id,
+                        Conversation.summary_message_count == covered
+                    )
+                    .values(summary=new_summary, summary_message_count=covered + len(messages))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                logger.debug(f"Summarized {len(messages)} messages of conversation {conversation_id}")
+        except Exception as e:
+            logger.error(f"Conversation {conversation_id} summary update failed: {e}")
+
+    async def summarize(self, previous: Optional[str], messages: List[Tuple[str, MessageType]]) -> str:
+        """Fold ``messages`` into ``previous``, within ``max_tokens``"""
+        if self.ai_service.ai_provider == "openai":
+            try:
+                return await self._summarize_openai(previous, messages)
+            except Exception as e:
+                logger.warning(f"OpenAI summary failed, falling back to extractive: {e}")
+        return self._summarize_extractive(previous, messages)
+
+    async def _summarize_openai(self, previous: Optional[str], messages: List[Tuple[str, MessageType]]) -> str:
+        import openai
+
+        transcript = "\n".join(
+            f"{self._role(message_type)}: {self.token_counter.truncate(content, settings.PROMPT_MESSAGE_MAX_TOKENS)}"
+            for content, message_type in messages
+        )
+        prompt = f"Summary so far:\n{previous}\n\n" if previous else ""
+        prompt += f"New messages:\n{transcript}"
+
+        response = await openai.ChatCompletion.acreate(
+            model="gpt-3.5-turbo",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Update the summary of this support conversation. Keep the user's goals, "
+                               "facts they gave and answers already provided. Reply with the summary only."
+                },
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=self.max_tokens,
+            temperature=0
+        )
+        return response.choices[0].message.content.strip()
+
+    def _summarize_extractive(self, previous: Optional[str], messages: List[Tuple[str, MessageType]]) -> str:
+        """First sentence of each message, dropping the oldest lines once over budget"""
+        lines = previous.split("\n") if previous else []
+        for content, message_type in messages:
+            content = " ".join(content.split())
+            match = _FIRST_SENTENCE.match(content)
+            sentence = match.group(1) if match else content
+            lines.append(f"{self._role(message_type)}: {self.token_counter.truncate(sentence, SUMMARY_LINE_TOKENS)}")
+
+        while len(lines) > 1 and self.token_counter.count("\n".join(lines)) > self.max_tokens:
+            lines.pop(0)
+        return self.token_counter.truncate("\n".join(lines), self.max_tokens)
+
+    @staticmethod
+    def _role(message_type) -> str:
+        return "User" if MessageType(message_type) == MessageType.USER else "Assistant"
+
+    async def close(self):
+        """Let in-flight summary updates finish"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks.values()), timeout=10)
@@ -0,0 +1,295 @@
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from prometheus_client import Counter, Gauge
+from app.models.embedding import encode_embedding, decode_embedding
+import numpy as np
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_REQUESTS = Counter(
+    "embedding_cache_requests_total",
+    "Embedding cache lookups by result (memory_hit, disk_hit, miss)",
+    ["result"]
+)
+EMBEDDING_CACHE_EVICTIONS = Counter(
+    "embedding_cache_evictions_total",
+    "Embeddings evicted from the in-memory cache"
+)
+EMBEDDING_CACHE_BYTES = Gauge(
+    "embedding_cache_bytes",
+    "Bytes held by the in-memory embedding cache"
+)
+EMBEDDING_CACHE_WRITES = Counter(
+    "embedding_cache_store_writes_total",
+    "Embeddings handed to the persistent tier by result (written, dropped)",
+    ["result"]
+)
+
+# Seconds the writer thread waits to batch up puts before committing
+_WRITE_INTERVAL = 0.5
+# Puts that wake the writer early, and the most it keeps waiting
+_WRITE_BATCH_SIZE = 256
+_MAX_PENDING_WRITES = 10000
+# The store is pruned back once it grows this far past its limit
+_PRUNE_SLACK = 0.1
+# Keys per SELECT, under SQLite's bound parameter limit
+_READ_CHUNK = 500
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with a bounded LRU memory tier.
+
+    Entries are keyed by a hash of the embedding model and the exact text, so
+    switching models never serves stale vectors. An optional SQLite file keeps
+    entries across worker restarts. Its reads run in a worker thread and its
+    writes are committed in batches by a writer thread, so the event loop only
+    ever touches the memory tier. The writer also prunes the file when it
+    grows past ``max_persisted_entries``.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        persist_path: Optional[str] = None,
+        max_persisted_entries: int = 0
+    ):
+        self.max_bytes = max_bytes
+        self.max_persisted_entries = max_persisted_entries
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._read_lock = threading.Lock()
+        self._stored_rows = 0
+        # Written by the writer thread: key -> (vector, model)
+        self._pending: Dict[str, Tuple[np.ndarray, str]] = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+        if persist_path:
+            self._open_store(persist_path)
+
+    def _open_store(self, path: str):
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+            self._stored_rows = self._db.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+            # WAL lets lookups read on their own connection while the writer commits
+            self._reader = sqlite3.connect(path, check_same_thread=False)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open embedding cache store {path}: {e}")
+            self._db = self._reader = None
+            return
+
+        self._writer = threading.Thread(target=self._write_loop, name="embedding-cache-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    async def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """Return the cached vector for this text and model, if any"""
+        return (await self.get_many([text], model)).get(text)
+
+    async def get_many(self, texts: Iterable[str], model: str) -> Dict[str, np.ndarray]:
+        """Cached vectors for those of ``texts`` that have one.
+
+        Texts missing from memory are looked up in the persistent tier with one
+        query per chunk, off the event loop.
+        """
+        found: Dict[str, np.ndarray] = {}
+        missing: Dict[str, str] = {}
+        with self._lock:
+            for text in dict.fromkeys(texts):
+                key = self.key(text, model)
+                vector = self._recall(key)
+                if vector is not None:
+                    found[text] = vector
+                    self.hits += 1
+                    EMBEDDING_CACHE_REQUESTS.labels(result="memory_hit").inc()
+                else:
+                    missing[key] = text
+
+        loaded: Dict[str, np.ndarray] = {}
+        if missing and self._reader is not None:
+            loaded = await asyncio.to_thread(self._load, list(missing))
+
+        with self._lock:
+            for key, text in missing.items():
+                vector = loaded.get(key)
+                if vector is not None:
+                    self._remember(key, vector)
+                    found[text] = vector
+                    self.disk_hits += 1
+                    EMBEDDING_CACHE_REQUESTS.labels(result="disk_hit").inc()
+                else:
+                    self.misses += 1
+                    EMBEDDING_CACHE_REQUESTS.labels(result="miss").inc()
+        return found
+
+    def put(self, text: str, model: str, vector: np.ndarray):
+        """Store a freshly computed vector; the persistent tier is written in the background"""
+        key = self.key(text, model)
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        with self._lock:
+            self._remember(key, vector)
+            if self._writer is None:
+                return
+            if len(self._pending) >= _MAX_PENDING_WRITES and key not in self._pending:
+                # The memory tier still has it; only persistence is skipped
+                EMBEDDING_CACHE_WRITES.labels(result="dropped").inc()
+                return
+            self._pending[key] = (vector, model)
+            if len(self._pending) >= _WRITE_BATCH_SIZE:
+                self._wakeup.set()
+
+    def _recall(self, key: str) -> Optional[np.ndarray]:
+        vector = self._entries.get(key)
+        if vector is not None:
+            self._entries.move_to_end(key)
+            return vector
+        # Evicted from memory before the writer got to it
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._remember(key, pending[0])
+            return pending[0]
+        return None
+
+    def _remember(self, key: str, vector: np.ndarray):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes
+        self._entries[key] = vector
+        self._bytes += vector.nbytes
+
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+            EMBEDDING_CACHE_EVICTIONS.inc()
+        EMBEDDING_CACHE_BYTES.set(self._bytes)
+
+    def _load(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Blocking read of stored vectors; runs in a worker thread"""
+        vectors: Dict[str, np.ndarray] = {}
+        try:
+            with self._read_lock:
+                if self._reader is None:
+                    return vectors
+                for start in range(0, len(keys), _READ_CHUNK):
+                    chunk = keys[start:start + _READ_CHUNK]
+                    rows = self._reader.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' * len(chunk))})",
+                        chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.array(decode_embedding(blob), dtype=np.float32)
+                        vector.setflags(write=False)
+                        vectors[key] = vector
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+        return vectors
+
+    def _write_loop(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(_WRITE_INTERVAL)
+            self._wakeup.clear()
+            self._flush()
+
+    def _flush(self):
+        """Commit pending puts in one transaction; runs on the writer thread"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [
+                    (key, encode_embedding(vector, model=model, dtype="float32"))
+                    for key, (vector, model) in pending.items()
+                ]
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write of {len(pending)} entries failed: {e}")
+            EMBEDDING_CACHE_WRITES.labels(result="dropped").inc(len(pending))
+            return
+        EMBEDDING_CACHE_WRITES.labels(result="written").inc(len(pending))
+
+        # Replacements are counted too, so this overestimates until the next prune
+        self._stored_rows += len(pending)
+        if self.max_persisted_entries > 0 and self._stored_rows > self.max_persisted_entries * (1 + _PRUNE_SLACK):
+            try:
+                self._prune_store()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache prune failed: {e}")
+
+    def _prune_store(self):
+        if self._db is None or self.max_persisted_entries <= 0:
+            return
+        # rowid grows with insertion order, so this drops the oldest entries
+        self._db.execute(
+            "DELETE FROM embeddings WHERE rowid <= ("
+            "SELECT rowid FROM embeddings ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+            (self.max_persisted_entries,)
+        )
+        self._db.commit()
+        self._stored_rows = self._db.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "persistent": self._db is not None,
+            "pending_writes": len(self._pending),
+        }
+
+    def close(self):
+        """Write what is pending, then trim and close the persistent tier"""
+        if self._writer is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            self._writer.join()
+            self._writer = None
+            self._flush()
+        if self._db is None:
+            return
+        try:
+            self._prune_store()
+            self._db.close()
+            with self._read_lock:
+                self._reader.close()
+                self._reader = None
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to close embedding cache store: {e}")
+        self._db = None
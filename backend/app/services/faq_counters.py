@@ -0,0 +1,126 @@
+from collections import defaultdict
+from typing import Dict, Optional
+from prometheus_client import Counter, Gauge
+from sqlalchemy import bindparam, func, update
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.faq import FAQ
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("view_count", "helpful_count", "not_helpful_count")
+
+FAQ_COUNTER_PENDING = Gauge(
+    "faq_counter_pending_faqs",
+    "FAQs with view/feedback increments waiting for the next flush"
+)
+FAQ_COUNTER_FLUSHED = Counter(
+    "faq_counter_increments_flushed_total",
+    "FAQ counter increments written to the database, by counter",
+    ["counter"]
+)
+FAQ_COUNTER_FAILURES = Counter(
+    "faq_counter_flush_failures_total",
+    "FAQ counter flushes that failed and were retried"
+)
+
+_faqs = FAQ.__table__
+
+
+class FAQCounterAggregator:
+    """Batches FAQ view and feedback counters in memory.
+
+    Increments are summed per FAQ and written on an interval as one
+    ``UPDATE faqs SET view_count = view_count + :n ...`` per FAQ, executed as a
+    single batch. The database does the addition, so concurrent workers never
+    lose each other's counts, and a popular FAQ costs one row write per flush
+    instead of one per view. FAQs are updated in id order to keep lock order
+    consistent across workers. Counts still pending when the process dies are
+    lost; they are analytics, not records.
+    """
+
+    def __init__(self, flush_interval_ms: float = settings.FAQ_COUNTER_FLUSH_MS, session_factory=AsyncSessionLocal):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.session_factory = session_factory
+        self.running = False
+        self._pending: Dict[int, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.running = True
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    def increment(self, faq_id: int, counter: str = "view_count", amount: int = 1):
+        """Add to one of an FAQ's counters; written at the next flush"""
+        if counter not in COUNTERS:
+            raise ValueError(f"Unknown FAQ counter: {counter}")
+        self._pending[faq_id][counter] += amount
+        FAQ_COUNTER_PENDING.set(len(self._pending))
+
+    def record_view(self, faq_id: int):
+        self.increment(faq_id, "view_count")
+
+    def record_feedback(self, faq_id: int, helpful: bool, amount: int = 1):
+        """Count a vote; a negative amount withdraws one the user changed"""
+        self.increment(faq_id, "helpful_count" if helpful else "not_helpful_count", amount)
+
+    async def _flush_loop(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """Write all pending increments; on failure they are kept for the next flush"""
+        if not self._pending:
+            return True
+        pending, self._pending = self._pending, defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(_faqs)
+                    .where(_faqs.c.id == bindparam("faq_id"))
+                    .values({
+                        counter: func.coalesce(_faqs.c[counter], 0) + bindparam(f"add_{counter}")
+                        for counter in COUNTERS
+                    }),
+                    [
+                        {"faq_id": faq_id, **{f"add_{counter}": counts[counter] for counter in COUNTERS}}
+                        for faq_id, counts in sorted(pending.items())
+                    ]
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"FAQ counter flush for {len(pending)} FAQs failed: {e}")
+            FAQ_COUNTER_FAILURES.inc()
+            for faq_id, counts in pending.items():
+                for counter, amount in counts.items():
+                    self._pending[faq_id][counter] += amount
+            FAQ_COUNTER_PENDING.set(len(self._pending))
+            return False
+
+        for counter in COUNTERS:
+            # Withdrawn votes are written as negative amounts but not counted here
+            FAQ_COUNTER_FLUSHED.labels(counter=counter).inc(sum(max(counts[counter], 0) for counts in pending.values()))
+        FAQ_COUNTER_PENDING.set(len(self._pending))
+        return True
+
+    async def close(self):
+        """Stop the flusher and write what is still pending"""
+        if not self.running:
+            return
+        self.running = False
+        self._stopping.set()
+        await self._task
+        if not await self.flush():
+            logger.error(f"Dropped counter increments for {len(self._pending)} FAQs on shutdown")
+
+
+faq_counters = FAQCounterAggregator()
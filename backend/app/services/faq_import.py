@@ -0,0 +1,354 @@
+"""Bulk FAQ import from JSONL or CSV.
+
+Records are streamed from the file, embedded in large batches and inserted
+with one executemany per chunk. Progress is checkpointed after every
+committed chunk, so an interrupted import picks up where it stopped; rows
+whose slug already exists are skipped, which also makes re-running an
+import harmless.
+
+The command line import loads only the embedding model. Running API workers
+keep their in-memory search indexes, so FAQs it publishes are not searchable
+there until the workers restart. POST /api/v1/faqs/import reloads the indexes
+of the worker that handles the upload; other workers also need a restart.
+
+Usage (from the backend directory):
+    python -m app.services.faq_import faqs.jsonl --publish
+    python -m app.services.faq_import faqs.csv --category-id 3 --batch-size 512
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+from sqlalchemy import insert, select
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.embedding import encode_embedding
+from app.models.faq import FAQ, FAQCategory, FAQStatus, content_hash
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("jsonl", "csv")
+
+# Errors kept in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+def detect_format(filename: str) -> str:
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    raise ValueError(f"Cannot tell the import format of {filename!r}; expected one of {IMPORT_FORMATS}")
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    """Yield raw FAQ records one at a time; blank JSONL lines are skipped"""
+    if fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    elif fmt == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        raise ValueError(f"Unknown import format {fmt!r}; expected one of {IMPORT_FORMATS}")
+
+
+def make_slug(question: str) -> str:
+    # Same rule as FAQCreate so imported and API-created FAQs look alike
+    return question.lower().replace(" ", "-")[:50]
+
+
+def _keywords(value: Any) -> List[str]:
+    """Keywords from a JSON list, or a CSV cell holding JSON or ``;``/``,``-separated words"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith("["):
+            return [str(keyword) for keyword in json.loads(text)]
+        separator = ";" if ";" in text else ","
+        return [keyword.strip() for keyword in text.split(separator) if keyword.strip()]
+    return [str(keyword) for keyword in value]
+
+
+class ImportCheckpoint:
+    """Number of source records already committed, kept in a small JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> int:
+        try:
+            with open(self.path) as f:
+                return int(json.load(f)["records"])
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def save(self, records: int):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"records": records, "updated_at": datetime.now(timezone.utc).isoformat()}, f)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ImportReport:
+    def __init__(self, resumed_from: int = 0):
+        self.resumed_from = resumed_from
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors: List[str] = []
+        self.started_at = time.perf_counter()
+        self.elapsed = 0.0
+
+    def reject(self, record_number: int, reason: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"record {record_number}: {reason}")
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = self.elapsed or (time.perf_counter() - self.started_at)
+        return self.inserted / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "resumed_from": self.resumed_from,
+            "read": self.read,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "errors": self.errors,
+        }
+
+
+class FAQImporter:
+    """Streams FAQ records into the database in embedded, bulk-inserted chunks.
+
+    Embedding a chunk (on the embedding pool) overlaps with inserting the
+    previous one. Once everything is in, published imports reload this
+    process's in-memory search indexes (with ``reload_index``) a single time
+    instead of once per row.
+    """
+
+    def __init__(
+        self,
+        ai_service,
+        session_factory=AsyncSessionLocal,
+        batch_size: int = settings.FAQ_IMPORT_BATCH_SIZE,
+        publish: bool = False,
+        default_category_id: Optional[int] = None,
+        default_language: str = "en",
+        reload_index: bool = True
+    ):
+        self.ai_service = ai_service
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.publish = publish
+        self.default_category_id = default_category_id
+        self.default_language = default_language
+        self.reload_index = reload_index
+
+    async def run(self, records: Iterable[Dict[str, Any]], checkpoint: Optional[ImportCheckpoint] = None) -> ImportReport:
+        start = checkpoint.load() if checkpoint else 0
+        report = ImportReport(resumed_from=start)
+        if start:
+            logger.info(f"Resuming FAQ import after record {start}")
+
+        async with self.session_factory() as db:
+            categories = set((await db.execute(select(FAQCategory.id))).scalars().all())
+        seen_slugs: Set[str] = set()
+        pending: Optional[asyncio.Task] = None
+
+        try:
+            for chunk, position in self._chunks(records, start, report):
+                rows = [row for row in self._rows(chunk, categories, report) if row["slug"] not in seen_slugs]
+                rows = await self._new_rows(rows, report)
+                seen_slugs.update(row["slug"] for row in rows)
+                if rows:
+                    await self._embed(rows)
+                if pending is not None:
+                    await pending
+                pending = asyncio.create_task(self._insert(rows, position, checkpoint, report))
+            if pending is not None:
+                await pending
+        except BaseException:
+            if pending is not None and not pending.done():
+                # Let the chunk in flight commit and checkpoint before giving up
+                await asyncio.wait([pending])
+            raise
+
+        report.elapsed = time.perf_counter() - report.started_at
+        if checkpoint:
+            checkpoint.clear()
+        if self.reload_index and self.publish and report.inserted and self.ai_service is not None:
+            async with self.session_factory() as db:
+                await self.ai_service.faq_service.load_index(db)
+        logger.info(
+            f"FAQ import finished: {report.inserted} inserted, {report.duplicates} duplicates, "
+            f"{report.rejected} rejected in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s)"
+        )
+        return report
+
+    def _chunks(
+        self,
+        records: Iterable[Dict[str, Any]],
+        start: int,
+        report: ImportReport
+    ) -> Iterator[Tuple[List[Tuple[int, Dict[str, Any]]], int]]:
+        """Chunks of (record number, record) past the checkpoint, with the position after each chunk"""
+        chunk: List[Tuple[int, Dict[str, Any]]] = []
+        number = 0
+        for number, record in enumerate(records, start=1):
+            if number <= start:
+                continue
+            report.read += 1
+            chunk.append((number, record))
+            if len(chunk) >= self.batch_size:
+                yield chunk, number
+                chunk = []
+        if chunk:
+            yield chunk, number
+
+    def _rows(self, chunk: List[Tuple[int, Dict[str, Any]]], categories: Set[int], report: ImportReport) -> List[Dict[str, Any]]:
+        """Validated insert parameters for a chunk; invalid records are rejected"""
+        now = datetime.now(timezone.utc)
+        rows = []
+        for number, record in chunk:
+            try:
+                question = (record.get("question") or "").strip()
+                answer = (record.get("answer") or "").strip()
+                if not question or not answer:
+                    raise ValueError("question and answer are required")
+                category_id = record.get("category_id") or self.default_category_id
+                if category_id is None:
+                    raise ValueError("category_id is required")
+                category_id = int(category_id)
+                if category_id not in categories:
+                    raise ValueError(f"unknown category {category_id}")
+                rows.append({
+                    "question": question,
+                    "answer": answer,
+                    "category_id": category_id,
+                    "keywords": _keywords(record.get("keywords")),
+                    "priority": int(record.get("priority") or 0),
+                    "language": record.get("language") or self.default_language,
+                    "meta_title": record.get("meta_title") or None,
+                    "meta_description": record.get("meta_description") or None,
+                    "slug": record.get("slug") or make_slug(question),
+                    "status": FAQStatus.PUBLISHED if self.publish else FAQStatus.DRAFT,
+                    "published_at": now if self.publish else None,
+                })
+            except (TypeError, ValueError) as e:
+                report.reject(number, str(e))
+
+        unique = {}
+        for row in rows:
+            if row["slug"] in unique:
+                report.duplicates += 1
+            else:
+                unique[row["slug"]] = row
+        return list(unique.values())
+
+    async def _new_rows(self, rows: List[Dict[str, Any]], report: ImportReport) -> List[Dict[str, Any]]:
+        """Drop rows whose slug is already stored (earlier runs, or FAQs created through the API)"""
+        if not rows:
+            return rows
+        async with self.session_factory() as db:
+            result = await db.execute(select(FAQ.slug).where(FAQ.slug.in_([row["slug"] for row in rows])))
+            existing = set(result.scalars().all())
+        report.duplicates += sum(1 for row in rows if row["slug"] in existing)
+        return [row for row in rows if row["slug"] not in existing]
+
+    async def _embed(self, rows: List[Dict[str, Any]]):
+        if self.ai_service is None:
+            for row in rows:
+                row["question_embedding"] = row["answer_embedding"] = row["embedding_model"] = None
+                row["question_hash"] = row["answer_hash"] = None
+            return
+        embedding_model = self.ai_service.embedding_model_version
+        texts = [row["question"] for row in rows] + [row["answer"] for row in rows]
+        # Imported texts are seen once; keep them out of the query embedding cache
+        embeddings = await self.ai_service.generate_embeddings_batch(texts, cache=False)
+        for row, question_embedding, answer_embedding in zip(rows, embeddings[:len(rows)], embeddings[len(rows):]):
+            row["question_embedding"] = encode_embedding(question_embedding, model=embedding_model)
+            row["answer_embedding"] = encode_embedding(answer_embedding, model=embedding_model)
+            row["embedding_model"] = embedding_model
+            row["question_hash"] = content_hash(row["question"])
+            row["answer_hash"] = content_hash(row["answer"])
+
+    async def _insert(self, rows: List[Dict[str, Any]], position: int, checkpoint: Optional[ImportCheckpoint], report: ImportReport):
+        if rows:
+            async with self.session_factory() as db:
+                await db.execute(insert(FAQ), rows)
+                await db.commit()
+            report.inserted += len(rows)
+        if checkpoint:
+            checkpoint.save(position)
+        logger.info(f"Imported {report.inserted} FAQs ({report.rows_per_second:.0f} rows/s)")
+
+
+async def _main(args):
+    from app.database import close_db, init_db
+    from app.services.ai_service import AIService
+
+    fmt = args.format or detect_format(args.path)
+    await init_db()
+    ai_service = await asyncio.to_thread(AIService, embeddings_only=True)
+    importer = FAQImporter(
+        ai_service,
+        batch_size=args.batch_size,
+        publish=args.publish,
+        default_category_id=args.category_id,
+        default_language=args.language,
+        # Nothing in this process serves searches
+        reload_index=False
+    )
+    checkpoint = ImportCheckpoint(args.checkpoint or f"{args.path}.import-state.json")
+    if args.restart:
+        checkpoint.clear()
+    try:
+        with open(args.path, newline="", encoding="utf-8") as f:
+            report = await importer.run(read_records(f, fmt), checkpoint)
+    finally:
+        ai_service.embedding_pool.shutdown()
+        ai_service.inference_pool.shutdown()
+        ai_service.embedding_cache.close()
+        await close_db()
+    print(json.dumps(report.as_dict(), indent=2))
+    if args.publish and report.inserted:
+        print("Restart the API workers to make the imported FAQs searchable.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSONL or CSV file with question, answer and category_id per record")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=settings.FAQ_IMPORT_BATCH_SIZE, help="Records per embed and insert")
+    parser.add_argument("--publish", action="store_true", help="Import as published instead of draft")
+    parser.add_argument("--category-id", type=int, help="Category for records without one")
+    parser.add_argument("--language", default="en", help="Language for records without one")
+    parser.add_argument("--checkpoint", help="Progress file; defaults to <path>.import-state.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and start from the first record")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+from app.config import settings
+from app.models.faq import FAQ, FAQStatus
+from app.services.ann_index import ANNIndex, create_ann_index
+import numpy as np
+import asyncio
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+PartitionKey = Tuple[str, int]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so cosine similarity becomes a plain dot product"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return indices of the k highest scores, best first"""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class _Partition:
+    """Question/answer embedding matrices for one (language, category) pair"""
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.dim = dim
+        self.size = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.questions = np.zeros((capacity, dim), dtype=np.float32)
+        self.answers = np.zeros((capacity, dim), dtype=np.float32)
+        self.positions: Dict[int, int] = {}
+        self.ann: Optional[ANNIndex] = None
+        self.rebuild: Optional[asyncio.Task] = None
+        self.changes = 0  # Bumped on every write, so a background rebuild can tell it went stale
+        self._sorted: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _grow(self, needed: int):
+        capacity = self.ids.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self.ids = np.resize(self.ids, capacity)
+        self.questions = np.resize(self.questions, (capacity, self.dim))
+        self.answers = np.resize(self.answers, (capacity, self.dim))
+
+    def extend(self, ids: np.ndarray, questions: np.ndarray, answers: np.ndarray):
+        """Append already-normalized rows"""
+        self._sorted = None
+        self.changes += 1
+        count = ids.shape[0]
+        self._grow(self.size + count)
+        end = self.size + count
+        self.ids[self.size:end] = ids
+        self.questions[self.size:end] = questions
+        self.answers[self.size:end] = answers
+        for offset, faq_id in enumerate(ids.tolist()):
+            self.positions[faq_id] = self.size + offset
+            if self.ann is not None:
+                self.ann.add(faq_id, (questions[offset], answers[offset]))
+        self.size = end
+
+    def set(self, faq_id: int, question: np.ndarray, answer: np.ndarray):
+        """Insert or overwrite a single normalized row"""
+        position = self.positions.get(faq_id)
+        if position is None:
+            self.extend(np.array([faq_id], dtype=np.int64), question[None, :], answer[None, :])
+        else:
+            self.changes += 1
+            self.questions[position] = question
+            self.answers[position] = answer
+            if self.ann is not None:
+                self.ann.add(faq_id, (question, answer))
+
+    def remove(self, faq_id: int):
+        """Remove a row by moving the last row into its slot"""
+        position = self.positions.pop(faq_id, None)
+        if position is None:
+            return
+        if self.ann is not None:
+            self.ann.remove(faq_id)
+        self._sorted = None
+        self.changes += 1
+        last = self.size - 1
+        if position != last:
+            moved_id = int(self.ids[last])
+            self.ids[position] = moved_id
+            self.questions[position] = self.questions[last]
+            self.answers[position] = self.answers[last]
+            self.positions[moved_id] = position
+        self.size = last
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Best of question and answer similarity for every row"""
+        question_scores = self.questions[:self.size] @ query
+        answer_scores = self.answers[:self.size] @ query
+        return np.maximum(question_scores, answer_scores)
+
+    def _positions_of(self, ids: np.ndarray) -> np.ndarray:
+        """Vectorized id -> row lookup through a lazily rebuilt sorted view"""
+        if self._sorted is None:
+            order = np.argsort(self.ids[:self.size], kind="stable")
+            self._sorted = (self.ids[order], order)
+        sorted_ids, order = self._sorted
+        slots = np.minimum(np.searchsorted(sorted_ids, ids), max(self.size - 1, 0))
+        found = sorted_ids[slots] == ids
+        return order[slots[found]]
+
+    def matrices(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.ids[:self.size], self.questions[:self.size], self.answers[:self.size]
+
+    def search(self, query: np.ndarray, k: int, rerank_factor: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k ids and scores, exact or re-scored from ANN candidates.
+
+        Scored exactly while the ANN structure is missing or due for a rebuild.
+        """
+        if self.ann is None or self.ann.needs_rebuild:
+            scores = self.scores(query)
+            best = _top_k(scores, k)
+            return self.ids[best], scores[best]
+
+        candidates = self.ann.candidates(query, k * rerank_factor)
+        positions = self._positions_of(candidates)
+        scores = np.maximum(self.questions[positions] @ query, self.answers[positions] @ query)
+        best = _top_k(scores, k)
+        return self.ids[positions[best]], scores[best]
+
+
+class FAQEmbeddingIndex:
+    """Resident index of published FAQ embeddings for fast semantic search.
+
+    Embeddings are kept as pre-normalized float32 matrices partitioned by
+    language and category, so a query is scored with one matrix-vector
+    product per partition and the top results are picked with argpartition.
+
+    Partitions holding at least ``min_partition_size`` FAQs can additionally
+    carry an ANN structure (``ivf`` or ``faiss``) that narrows scoring to a
+    candidate set, which is then re-scored exactly. Structures are never
+    trained on the query path: when writes make one due, it is rebuilt in a
+    background thread and the partition is searched exactly until then.
+
+    When ``model`` is set, only FAQs whose embeddings were produced by that
+    model (or are untagged legacy rows) are indexed, so vectors from
+    different embedding models never share an index.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        path: Optional[str] = None,
+        min_partition_size: Optional[int] = None,
+        model: Optional[str] = None
+    ):
+        self.backend = backend or settings.FAQ_INDEX_BACKEND
+        self.path = path if path is not None else settings.FAQ_INDEX_PATH
+        self.min_partition_size = (
+            min_partition_size if min_partition_size is not None else settings.FAQ_ANN_MIN_PARTITION_SIZE
+        )
+        self.rerank_factor = settings.FAQ_ANN_RERANK_FACTOR
+        self.model = model
+        self.dim: Optional[int] = None
+        self.version = 0
+        self.loaded_version = 0  # version of the last full load
+        self._changed_at: Dict[int, int] = {}  # faq id -> version it last changed at
+        self._language_added_at: Dict[str, int] = {}  # language -> version a FAQ was last added
+        self._partitions: Dict[PartitionKey, _Partition] = {}
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._keys: Dict[int, PartitionKey] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, faq_id: int) -> bool:
+        return faq_id in self._entries
+
+    def _is_indexable(self, faq: FAQ) -> bool:
+        return (
+            faq.status == FAQStatus.PUBLISHED
+            and faq.question_embedding is not None
+            and faq.answer_embedding is not None
+            and (self.model is None or getattr(faq, "embedding_model", None) in (None, self.model))
+        )
+
+    def _vectors(self, faq: FAQ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        question = np.asarray(faq.question_embedding, dtype=np.float32)
+        answer = np.asarray(faq.answer_embedding, dtype=np.float32)
+        if question.ndim != 1 or question.shape != answer.shape:
+            logger.warning(f"Skipping FAQ {faq.id}: malformed embeddings")
+            return None
+        if self.dim is None:
+            self.dim = question.shape[0]
+        elif question.shape[0] != self.dim:
+            logger.warning(
+                f"Skipping FAQ {faq.id}: embedding dimension {question.shape[0]} != index dimension {self.dim}"
+            )
+            return None
+        return question, answer
+
+    def _partition(self, key: PartitionKey) -> _Partition:
+        partition = self._partitions.get(key)
+        if partition is None:
+            partition = _Partition(self.dim)
+            self._partitions[key] = partition
+        return partition
+
+    def _new_ann(self) -> Optional[ANNIndex]:
+        return create_ann_index(
+            self.backend,
+            nlist=settings.FAQ_IVF_NLIST,
+            nprobe=settings.FAQ_IVF_NPROBE,
+            hnsw_m=settings.FAQ_HNSW_M,
+            ef_construction=settings.FAQ_HNSW_EF_CONSTRUCTION,
+            ef_search=settings.FAQ_HNSW_EF_SEARCH
+        )
+
+    def _ann_path(self, key: PartitionKey) -> str:
+        language = re.sub(r"[^A-Za-z0-9_-]", "_", key[0])
+        name = f"{self.backend}_{language}_{key[1]}"
+        if self.model:
+            # Structures trained on another model's vectors must never be restored
+            name = f"{re.sub(r'[^A-Za-z0-9_-]', '_', self.model)}_{name}"
+        return os.path.join(self.path, name)
+
+    def _wants_ann(self, partition: _Partition) -> bool:
+        return self.backend != "exact" and partition.size >= self.min_partition_size
+
+    def _ann_due(self, partition: _Partition) -> bool:
+        return self._wants_ann(partition) and (partition.ann is None or partition.ann.needs_rebuild)
+
+    def _built_ann(
+        self,
+        key: PartitionKey,
+        ids: np.ndarray,
+        questions: np.ndarray,
+        answers: np.ndarray,
+        restore: bool = False
+    ) -> ANNIndex:
+        """Blocking: restore or train an ANN structure for these rows"""
+        ann = self._new_ann()
+        if not (restore and self.path and ann.load(self._ann_path(key), ids, (questions, answers))):
+            ann.build(ids.copy(), (questions, answers))
+        return ann
+
+    def _refresh_ann(self, key: PartitionKey, partition: _Partition, restore: bool = False):
+        """Build, restore or rebuild the partition's ANN structure in place when it is due; blocking"""
+        if not self._wants_ann(partition):
+            partition.ann = None
+            return
+        if self._ann_due(partition):
+            partition.ann = self._built_ann(key, *partition.matrices(), restore=restore)
+
+    def _schedule_ann(self, key: PartitionKey, partition: _Partition):
+        """After a write: rebuild the partition's ANN structure in the background when it is due.
+
+        Training k-means or an HNSW graph takes far longer than a query, so it
+        runs in a thread while searches of the partition stay exact. Without a
+        running event loop (scripts, worker threads) it is built inline.
+        """
+        if not self._wants_ann(partition):
+            partition.ann = None
+            return
+        if not self._ann_due(partition) or partition.rebuild is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._refresh_ann(key, partition)
+            return
+        partition.rebuild = loop.create_task(self._rebuild_ann(key, partition))
+
+    async def _rebuild_ann(self, key: PartitionKey, partition: _Partition):
+        try:
+            while self._partitions.get(key) is partition and self._ann_due(partition):
+                changes = partition.changes
+                ids, questions, answers = (matrix.copy() for matrix in partition.matrices())
+                ann = await asyncio.to_thread(self._built_ann, key, ids, questions, answers)
+                if partition.changes == changes:
+                    # Swapped in between queries; it covers exactly the current rows
+                    partition.ann = ann
+                    return
+                # Rows changed while it was built; build again from the current rows
+        except Exception as e:
+            logger.error(f"Rebuilding the ANN index for {key} failed; searching it exactly: {e}")
+        finally:
+            partition.rebuild = None
+
+    def save(self):
+        """Persist ANN structures so restarts can skip training"""
+        if self.backend == "exact" or not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        for key, partition in self._partitions.items():
+            # A structure due for a rebuild may hold outdated vectors; don't persist it
+            if partition.ann is not None and not partition.ann.needs_rebuild:
+                partition.ann.save(self._ann_path(key))
+        logger.info(f"FAQ ANN index saved to {self.path}")
+
+    @staticmethod
+    def _payload(faq: FAQ) -> Dict[str, Any]:
+        return {
+            "id": faq.id,
+            "question": faq.question,
+            "answer": faq.answer,
+            "category_id": faq.category_id,
+        }
+
+    def load(self, faqs: Iterable[FAQ], model: Optional[str] = None, restore: bool = True):
+        """Replace the index contents with the given FAQs.
+
+        ``model`` restricts the index to embeddings from that model;
+        ``restore=False`` rebuilds ANN structures instead of reading saved ones.
+        """
+        if model is not None:
+            self.model = model
+        self.dim = None
+        self._partitions = {}
+        self._entries = {}
+        self._keys = {}
+
+        grouped: Dict[PartitionKey, List[Tuple[int, np.ndarray, np.ndarray]]] = {}
+        for faq in faqs:
+            if not self._is_indexable(faq):
+                continue
+            vectors = self._vectors(faq)
+            if vectors is None:
+                continue
+            key = (faq.language or "en", faq.category_id)
+            grouped.setdefault(key, []).append((faq.id, *vectors))
+            self._entries[faq.id] = self._payload(faq)
+            self._keys[faq.id] = key
+
+        for key, rows in grouped.items():
+            partition = _Partition(self.dim, capacity=max(16, len(rows)))
+            partition.extend(
+                np.array([row[0] for row in rows], dtype=np.int64),
+                _normalize(np.stack([row[1] for row in rows])),
+                _normalize(np.stack([row[2] for row in rows])),
+            )
+            self._partitions[key] = partition
+            self._refresh_ann(key, partition, restore=restore)
+
+        self.version += 1
+        self.loaded_version = self.version
+        self._changed_at = {}
+        self._language_added_at = {}
+        logger.info(f"FAQ index loaded with {len(self._entries)} entries in {len(self._partitions)} partitions")
+
+    def replace_with(self, other: "FAQEmbeddingIndex"):
+        """Take over another index's contents in one step, e.g. a shadow index built for a new model"""
+        self.model = other.model
+        self.dim = other.dim
+        self._partitions = other._partitions
+        self._entries = other._entries
+        self._keys = other._keys
+        self.version = max(self.version, other.version) + 1
+        self.loaded_version = self.version
+        self._changed_at = {}
+        self._language_added_at = {}
+        logger.info(f"FAQ index switched to {self.model} with {len(self._entries)} entries")
+
+    def upsert(self, faq: FAQ):
+        """Add, move or drop a single FAQ to match its current state"""
+        if not self._is_indexable(faq):
+            self.remove(faq.id)
+            return
+        vectors = self._vectors(faq)
+        if vectors is None:
+            self.remove(faq.id)
+            return
+
+        key = (faq.language or "en", faq.category_id)
+        previous_key = self._keys.get(faq.id)
+        if previous_key is not None and previous_key != key:
+            self.remove(faq.id)
+
+        question, answer = _normalize(np.stack(vectors))
+        partition = self._partition(key)
+        partition.set(faq.id, question, answer)
+        self._schedule_ann(key, partition)
+        self._entries[faq.id] = self._payload(faq)
+        self._keys[faq.id] = key
+        self.version += 1
+        self._changed_at[faq.id] = self.version
+        if previous_key is None or previous_key[0] != key[0]:
+            self._language_added_at[key[0]] = self.version
+
+    def remove(self, faq_id: int):
+        """Drop a FAQ from the index if present"""
+        key = self._keys.pop(faq_id, None)
+        if key is None:
+            return
+        self._entries.pop(faq_id, None)
+        partition = self._partitions[key]
+        partition.remove(faq_id)
+        if partition.size == 0:
+            del self._partitions[key]
+        self.version += 1
+        self._changed_at[faq_id] = self.version
+
+    def changed_since(self, version: int, faq_ids: Iterable[int], language: str) -> bool:
+        """Whether results computed at ``version`` from ``faq_ids`` may be out of date.
+
+        True after a full reload, when any of the FAQs changed or was removed,
+        or when a FAQ was added in ``language`` (it might now be the better match).
+        """
+        return (
+            self.loaded_version > version
+            or self._language_added_at.get(language, 0) > version
+            or any(self._changed_at.get(faq_id, 0) > version for faq_id in faq_ids)
+        )
+
+    def similarities(self, query_embedding: List[float], faq_ids: Iterable[int]) -> Dict[int, float]:
+        """Similarity of the query to each of the given indexed FAQs, as ``search`` scores it"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape != (self.dim,):
+            return {}
+        query = _normalize(query)
+        scores = {}
+        for faq_id in faq_ids:
+            key = self._keys.get(faq_id)
+            if key is None:
+                continue
+            partition = self._partitions[key]
+            position = partition.positions[faq_id]
+            scores[faq_id] = float(max(partition.questions[position] @ query, partition.answers[position] @ query))
+        return scores
+
+    def search(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        language: str = "en",
+        category_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the top FAQs for a query embedding, most similar first"""
+        if not self._entries or limit <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape != (self.dim,):
+            logger.warning(f"Query embedding shape {query.shape} does not match index dimension {self.dim}")
+            return []
+        query = _normalize(query)
+
+        if category_id is not None:
+            keys = [(language, category_id)]
+        else:
+            keys = [key for key in self._partitions if key[0] == language]
+
+        candidate_ids = []
+        candidate_scores = []
+        for key in keys:
+            partition = self._partitions.get(key)
+            if partition is None or partition.size == 0:
+                continue
+            ids, scores = partition.search(query, limit, self.rerank_factor)
+            candidate_ids.append(ids)
+            candidate_scores.append(scores)
+
+        if not candidate_ids:
+            return []
+
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        best = _top_k(scores, limit)
+
+        return [
+            {**self._entries[int(ids[i])], "similarity": float(scores[i])}
+            for i in best
+        ]
+
+
+# Shared by every FAQService in the worker so writes and searches see the same data
+faq_index = FAQEmbeddingIndex()
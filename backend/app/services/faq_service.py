@@ -1,21 +1,68 @@
 from typing import List, Dict, Any, Optional
+from prometheus_client import Counter
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from app.models.faq import FAQ, FAQCategory, FAQStatus
-import numpy as np
+from sqlalchemy import select
+from app.config import settings
+from app.models.embedding import encode_embedding
+from app.models.faq import FAQ, FAQCategory, FAQFeedbackEntry, FAQStatus, content_hash
+from app.services.faq_counters import FAQCounterAggregator, faq_counters
+from app.services.faq_index import FAQEmbeddingIndex, faq_index
+from app.services.inference_pool import EmbeddingUnavailableError
+from app.services.lexical_index import LexicalFAQIndex, lexical_index
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+FAQ_FIELD_EMBEDDINGS = Counter(
+    "faq_field_embeddings_total",
+    "Question/answer embeddings on FAQ writes by outcome (embedded, skipped as unchanged)",
+    ["outcome"]
+)
+
+EMBEDDED_FIELDS = ("question", "answer")
+
 
 class FAQService:
-    def __init__(self):
+    def __init__(
+        self,
+        index: Optional[FAQEmbeddingIndex] = None,
+        lexical: Optional[LexicalFAQIndex] = None,
+        counters: Optional[FAQCounterAggregator] = None
+    ):
         self.ai_service = None  # Will be set later to avoid circular import
+        self.index = index if index is not None else faq_index
+        self.lexical_index = lexical if lexical is not None else lexical_index
+        self.counters = counters if counters is not None else faq_counters
     
     def set_ai_service(self, ai_service):
         """Set the AI service after initialization to avoid circular imports"""
         self.ai_service = ai_service
     
+    @property
+    def embedding_model_version(self) -> Optional[str]:
+        """Tag for embeddings written now; None without an AI service"""
+        return self.ai_service.embedding_model_version if self.ai_service else None
+    
+    async def load_index(self, db: AsyncSession):
+        """Load every published FAQ into the in-memory embedding and lexical indexes.
+        
+        The embedding index is built in a thread (ANN training can take a
+        while) and swapped in whole, so searches meanwhile use the old one.
+        """
+        result = await db.execute(select(FAQ).where(FAQ.status == FAQStatus.PUBLISHED))
+        faqs = result.scalars().all()
+        shadow = FAQEmbeddingIndex(
+            backend=self.index.backend,
+            path=self.index.path,
+            min_partition_size=self.index.min_partition_size,
+            model=self.index.model
+        )
+        await asyncio.to_thread(shadow.load, faqs, self.embedding_model_version)
+        self.index.replace_with(shadow)
+        await asyncio.to_thread(self.index.save)
+        self.lexical_index.load(faqs)
+    
     async def create_faq(
         self, 
         db: AsyncSession, 
@@ -25,11 +72,17 @@ class FAQService:
         try:
             # Generate embeddings for question and answer if AI service is available
             if self.ai_service:
-                question_embedding = await self.ai_service.generate_embeddings(faq_data["question"])
-                answer_embedding = await self.ai_service.generate_embeddings(faq_data["answer"])
+                embedding_model = self.embedding_model_version
+                question_embedding, answer_embedding = (
+                    encode_embedding(embedding, model=embedding_model)
+                    for embedding in await self.ai_service.generate_embeddings_batch(
+                        [faq_data["question"], faq_data["answer"]]
+                    )
+                )
             else:
                 question_embedding = None
                 answer_embedding = None
+                embedding_model = None
             
             faq = FAQ(
                 question=faq_data["question"],
@@ -43,12 +96,17 @@ class FAQService:
                 slug=faq_data.get("slug"),
                 question_embedding=question_embedding,
                 answer_embedding=answer_embedding,
+                embedding_model=embedding_model,
+                question_hash=content_hash(faq_data["question"]) if question_embedding else None,
+                answer_hash=content_hash(faq_data["answer"]) if answer_embedding else None,
                 status=FAQStatus.DRAFT
             )
             
             db.add(faq)
             await db.commit()
             await db.refresh(faq)
+            self.index.upsert(faq)
+            self.lexical_index.upsert(faq)
             
             return faq
             
@@ -64,35 +122,76 @@ class FAQService:
         update_data: Dict[str, Any]
     ) -> Optional[FAQ]:
         """Update an existing FAQ entry"""
+        faqs = await self.update_faqs(db, {faq_id: update_data})
+        return faqs[0] if faqs else None
+    
+    async def update_faqs(
+        self, 
+        db: AsyncSession, 
+        updates: Dict[int, Dict[str, Any]]
+    ) -> List[FAQ]:
+        """Update several FAQs, keyed by id; ids that don't exist are skipped.
+        
+        Only question/answer texts that actually changed are re-embedded, in
+        one model call for the whole batch.
+        """
         try:
-            result = await db.execute(select(FAQ).where(FAQ.id == faq_id))
-            faq = result.scalar_one_or_none()
-            
-            if not faq:
-                return None
+            result = await db.execute(select(FAQ).where(FAQ.id.in_(list(updates))).order_by(FAQ.id))
+            faqs = result.scalars().all()
             
-            # Update fields
-            for field, value in update_data.items():
-                if hasattr(faq, field):
-                    setattr(faq, field, value)
+            stale = []
+            for faq in faqs:
+                update_data = updates[faq.id]
+                stale.extend((faq, field) for field in self._fields_to_embed(faq, update_data))
+                for field, value in update_data.items():
+                    if hasattr(faq, field):
+                        setattr(faq, field, value)
             
-            # Regenerate embeddings if question or answer changed
-            if ("question" in update_data or "answer" in update_data) and self.ai_service:
-                question_embedding = await self.ai_service.generate_embeddings(faq.question)
-                answer_embedding = await self.ai_service.generate_embeddings(faq.answer)
-                faq.question_embedding = question_embedding
-                faq.answer_embedding = answer_embedding
+            if stale:
+                embedding_model = self.embedding_model_version
+                embeddings = await self.ai_service.generate_embeddings_batch(
+                    [getattr(faq, field) for faq, field in stale]
+                )
+                for (faq, field), embedding in zip(stale, embeddings):
+                    setattr(faq, f"{field}_embedding", encode_embedding(embedding, model=embedding_model))
+                    setattr(faq, f"{field}_hash", content_hash(getattr(faq, field)))
+                    faq.embedding_model = embedding_model
+                FAQ_FIELD_EMBEDDINGS.labels(outcome="embedded").inc(len(stale))
             
             await db.commit()
-            await db.refresh(faq)
+            for faq in faqs:
+                await db.refresh(faq)
+                self.index.upsert(faq)
+                self.lexical_index.upsert(faq)
             
-            return faq
+            return list(faqs)
             
         except Exception as e:
             await db.rollback()
-            logger.error(f"Failed to update FAQ: {e}")
+            logger.error(f"Failed to update FAQs: {e}")
             raise
     
+    def _fields_to_embed(self, faq: FAQ, update_data: Dict[str, Any]) -> List[str]:
+        """Fields of ``faq`` whose embedding no longer matches the text in ``update_data``"""
+        updated = [field for field in EMBEDDED_FIELDS if field in update_data]
+        if not updated or not self.ai_service:
+            return []
+        if faq.embedding_model != self.embedding_model_version:
+            # Both vectors of a FAQ must come from the same model
+            return list(EMBEDDED_FIELDS)
+        
+        stale = []
+        for field in updated:
+            embedded_hash = getattr(faq, f"{field}_hash")
+            if getattr(faq, f"{field}_embedding") is None:
+                stale.append(field)
+            elif content_hash(update_data[field]) != (embedded_hash or content_hash(getattr(faq, field))):
+                stale.append(field)
+        skipped = len(updated) - len(stale)
+        if skipped:
+            FAQ_FIELD_EMBEDDINGS.labels(outcome="skipped").inc(skipped)
+        return stale
+    
     async def search_semantic(
         self, 
         query: str, 
@@ -100,11 +199,16 @@ class FAQService:
         category_id: Optional[int] = None,
         language: str = "en"
     ) -> List[Dict[str, Any]]:
-        """Search FAQs using semantic similarity"""
+        """Search FAQs using semantic similarity, fused with keyword matches when hybrid search is on"""
         try:
             # Generate embedding for query if AI service is available
             if self.ai_service:
-                query_embedding = await self.ai_service.generate_embeddings(query)
+                try:
+                    query_embedding = await self.ai_service.generate_embeddings(query)
+                except EmbeddingUnavailableError as e:
+                    # Any other vector would be scored against the model's as if comparable
+                    logger.warning(f"Query embedding failed, using text search: {e}")
+                    return await self.search_text(query, limit, category_id, language)
             else:
                 # Fallback to text search if no AI service
                 return await self.search_text(query, limit, category_id, language)
@@ -112,72 +216,85 @@ class FAQService:
             if not query_embedding:
                 return []
             
-            # Get all published FAQs
-            query = select(FAQ).where(
-                FAQ.status == FAQStatus.PUBLISHED,
-                FAQ.language == language
-            )
-            
-            if category_id:
-                query = query.where(FAQ.category_id == category_id)
-            
-            result = await db.execute(query)
-            faqs = result.scalars().all()
-            
-            # Calculate similarities
-            similarities = []
-            for faq in faqs:
-                if faq.question_embedding:
-                    # Calculate cosine similarity
-                    question_sim = self._cosine_similarity(query_embedding, faq.question_embedding)
-                    answer_sim = self._cosine_similarity(query_embedding, faq.answer_embedding)
-                    
-                    # Use the higher similarity score
-                    max_sim = max(question_sim, answer_sim)
-                    
-                    similarities.append({
-                        "faq": faq,
-                        "similarity": max_sim
-                    })
-            
-            # Sort by similarity and return top results
-            similarities.sort(key=lambda x: x["similarity"], reverse=True)
+            if not settings.FAQ_HYBRID_SEARCH:
+                return self.index.search(
+                    query_embedding,
+                    limit=limit,
+                    language=language,
+                    category_id=category_id
+                )
             
-            return [
-                {
-                    "id": item["faq"].id,
-                    "question": item["faq"].question,
-                    "answer": item["faq"].answer,
-                    "category_id": item["faq"].category_id,
-                    "similarity": item["similarity"]
-                }
-                for item in similarities[:limit]
-            ]
+            candidates = max(limit, settings.FAQ_HYBRID_CANDIDATES)
+            vector_hits = self.index.search(
+                query_embedding,
+                limit=candidates,
+                language=language,
+                category_id=category_id
+            )
+            lexical_hits = self.lexical_index.search(query, candidates, language, category_id)
+            return self._fuse(query, query_embedding, vector_hits, lexical_hits, limit, language)
             
         except Exception as e:
             logger.error(f"Semantic search failed: {e}")
             return []
     
+    def _fuse(
+        self,
+        query: str,
+        query_embedding: List[float],
+        vector_hits: List[Dict[str, Any]],
+        lexical_hits: List[Dict[str, Any]],
+        limit: int,
+        language: str = "en"
+    ) -> List[Dict[str, Any]]:
+        """Reciprocal-rank fusion of the vector and BM25 rankings.
+        
+        Both rankings are taken over the union of their candidates with each
+        candidate's full score in both, and tied scores share a rank, so a
+        common word matching many FAQs equally doesn't outweigh the vector
+        order. Every result keeps its vector ``similarity`` for the confidence gate.
+        """
+        candidates: Dict[int, Dict[str, Any]] = {}
+        for hit in vector_hits + lexical_hits:
+            candidates.setdefault(hit["id"], {}).update(hit)
+        
+        missing = [faq_id for faq_id, entry in candidates.items() if "similarity" not in entry]
+        for faq_id, similarity in self.index.similarities(query_embedding, missing).items():
+            candidates[faq_id]["similarity"] = similarity
+        for faq_id, score in self.lexical_index.scores(query, candidates, language).items():
+            candidates[faq_id]["lexical_score"] = score
+        
+        for entry in candidates.values():
+            entry["rrf_score"] = 0.0
+        for field in ("similarity", "lexical_score"):
+            scored = sorted(
+                (entry for entry in candidates.values() if entry.get(field)),
+                key=lambda entry: entry[field],
+                reverse=True
+            )
+            rank, previous = 0, None
+            for position, entry in enumerate(scored, start=1):
+                if entry[field] != previous:
+                    rank, previous = position, entry[field]
+                entry["rrf_score"] += 1.0 / (settings.FAQ_RRF_K + rank)
+        
+        ranked = sorted(
+            candidates.values(),
+            key=lambda entry: (entry["rrf_score"], entry.get("similarity", 0.0)),
+            reverse=True
+        )
+        return ranked[:limit]
+    
     async def search_text(
         self, 
         query: str, 
         limit: int = 10,
         category_id: Optional[int] = None,
         language: str = "en"
-    ) -> List[FAQ]:
-        """Search FAQs using text search"""
+    ) -> List[Dict[str, Any]]:
+        """Search FAQs by keyword (BM25 over question, answer and keywords)"""
         try:
-            search_query = select(FAQ).where(
-                FAQ.status == FAQStatus.PUBLISHED,
-                FAQ.language == language,
-                func.lower(FAQ.question).contains(query.lower())
-            )
-            
-            if category_id:
-                search_query = search_query.where(FAQ.category_id == category_id)
-            
-            result = await db.execute(search_query)
-            return result.scalars().limit(limit).all()
+            return self.lexical_index.search(query, limit, language, category_id)
             
         except Exception as e:
             logger.error(f"Text search failed: {e}")
@@ -203,34 +320,49 @@ class FAQService:
         )
         return result.scalars().all()
     
-    async def increment_view_count(self, db: AsyncSession, faq_id: int):
-        """Increment FAQ view count"""
-        try:
-            result = await db.execute(select(FAQ).where(FAQ.id == faq_id))
-            faq = result.scalar_one_or_none()
-            
-            if faq:
-                faq.view_count += 1
-                await db.commit()
-                
-        except Exception as e:
-            logger.error(f"Failed to increment view count: {e}")
+    def increment_view_count(self, faq_id: int):
+        """Count a view of an FAQ; written in the counters' next batched flush"""
+        self.counters.record_view(faq_id)
     
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        try:
-            vec1 = np.array(vec1)
-            vec2 = np.array(vec2)
-            
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-            
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-            
-            return dot_product / (norm1 * norm2)
-            
-        except Exception as e:
-            logger.error(f"Cosine similarity calculation failed: {e}")
-            return 0.0 
\ No newline at end of file
+    async def record_feedback(
+        self,
+        db: AsyncSession,
+        faq_id: int,
+        user_id: int,
+        is_helpful: bool,
+        feedback_text: Optional[str] = None
+    ) -> Optional[FAQFeedbackEntry]:
+        """Store a user's feedback on an FAQ; None if the FAQ doesn't exist.
+        
+        Each user has one vote per FAQ. Submitting again replaces it, and the
+        helpful/not helpful counts only move when the vote changes, so
+        repeated submissions can't inflate them. The counts are written in the
+        counters' next batched flush. A concurrent first vote by the same user
+        raises IntegrityError.
+        """
+        result = await db.execute(select(FAQ.id).where(FAQ.id == faq_id))
+        if result.scalar_one_or_none() is None:
+            return None
+        
+        result = await db.execute(
+            select(FAQFeedbackEntry).where(
+                FAQFeedbackEntry.faq_id == faq_id,
+                FAQFeedbackEntry.user_id == user_id
+            )
+        )
+        entry = result.scalar_one_or_none()
+        previous = entry.is_helpful if entry is not None else None
+        if entry is None:
+            entry = FAQFeedbackEntry(faq_id=faq_id, user_id=user_id, is_helpful=is_helpful, feedback_text=feedback_text)
+            db.add(entry)
+        else:
+            entry.is_helpful = is_helpful
+            if feedback_text is not None:
+                entry.feedback_text = feedback_text
+        await db.commit()
+        
+        if previous != is_helpful:
+            if previous is not None:
+                self.counters.record_feedback(faq_id, previous, amount=-1)
+            self.counters.record_feedback(faq_id, is_helpful)
+        return entry
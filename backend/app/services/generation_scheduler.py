@@ -0,0 +1,317 @@
+from typing import AsyncIterator, List, Optional, Tuple
+from prometheus_client import Counter, Gauge
+from app.config import settings
+from app.services.inference_pool import InferenceOverloadedError
+from app.services.model_loader import inference_context
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+try:
+    import torch
+    import torch.nn.functional as F
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+    torch = None
+    F = None
+
+logger = logging.getLogger(__name__)
+
+GENERATION_BATCH_SIZE = Gauge(
+    "generation_batch_size",
+    "Sequences in the running local generation batch"
+)
+GENERATION_QUEUED = Gauge(
+    "generation_queued",
+    "Prompts waiting to join the local generation batch"
+)
+GENERATION_TOKENS = Counter(
+    "generation_tokens_total",
+    "Tokens generated by the batched local model"
+)
+GENERATION_REJECTED = Counter(
+    "generation_rejected_total",
+    "Prompts rejected because the generation queue was full"
+)
+
+# A layer's (key, value) cache tensors, each (batch, heads, length, head_dim)
+PastKeyValues = Tuple[Tuple["torch.Tensor", "torch.Tensor"], ...]
+
+
+class _Request:
+    """One prompt in the scheduler; text is handed back to its event loop as it is decoded"""
+
+    def __init__(self, prompt_ids: List[int], max_new_tokens: int, loop: asyncio.AbstractEventLoop):
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.loop = loop
+        self.chunks: asyncio.Queue = asyncio.Queue()
+        self.generated: List[int] = []
+        self.text = ""
+        self.finished = False
+        self.cancelled = False
+
+    def emit(self, item):
+        self.loop.call_soon_threadsafe(self.chunks.put_nowait, item)
+
+
+class GenerationScheduler:
+    """Continuous batching for a local causal LM on CPU.
+
+    A single model thread owns one running batch. Each iteration it admits
+    waiting prompts (prefilling them as one left-padded batch and merging
+    their key/value caches into the running one), retires sequences that hit
+    EOS, their token limit or were abandoned, and decodes one token for every
+    remaining sequence with a single forward pass. Sequences therefore join
+    and leave between steps instead of waiting for the whole batch to finish.
+
+    When the model is idle the first prompt waits up to ``max_wait_ms`` for
+    company before prefilling.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = settings.GENERATION_MAX_BATCH_SIZE,
+        max_wait_ms: float = settings.GENERATION_MAX_WAIT_MS,
+        max_new_tokens: int = settings.GENERATION_MAX_NEW_TOKENS,
+        max_prompt_tokens: int = 512,
+        max_queue: int = settings.INFERENCE_MAX_QUEUE,
+        temperature: float = 0.7
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_new_tokens = max_new_tokens
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_queue = max_queue
+        self.temperature = temperature
+        self.eos_token_id = tokenizer.eos_token_id
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        self._pending: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    async def stream(self, prompt: str, max_new_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield the continuation of ``prompt`` as it is generated"""
+        request = self._submit(prompt, max_new_tokens)
+        try:
+            while True:
+                item = await request.chunks.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Stops generation if the caller went away or timed out
+            request.cancelled = True
+
+    async def generate(self, prompt: str, max_new_tokens: Optional[int] = None) -> str:
+        return "".join([chunk async for chunk in self.stream(prompt, max_new_tokens)])
+
+    def _submit(self, prompt: str, max_new_tokens: Optional[int]) -> _Request:
+        if self._stopping:
+            raise RuntimeError("Generation scheduler is shut down")
+        if self._pending.qsize() >= self.max_queue:
+            GENERATION_REJECTED.inc()
+            raise InferenceOverloadedError("generation queue is full")
+        # Keep the end of long prompts; that's where the new message is
+        prompt_ids = self.tokenizer.encode(prompt)[-self.max_prompt_tokens:]
+        request = _Request(
+            prompt_ids,
+            min(max_new_tokens or self.max_new_tokens, self.max_new_tokens),
+            asyncio.get_running_loop()
+        )
+        self._pending.put(request)
+        GENERATION_QUEUED.set(self._pending.qsize())
+        return request
+
+    def _take(self, limit: int, wait: float) -> List[_Request]:
+        """Up to ``limit`` waiting requests, waiting at most ``wait`` seconds for them"""
+        taken: List[_Request] = []
+        deadline = time.monotonic() + wait
+        while len(taken) < limit:
+            timeout = deadline - time.monotonic()
+            try:
+                request = self._pending.get(timeout=timeout) if timeout > 0 else self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._stopping = True
+                break
+            if not request.cancelled:
+                taken.append(request)
+        GENERATION_QUEUED.set(self._pending.qsize())
+        return taken
+
+    def _run(self):
+        active: List[_Request] = []
+        past: Optional[PastKeyValues] = None
+        mask = None
+        last_tokens = None
+
+        while not self._stopping or active:
+            if not active:
+                first = self._pending.get()
+                if first is None:
+                    break
+                admitted = ([first] if not first.cancelled else []) + self._take(self.max_batch_size - 1, self.max_wait)
+            else:
+                admitted = self._take(self.max_batch_size - len(active), 0) if not self._stopping else []
+
+            try:
+                with inference_context():
+                    if admitted:
+                        new_past, new_mask, logits = self._prefill(admitted)
+                        tokens = self._sample(logits)
+                        self._append(admitted, tokens)
+                        past, mask = self._merge(past, mask, new_past, new_mask)
+                        last_tokens = tokens if last_tokens is None else torch.cat([last_tokens, tokens])
+                        active += admitted
+
+                    keep = [i for i, request in enumerate(active) if not self._done(request)]
+                    if len(keep) < len(active):
+                        for request in active:
+                            if self._done(request):
+                                self._finish(request)
+                        active = [active[i] for i in keep]
+                        if active:
+                            past, mask, last_tokens = self._select(past, mask, last_tokens, keep)
+                        else:
+                            past = mask = last_tokens = None
+                    GENERATION_BATCH_SIZE.set(len(active))
+
+                    if active:
+                        mask = torch.cat([mask, mask.new_ones((mask.shape[0], 1))], dim=1)
+                        outputs = self.model(
+                            input_ids=last_tokens[:, None],
+                            past_key_values=past,
+                            attention_mask=mask,
+                            position_ids=(mask.sum(dim=1, keepdim=True) - 1),
+                            use_cache=True
+                        )
+                        past = self._legacy(outputs.past_key_values)
+                        last_tokens = self._sample(outputs.logits[:, -1, :])
+                        self._append(active, last_tokens)
+            except Exception as e:
+                logger.error(f"Batched generation failed for {len(active) + len(admitted)} prompts: {e}")
+                for request in {id(r): r for r in active + admitted}.values():
+                    if not request.finished:
+                        request.finished = True
+                        request.emit(e)
+                active, past, mask, last_tokens = [], None, None, None
+                GENERATION_BATCH_SIZE.set(0)
+
+        # Anything still queued at shutdown would otherwise wait forever
+        while True:
+            try:
+                request = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.emit(RuntimeError("Generation scheduler is shut down"))
+
+    def _prefill(self, requests: List[_Request]):
+        """Run the prompts as one left-padded batch"""
+        length = max(len(request.prompt_ids) for request in requests)
+        input_ids = torch.full((len(requests), length), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(requests), length), dtype=torch.long)
+        for row, request in enumerate(requests):
+            ids = request.prompt_ids
+            input_ids[row, length - len(ids):] = torch.tensor(ids, dtype=torch.long)
+            mask[row, length - len(ids):] = 1
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=mask,
+            position_ids=(mask.cumsum(dim=1) - 1).clamp(min=0),
+            use_cache=True
+        )
+        return self._legacy(outputs.past_key_values), mask, outputs.logits[:, -1, :]
+
+    @staticmethod
+    def _legacy(past) -> PastKeyValues:
+        return past.to_legacy_cache() if hasattr(past, "to_legacy_cache") else past
+
+    @staticmethod
+    def _merge(past: Optional[PastKeyValues], mask, new_past: PastKeyValues, new_mask):
+        """Stack two batches, left-padding the shorter cache to a common length"""
+        if past is None:
+            return new_past, new_mask
+        length = max(mask.shape[1], new_mask.shape[1])
+
+        def pad(tensor, trailing_dims: int, current: int):
+            # Left-pad the sequence dimension, which has ``trailing_dims`` dimensions after it
+            return F.pad(tensor, (0, 0) * trailing_dims + (length - current, 0))
+
+        merged = tuple(
+            tuple(
+                torch.cat([pad(old, 1, mask.shape[1]), pad(new, 1, new_mask.shape[1])])
+                for old, new in zip(old_layer, new_layer)
+            )
+            for old_layer, new_layer in zip(past, new_past)
+        )
+        merged_mask = torch.cat([pad(mask, 0, mask.shape[1]), pad(new_mask, 0, new_mask.shape[1])])
+        return merged, merged_mask
+
+    @staticmethod
+    def _select(past: PastKeyValues, mask, last_tokens, rows: List[int]):
+        """Keep the given batch rows and drop cache columns no remaining row attends to"""
+        index = torch.tensor(rows, dtype=torch.long)
+        mask = mask.index_select(0, index)
+        first = int(torch.nonzero(mask.sum(dim=0))[0])
+        past = tuple(
+            tuple(tensor.index_select(0, index)[:, :, first:, :] for tensor in layer)
+            for layer in past
+        )
+        return past, mask[:, first:], last_tokens.index_select(0, index)
+
+    def _sample(self, logits):
+        if self.temperature <= 0:
+            return logits.argmax(dim=-1)
+        probabilities = torch.softmax(logits.float() / self.temperature, dim=-1)
+        return torch.multinomial(probabilities, 1).squeeze(-1)
+
+    def _append(self, requests: List[_Request], tokens):
+        for request, token in zip(requests, tokens.tolist()):
+            if request.finished or request.cancelled:
+                continue
+            if token == self.eos_token_id:
+                request.finished = True
+                continue
+            request.generated.append(token)
+            GENERATION_TOKENS.inc()
+            text = self.tokenizer.decode(request.generated, skip_special_tokens=True)
+            # Hold back a partially decoded multi-byte character
+            if not text.endswith("\ufffd") and len(text) > len(request.text):
+                request.emit(text[len(request.text):])
+                request.text = text
+            if len(request.generated) >= request.max_new_tokens:
+                request.finished = True
+
+    @staticmethod
+    def _done(request: _Request) -> bool:
+        return request.finished or request.cancelled
+
+    @staticmethod
+    def _finish(request: _Request):
+        request.finished = True
+        request.emit(None)
+
+    def shutdown(self, timeout: float = 30.0):
+        """Finish the running batch and stop the model thread"""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._pending.put(None)
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from prometheus_client import Counter
+from app.config import settings
+import json
+import logging
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE_REQUESTS = Counter(
+    "history_cache_requests_total",
+    "Conversation history lookups by result (memory_hit, redis_hit, miss)",
+    ["result"]
+)
+
+HistoryEntry = Dict[str, Any]
+
+
+class HistoryCache:
+    """Recent messages per conversation, ready to hand to the model.
+
+    Each entry is a window of the last ``window`` history dicts tagged with the
+    conversation's ``message_count`` when it was built. A lookup only hits if
+    that count is at least the caller's, so a window that missed writes from
+    another worker is treated as a miss rather than served stale. The in-process
+    LRU tier is optionally backed by Redis, which workers share.
+    """
+
+    def __init__(
+        self,
+        window: int,
+        max_conversations: int = settings.HISTORY_CACHE_MAX_CONVERSATIONS,
+        redis_url: Optional[str] = None,
+        ttl_seconds: int = settings.HISTORY_CACHE_TTL_SECONDS
+    ):
+        self.window = window
+        self.max_conversations = max_conversations
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[int, List[HistoryEntry]]]" = OrderedDict()
+        self._redis = None
+        if redis_url:
+            if REDIS_AVAILABLE:
+                self._redis = aioredis.from_url(redis_url, db=settings.REDIS_DB, decode_responses=True)
+            else:
+                logger.warning("redis is not installed; history cache stays in-process")
+
+    @staticmethod
+    def key(conversation_id: int) -> str:
+        return f"chat:history:{conversation_id}"
+
+    async def get(self, conversation_id: int, message_count: int) -> Optional[List[HistoryEntry]]:
+        """Return the cached window if it covers at least ``message_count`` messages"""
+        cached = self._entries.get(conversation_id)
+        if cached is not None and cached[0] >= message_count:
+            self._entries.move_to_end(conversation_id)
+            HISTORY_CACHE_REQUESTS.labels(result="memory_hit").inc()
+            return list(cached[1])
+
+        cached = await self._redis_get(conversation_id)
+        if cached is not None and cached[0] >= message_count:
+            self._remember(conversation_id, *cached)
+            HISTORY_CACHE_REQUESTS.labels(result="redis_hit").inc()
+            return list(cached[1])
+
+        HISTORY_CACHE_REQUESTS.labels(result="miss").inc()
+        return None
+
+    async def put(self, conversation_id: int, message_count: int, entries: List[HistoryEntry]):
+        """Store a window loaded from the database"""
+        entries = entries[-self.window:]
+        self._remember(conversation_id, message_count, entries)
+        await self._redis_set(conversation_id, message_count, entries)
+
+    async def append(
+        self,
+        conversation_id: int,
+        new_entries: List[HistoryEntry],
+        message_count: Optional[int] = None
+    ) -> Optional[int]:
+        """Extend the window after a turn was written and return the new message count.
+
+        ``message_count`` is the conversation's count including the new
+        messages, when the caller knows it. Without it (write-behind, where the
+        database count lags) whatever window is cached is extended.
+        """
+        previous_count = message_count - len(new_entries) if message_count is not None else None
+        cached = self._entries.get(conversation_id)
+        if cached is None or (previous_count is not None and cached[0] != previous_count):
+            cached = await self._redis_get(conversation_id)
+
+        if previous_count == 0:
+            entries = list(new_entries)
+        elif cached is not None and previous_count in (None, cached[0]):
+            entries = (cached[1] + list(new_entries))[-self.window:]
+            message_count = cached[0] + len(new_entries)
+        else:
+            # The window doesn't match what was written before; rebuild it on the next read
+            await self.invalidate(conversation_id)
+            return None
+
+        self._remember(conversation_id, message_count, entries)
+        await self._redis_set(conversation_id, message_count, entries)
+        return message_count
+
+    async def invalidate(self, conversation_id: int):
+        self._entries.pop(conversation_id, None)
+        if self._redis is not None:
+            try:
+                await self._redis.delete(self.key(conversation_id))
+            except Exception as e:
+                logger.warning(f"History cache delete failed: {e}")
+
+    def _remember(self, conversation_id: int, message_count: int, entries: List[HistoryEntry]):
+        self._entries[conversation_id] = (message_count, entries)
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+
+    async def _redis_get(self, conversation_id: int) -> Optional[Tuple[int, List[HistoryEntry]]]:
+        if self._redis is None:
+            return None
+        try:
+            data = await self._redis.get(self.key(conversation_id))
+        except Exception as e:
+            logger.warning(f"History cache read failed: {e}")
+            return None
+        if data is None:
+            return None
+        value = json.loads(data)
+        return value["count"], value["entries"]
+
+    async def _redis_set(self, conversation_id: int, message_count: int, entries: List[HistoryEntry]):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(
+                self.key(conversation_id),
+                json.dumps({"count": message_count, "entries": entries}),
+                ex=self.ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"History cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "conversations": len(self._entries),
+            "max_conversations": self.max_conversations,
+            "redis": self._redis is not None,
+        }
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
@@ -0,0 +1,79 @@
+from typing import List, Tuple
+from sqlalchemy import case, func, select, text, update
+from sqlalchemy.exc import IntegrityError
+from app.database import AsyncSessionLocal
+from app.models.id_block import IdBlock
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IdAllocator:
+    """Hands out primary keys for rows that are written later.
+
+    Each worker reserves ``block_size`` ids at a time by advancing its table's
+    counter in ``id_blocks`` with one ``UPDATE ... RETURNING``, so workers
+    never get overlapping ids and most reservations don't touch the database.
+    The counter is lifted past the table's current largest id first, which
+    covers rows inserted with database-generated ids. On PostgreSQL the
+    table's sequence is moved past the block as well, so later
+    database-generated ids can't collide with reserved ones. Ids left over
+    when a worker stops are simply never used.
+    """
+
+    def __init__(self, column, block_size: int = 100, session_factory=AsyncSessionLocal):
+        self.column = column
+        self.table = column.table.name
+        self.block_size = block_size
+        self.session_factory = session_factory
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def take(self, count: int) -> List[int]:
+        """Reserve ``count`` ids, in increasing order"""
+        async with self._lock:
+            ids: List[int] = []
+            while len(ids) < count:
+                if self._next >= self._end:
+                    self._next, self._end = await self._reserve()
+                taken = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + taken))
+                self._next += taken
+            return ids
+
+    async def _reserve(self) -> Tuple[int, int]:
+        """Claim the next block as ``(first, end)``, end exclusive"""
+        first_free = select(func.coalesce(func.max(self.column), 0) + 1)
+        floor = first_free.scalar_subquery()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(IdBlock)
+                .where(IdBlock.name == self.table)
+                .values(next_id=case((IdBlock.next_id > floor, IdBlock.next_id), else_=floor) + self.block_size)
+                .returning(IdBlock.next_id)
+            )
+            end = result.scalar_one_or_none()
+            if end is None:
+                end = await db.scalar(first_free) + self.block_size
+                db.add(IdBlock(name=self.table, next_id=end))
+                try:
+                    await db.flush()
+                except IntegrityError:
+                    # Another worker created the counter first
+                    await db.rollback()
+                    return await self._reserve()
+
+            if db.bind.dialect.name == "postgresql":
+                await db.execute(
+                    text(
+                        "SELECT setval(pg_get_serial_sequence(:table, :column), "
+                        "GREATEST(:last, nextval(pg_get_serial_sequence(:table, :column))))"
+                    ),
+                    {"table": self.table, "column": self.column.name, "last": end - 1}
+                )
+            await db.commit()
+
+        logger.debug(f"Reserved {self.table} ids {end - self.block_size}..{end - 1}")
+        return end - self.block_size, end
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from prometheus_client import Counter, Gauge
+import asyncio
+import functools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_IN_FLIGHT = Gauge(
+    "inference_in_flight",
+    "Inference jobs running or queued",
+    ["pool"]
+)
+INFERENCE_REJECTED = Counter(
+    "inference_rejected_total",
+    "Inference jobs rejected because the queue was full",
+    ["pool"]
+)
+INFERENCE_TIMEOUTS = Counter(
+    "inference_timeouts_total",
+    "Inference jobs whose caller gave up waiting",
+    ["pool"]
+)
+
+
+class InferenceOverloadedError(Exception):
+    """Raised when the inference queue is full and the job was not accepted"""
+
+
+class InferenceTimeoutError(Exception):
+    """Raised when an inference job does not finish within its timeout"""
+
+
+class EmbeddingUnavailableError(Exception):
+    """Raised when texts could not be encoded with the serving embedding model.
+
+    Callers must not substitute other vectors: anything stored or scored as
+    the model's embedding has to come from the model.
+    """
+
+
+class InferencePool:
+    """Runs blocking model calls on dedicated threads with bounded admission.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more
+    wait; anything beyond that is rejected immediately so the API can shed
+    load instead of piling up requests. A job keeps its slot until its thread
+    actually finishes, even if the caller timed out, so the limit reflects
+    real model usage.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, timeout_seconds: Optional[float] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.timeout_seconds = timeout_seconds
+        self.in_flight = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-inference")
+
+    def _acquire(self):
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                INFERENCE_REJECTED.labels(pool=self.name).inc()
+                raise InferenceOverloadedError(f"{self.name} inference queue is full")
+            self.in_flight += 1
+        INFERENCE_IN_FLIGHT.labels(pool=self.name).inc()
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.in_flight -= 1
+        INFERENCE_IN_FLIGHT.labels(pool=self.name).dec()
+
+    async def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run ``func`` on the pool and await its result"""
+        self._acquire()
+        try:
+            future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        timeout = timeout if timeout is not None else self.timeout_seconds
+        try:
+            # Cancelling the wrapper only cancels jobs that haven't started yet
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            INFERENCE_TIMEOUTS.labels(pool=self.name).inc()
+            raise InferenceTimeoutError(f"{self.name} inference timed out after {timeout}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self):
+        """Stop accepting work and drop jobs that haven't started"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
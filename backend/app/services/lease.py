@@ -0,0 +1,80 @@
+from typing import Optional
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from app.database import AsyncSessionLocal
+from app.models.lease import JobLease
+import os
+import socket
+import time
+import uuid
+
+
+class Lease:
+    """A named lock held through a row in ``job_leases``, so one worker runs a job.
+
+    Taking the lease is a single conditional UPDATE (free, lapsed or already
+    ours) or an INSERT that fails if another worker got there first, which
+    works the same on SQLite and PostgreSQL. The holder renews it well within
+    ``ttl_seconds``; if the holder dies it lapses and another worker can take
+    over.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float,
+        session_factory=AsyncSessionLocal,
+        owner: Optional[str] = None
+    ):
+        self.name = name
+        self.ttl = ttl_seconds
+        self.session_factory = session_factory
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    async def acquire(self) -> bool:
+        """Take the lease if it is free, lapsed or ours; False if another worker holds it"""
+        now = time.time()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(JobLease)
+                .where(
+                    JobLease.name == self.name,
+                    or_(JobLease.owner == self.owner, JobLease.expires_at < now)
+                )
+                .values(owner=self.owner, expires_at=now + self.ttl)
+            )
+            if result.rowcount:
+                await db.commit()
+                return True
+            db.add(JobLease(name=self.name, owner=self.owner, expires_at=now + self.ttl))
+            try:
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+                return False
+            return True
+
+    async def renew(self) -> bool:
+        """Extend the lease; False if it lapsed and another worker took it"""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(JobLease)
+                .where(JobLease.name == self.name, JobLease.owner == self.owner)
+                .values(expires_at=time.time() + self.ttl)
+            )
+            await db.commit()
+            return bool(result.rowcount)
+
+    async def release(self):
+        async with self.session_factory() as db:
+            await db.execute(delete(JobLease).where(JobLease.name == self.name, JobLease.owner == self.owner))
+            await db.commit()
+
+    async def held_elsewhere(self) -> bool:
+        """Whether another worker holds the lease right now"""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(JobLease.owner).where(JobLease.name == self.name, JobLease.expires_at >= time.time())
+            )
+            owner = result.scalar_one_or_none()
+        return owner is not None and owner != self.owner
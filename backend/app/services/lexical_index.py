@@ -0,0 +1,230 @@
+from collections import Counter as TermCounter
+from typing import Any, Dict, Iterable, List, Optional
+from app.config import settings
+from app.models.faq import FAQ, FAQStatus
+import heapq
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+# Field weights: a keyword or question match says more than one buried in the answer
+FIELD_WEIGHTS = {"question": 2.0, "keywords": 3.0, "answer": 1.0}
+
+STOPWORDS = {
+    "en": {
+        "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i",
+        "if", "in", "is", "it", "me", "my", "of", "on", "or", "the", "to", "what", "when", "where",
+        "which", "who", "why", "will", "with", "you", "your",
+    },
+    "es": {"a", "de", "el", "en", "es", "la", "las", "lo", "los", "mi", "para", "por", "que", "se", "un", "una", "y"},
+    "fr": {"de", "des", "du", "en", "est", "et", "je", "la", "le", "les", "mon", "pour", "que", "un", "une"},
+    "de": {"das", "der", "die", "ein", "eine", "ich", "ist", "mein", "mit", "und", "wie", "zu"},
+    "pt": {"a", "de", "do", "da", "em", "o", "os", "para", "que", "um", "uma", "e"},
+    "it": {"di", "e", "il", "la", "le", "per", "che", "un", "una", "come", "mio"},
+}
+
+# Scripts written without spaces; words are approximated by character bigrams
+_UNSEGMENTED = {"zh", "ja", "th"}
+
+
+def _base_language(language: Optional[str]) -> str:
+    return re.split(r"[-_]", (language or "en").lower())[0]
+
+
+def _stem_en(word: str) -> str:
+    """Fold regular English plurals so "invoices" matches "invoice" """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str, language: str = "en") -> List[str]:
+    """Search terms of ``text`` using the rules for its language"""
+    if not text:
+        return []
+    base = _base_language(language)
+    words = _WORD.findall(text.lower())
+    if base in _UNSEGMENTED:
+        terms = []
+        for word in words:
+            terms.extend(word[i:i + 2] for i in range(max(len(word) - 1, 1)))
+        return terms
+    stopwords = STOPWORDS.get(base, ())
+    terms = [word for word in words if word not in stopwords]
+    if base == "en":
+        terms = [_stem_en(term) for term in terms]
+    return terms
+
+
+def _keyword_text(keywords: Any) -> str:
+    if not keywords:
+        return ""
+    if isinstance(keywords, str):
+        return keywords
+    return " ".join(str(keyword) for keyword in keywords)
+
+
+class _Corpus:
+    """Postings and length statistics for the FAQs of one language"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.documents: Dict[int, Dict[str, float]] = {}
+        self.lengths: Dict[int, float] = {}
+        self.total_length = 0.0
+
+    def add(self, faq_id: int, terms: Dict[str, float]):
+        self.documents[faq_id] = terms
+        length = sum(terms.values())
+        self.lengths[faq_id] = length
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[faq_id] = frequency
+
+    def remove(self, faq_id: int):
+        terms = self.documents.pop(faq_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.lengths.pop(faq_id)
+        for term in terms:
+            posting = self.postings[term]
+            del posting[faq_id]
+            if not posting:
+                del self.postings[term]
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+
+class LexicalFAQIndex:
+    """In-memory inverted index over published FAQs, scored with BM25.
+
+    Question, answer and keywords are tokenized by the FAQ's language and
+    combined into one document with per-field term weights (``FIELD_WEIGHTS``),
+    so an exact keyword hit outranks the same word deep in an answer. Each
+    language keeps its own postings and length statistics, and FAQ writes
+    update them in place.
+    """
+
+    def __init__(self, k1: Optional[float] = None, b: Optional[float] = None):
+        self.k1 = k1 if k1 is not None else settings.FAQ_BM25_K1
+        self.b = b if b is not None else settings.FAQ_BM25_B
+        self._corpora: Dict[str, _Corpus] = {}
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._languages: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _terms(faq: FAQ, language: str) -> Dict[str, float]:
+        weighted = TermCounter()
+        fields = {"question": faq.question, "answer": faq.answer, "keywords": _keyword_text(faq.keywords)}
+        for field, text in fields.items():
+            for term in tokenize(text, language):
+                weighted[term] += FIELD_WEIGHTS[field]
+        return dict(weighted)
+
+    @staticmethod
+    def _payload(faq: FAQ) -> Dict[str, Any]:
+        return {
+            "id": faq.id,
+            "question": faq.question,
+            "answer": faq.answer,
+            "category_id": faq.category_id,
+        }
+
+    def load(self, faqs: Iterable[FAQ]):
+        """Replace the index contents with the given FAQs"""
+        self._corpora = {}
+        self._entries = {}
+        self._languages = {}
+        for faq in faqs:
+            self._add(faq)
+        logger.info(f"FAQ lexical index loaded with {len(self._entries)} entries")
+
+    def _add(self, faq: FAQ):
+        if faq.status != FAQStatus.PUBLISHED:
+            return
+        language = faq.language or "en"
+        self._corpora.setdefault(language, _Corpus()).add(faq.id, self._terms(faq, language))
+        self._entries[faq.id] = self._payload(faq)
+        self._languages[faq.id] = language
+
+    def upsert(self, faq: FAQ):
+        """Re-index a single FAQ to match its current state"""
+        self.remove(faq.id)
+        self._add(faq)
+
+    def remove(self, faq_id: int):
+        language = self._languages.pop(faq_id, None)
+        if language is None:
+            return
+        self._entries.pop(faq_id, None)
+        corpus = self._corpora[language]
+        corpus.remove(faq_id)
+        if not len(corpus):
+            del self._corpora[language]
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        language: str = "en",
+        category_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the top FAQs for a text query by BM25 score, best first"""
+        scores = self._scores(query, language)
+        if category_id is not None:
+            scores = {
+                faq_id: score for faq_id, score in scores.items()
+                if self._entries[faq_id]["category_id"] == category_id
+            }
+        best = heapq.nlargest(max(limit, 0), scores.items(), key=lambda item: item[1])
+        return [{**self._entries[faq_id], "lexical_score": score} for faq_id, score in best]
+
+    def scores(self, query: str, faq_ids: Iterable[int], language: str = "en") -> Dict[int, float]:
+        """BM25 score of each given FAQ for the query; 0 for FAQs it doesn't match"""
+        faq_ids = list(faq_ids)
+        scores = dict.fromkeys(faq_ids, 0.0)
+        for posting, idf, corpus, average_length in self._query_terms(query, language):
+            for faq_id in faq_ids:
+                frequency = posting.get(faq_id)
+                if frequency:
+                    scores[faq_id] += self._term_score(idf, frequency, corpus.lengths[faq_id], average_length)
+        return scores
+
+    def _scores(self, query: str, language: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for posting, idf, corpus, average_length in self._query_terms(query, language):
+            for faq_id, frequency in posting.items():
+                score = self._term_score(idf, frequency, corpus.lengths[faq_id], average_length)
+                scores[faq_id] = scores.get(faq_id, 0.0) + score
+        return scores
+
+    def _query_terms(self, query: str, language: str):
+        """Posting, idf and corpus statistics for each query term present in the language"""
+        corpus = self._corpora.get(language)
+        if corpus is None:
+            return
+        count = len(corpus)
+        average_length = corpus.total_length / count
+        for term in set(tokenize(query, language)):
+            posting = corpus.postings.get(term)
+            if posting:
+                idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+                yield posting, idf, corpus, average_length
+
+    def _term_score(self, idf: float, frequency: float, length: float, average_length: float) -> float:
+        norm = self.k1 * (1 - self.b + self.b * length / average_length)
+        return idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+
+# Shared by every FAQService in the worker, like the embedding index
+lexical_index = LexicalFAQIndex()
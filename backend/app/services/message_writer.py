@@ -0,0 +1,375 @@
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from prometheus_client import Counter, Gauge
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import InterfaceError, OperationalError
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.conversation import Conversation, Message, MessageType, MessageStatus
+from app.services.id_blocks import IdAllocator
+import asyncio
+import json
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_PENDING = Gauge(
+    "chat_write_behind_pending",
+    "Chat messages queued for the next database flush"
+)
+WRITE_BEHIND_FLUSHED = Counter(
+    "chat_write_behind_flushed_total",
+    "Chat messages written to the database by the write-behind flusher"
+)
+WRITE_BEHIND_FAILURES = Counter(
+    "chat_write_behind_flush_failures_total",
+    "Write-behind flushes that failed and were retried"
+)
+WRITE_BEHIND_DEAD_LETTERS = Counter(
+    "chat_write_behind_dead_letters_total",
+    "Chat messages the database rejected on their own, set aside in the dead-letter file"
+)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Connection trouble, as opposed to a row the database will never accept"""
+    return isinstance(error, (OperationalError, InterfaceError)) or getattr(error, "connection_invalidated", False)
+
+
+class MessageWriteBehind:
+    """Takes chat message inserts off the request path.
+
+    Messages are appended to a local journal and queued in memory; a single
+    background task writes them in bulk ``INSERT`` batches and applies the
+    conversation counters once per conversation per batch. The queue is FIFO
+    and flushed by one task, so messages of a conversation are stored in the
+    order they were queued. Message ids are reserved up front (see
+    ``reserve_ids``), so a queued message can be returned with its id.
+
+    Crash safety: every queued message is in the journal before the request
+    returns, and the journal records which sequence numbers have been
+    committed. On startup anything not acknowledged is replayed, skipping rows
+    that did reach the database before the crash.
+
+    A batch that fails ``max_attempts`` times in a row is written one message
+    at a time, so one bad row (say, its conversation was deleted) can't hold
+    up the queue. Messages the database rejects on their own are logged,
+    copied to a dead-letter file next to the journal and acknowledged;
+    connection errors keep everything queued.
+    """
+
+    def __init__(
+        self,
+        journal_path: str = settings.CHAT_WRITE_BEHIND_JOURNAL,
+        batch_size: int = settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+        flush_interval_ms: float = settings.CHAT_WRITE_BEHIND_FLUSH_MS,
+        max_pending: int = settings.CHAT_WRITE_BEHIND_MAX_PENDING,
+        fsync: bool = settings.CHAT_WRITE_BEHIND_FSYNC,
+        max_attempts: int = settings.CHAT_WRITE_BEHIND_MAX_ATTEMPTS,
+        id_block_size: int = settings.CHAT_WRITE_BEHIND_ID_BLOCK,
+        session_factory=AsyncSessionLocal
+    ):
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+        self.session_factory = session_factory
+        self.ids = IdAllocator(Message.id, id_block_size, session_factory)
+        self.running = False
+        self.dead_letter_path: Optional[str] = None
+        self._failed_attempts = 0
+        self._seq = 0
+        self._queue: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self._inflight: List[Tuple[int, Dict[str, Any]]] = []
+        self._journal = None
+        self._lock = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Replay unacknowledged journal entries and start the flusher"""
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.journal_path = self._claim_journal()
+        root, ext = os.path.splitext(self.journal_path)
+        self.dead_letter_path = f"{root}.dead{ext}"
+
+        replay = self._read_journal()
+        if replay:
+            replay = await self._drop_already_written(replay)
+            logger.info(f"Replaying {len(replay)} chat messages from the write-behind journal")
+
+        # Start a fresh journal holding only what still has to be written
+        self._seq = 0
+        entries = [(seq, row) for seq, (_, row) in enumerate(replay, start=1)]
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as journal:
+            journal.write("".join(json.dumps({"seq": seq, "row": self._encode(row)}) + "\n" for seq, row in entries))
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self._seq = len(entries)
+        self._queue.extend(entries)
+
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self.running = True
+        self._task = asyncio.create_task(self._flush_loop())
+        if self._queue:
+            self._wakeup.set()
+
+    def enqueue(self, rows: List[Dict[str, Any]]) -> bool:
+        """Journal and queue message rows; False if the queue is full or the writer is stopped"""
+        if not self.running or len(self._queue) + len(rows) > self.max_pending:
+            return False
+
+        entries = []
+        for row in rows:
+            self._seq += 1
+            entries.append((self._seq, row))
+        self._append_journal([{"seq": seq, "row": self._encode(row)} for seq, row in entries])
+
+        self._queue.extend(entries)
+        WRITE_BEHIND_PENDING.set(len(self._queue))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def reserve_ids(self, count: int) -> List[int]:
+        """Message ids for rows about to be queued.
+
+        While write-behind runs every chat message takes its id from here,
+        including turns written synchronously, so ids of queued messages are
+        never handed out twice.
+        """
+        return await self.ids.take(count)
+
+    def pending(self, conversation_id: int) -> List[Dict[str, Any]]:
+        """Queued rows for a conversation that may not be in the database yet"""
+        return [
+            row for _, row in list(self._inflight) + list(self._queue)
+            if row["conversation_id"] == conversation_id
+        ]
+
+    async def _flush_loop(self):
+        while self.running or self._queue:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            while self._queue:
+                if not await self._flush_batch():
+                    # Leave the rest queued and back off
+                    await asyncio.sleep(min(self.flush_interval * 10, 5.0))
+                    break
+
+    async def _flush_batch(self) -> bool:
+        count = min(self.batch_size, len(self._queue))
+        self._inflight = [self._queue.popleft() for _ in range(count)]
+
+        if self._failed_attempts >= self.max_attempts:
+            return await self._flush_one_by_one()
+
+        try:
+            await self._write([row for _, row in self._inflight])
+        except Exception as e:
+            self._failed_attempts += 1
+            logger.error(f"Write-behind flush of {count} messages failed (attempt {self._failed_attempts}): {e}")
+            WRITE_BEHIND_FAILURES.inc()
+            self._requeue(self._inflight)
+            return False
+
+        self._flushed(self._inflight[-1][0], count)
+        return True
+
+    async def _flush_one_by_one(self) -> bool:
+        """Write the in-flight batch a message at a time, setting aside messages that can't be written"""
+        done = 0
+        for position, (seq, row) in enumerate(self._inflight):
+            try:
+                await self._write([row])
+            except Exception as e:
+                if _is_transient(e):
+                    logger.error(f"Write-behind flush failed, database unavailable: {e}")
+                    WRITE_BEHIND_FAILURES.inc()
+                    handled = self._inflight[:position]
+                    # Requeue before acknowledging, so the journal isn't truncated under them
+                    self._requeue(self._inflight[position:])
+                    if handled:
+                        self._flushed(handled[-1][0], done)
+                    return False
+                self._dead_letter(seq, row, e)
+            else:
+                done += 1
+
+        self._flushed(self._inflight[-1][0], done)
+        return True
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        """Insert messages and apply their conversation counters in one transaction"""
+        counters: Dict[int, Dict[str, Any]] = defaultdict(lambda: {"messages": 0, "tokens": 0, "last": None})
+        for row in rows:
+            totals = counters[row["conversation_id"]]
+            totals["messages"] += 1
+            totals["tokens"] += row.get("tokens_used") or 0
+            totals["last"] = max(totals["last"] or row["created_at"], row["created_at"])
+
+        async with self.session_factory() as db:
+            # Rows journaled before ids were reserved up front have none
+            for has_id in (True, False):
+                batch = [row for row in rows if ("id" in row) is has_id]
+                if batch:
+                    await db.execute(insert(Message), batch)
+            await db.execute(
+                update(Conversation.__table__)
+                .where(Conversation.__table__.c.id == bindparam("conversation_id"))
+                .values(
+                    message_count=Conversation.__table__.c.message_count + bindparam("messages"),
+                    total_tokens=Conversation.__table__.c.total_tokens + bindparam("tokens"),
+                    last_message_at=bindparam("last")
+                ),
+                [
+                    {"conversation_id": conversation_id, **totals}
+                    for conversation_id, totals in counters.items()
+                ]
+            )
+            await db.commit()
+
+    def _requeue(self, entries: List[Tuple[int, Dict[str, Any]]]):
+        self._queue.extendleft(reversed(entries))
+        self._inflight = []
+
+    def _flushed(self, last_seq: int, written: int):
+        """Everything up to ``last_seq`` is written or set aside"""
+        self._inflight = [entry for entry in self._inflight if entry[0] > last_seq]
+        self._failed_attempts = 0
+        WRITE_BEHIND_FLUSHED.inc(written)
+        WRITE_BEHIND_PENDING.set(len(self._queue))
+        self._acknowledge(last_seq)
+
+    def _dead_letter(self, seq: int, row: Dict[str, Any], error: Exception):
+        record = json.dumps({"seq": seq, "row": self._encode(row), "error": str(error)})
+        logger.error(f"Setting aside chat message the database rejected: {record}")
+        WRITE_BEHIND_DEAD_LETTERS.inc()
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letters:
+                dead_letters.write(record + "\n")
+        except OSError as e:
+            logger.error(f"Could not write to {self.dead_letter_path}: {e}")
+
+    def _claim_journal(self) -> str:
+        """Pick a journal no other worker process holds, so each worker gets its own"""
+        if fcntl is None:
+            return self.journal_path
+        root, ext = os.path.splitext(self.journal_path)
+        for slot in range(64):
+            path = self.journal_path if slot == 0 else f"{root}.{slot}{ext}"
+            lock = open(f"{path}.lock", "w")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                continue
+            self._lock = lock
+            return path
+        raise RuntimeError(f"All write-behind journal slots for {self.journal_path} are in use")
+
+    def _append_journal(self, records: List[Dict[str, Any]]):
+        self._journal.write("".join(json.dumps(record) + "\n" for record in records))
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _acknowledge(self, seq: int):
+        if self._queue:
+            self._append_journal([{"ack": seq}])
+        else:
+            # Everything is committed, so the journal can start over
+            self._journal.truncate(0)
+            self._journal.seek(0)
+
+    def _read_journal(self) -> List[Tuple[int, Dict[str, Any]]]:
+        if not os.path.exists(self.journal_path):
+            return []
+        entries: Dict[int, Dict[str, Any]] = {}
+        acked = 0
+        with open(self.journal_path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    logger.warning("Skipping unreadable write-behind journal line")
+                    continue
+                if "ack" in record:
+                    acked = max(acked, record["ack"])
+                else:
+                    entries[record["seq"]] = self._decode(record["row"])
+        return [(seq, row) for seq, row in sorted(entries.items()) if seq > acked]
+
+    async def _drop_already_written(self, entries: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+        """Skip rows committed before the crash but never acknowledged"""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Message.conversation_id, Message.message_type, Message.created_at).where(
+                    Message.conversation_id.in_({row["conversation_id"] for _, row in entries}),
+                    Message.created_at.in_({row["created_at"] for _, row in entries})
+                )
+            )
+            written = {
+                (conversation_id, message_type, created_at.replace(tzinfo=None))
+                for conversation_id, message_type, created_at in result
+            }
+        return [
+            (seq, row) for seq, row in entries
+            if (row["conversation_id"], row["message_type"], row["created_at"]) not in written
+        ]
+
+    @staticmethod
+    def _encode(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **row,
+            "message_type": row["message_type"].value,
+            "status": row["status"].value,
+            "created_at": row["created_at"].isoformat(),
+        }
+
+    @staticmethod
+    def _decode(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **row,
+            "message_type": MessageType(row["message_type"]),
+            "status": MessageStatus(row["status"]),
+            "created_at": datetime.fromisoformat(row["created_at"]),
+        }
+
+    async def close(self):
+        """Flush what is queued; anything that can't be written stays in the journal"""
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=30)
+        except asyncio.TimeoutError:
+            logger.error(f"Write-behind flush did not finish; {len(self._queue)} messages left in the journal")
+            self._task.cancel()
+        self._journal.close()
+        self._journal = None
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+
+message_writer = MessageWriteBehind()
@@ -0,0 +1,148 @@
+from contextlib import nullcontext
+from typing import Any, Dict, Optional
+from app.config import settings
+import logging
+import os
+import time
+
+try:
+    import torch
+    from torch import nn
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+    torch = None
+    nn = None
+
+try:
+    from transformers import AutoModelForCausalLM
+    from transformers.pytorch_utils import Conv1D
+except ImportError:
+    AutoModelForCausalLM = None
+    Conv1D = None
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "int8")
+
+BENCHMARK_PROMPT = "User: How do I reset my password?\nAssistant:"
+
+
+def configure_threads():
+    """Apply the torch thread settings; call once before any model runs"""
+    if not TORCH_AVAILABLE:
+        return
+    if settings.TORCH_NUM_THREADS > 0:
+        torch.set_num_threads(settings.TORCH_NUM_THREADS)
+    if settings.TORCH_NUM_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(settings.TORCH_NUM_INTEROP_THREADS)
+        except RuntimeError as e:
+            # Only allowed before the first parallel op in the process
+            logger.warning(f"Could not set torch inter-op threads: {e}")
+
+
+def inference_context():
+    """Context for model calls: no autograd bookkeeping when inference mode is on"""
+    if TORCH_AVAILABLE and settings.TORCH_INFERENCE_MODE:
+        return torch.inference_mode()
+    return nullcontext()
+
+
+def load_chat_model(name: str, quantization: str = settings.MODEL_QUANTIZATION):
+    """Load a causal LM for generation on CPU in the configured mode"""
+    model = AutoModelForCausalLM.from_pretrained(name)
+    model.eval()
+    if quantization == "int8":
+        model = quantize_int8(model)
+    elif quantization != "none":
+        raise ValueError(f"Unknown MODEL_QUANTIZATION {quantization!r}; expected one of {QUANTIZATION_MODES}")
+    return model
+
+
+def prepare_embedding_model(model, quantization: str = settings.MODEL_QUANTIZATION):
+    """Put a sentence-transformers model in eval mode and quantize it if configured"""
+    model.eval()
+    if quantization == "int8":
+        model = quantize_int8(model)
+    return model
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of every linear layer (weights int8, activations quantized per batch).
+
+    GPT-2 style models implement their projections as ``Conv1D``, which
+    dynamic quantization doesn't handle, so those are turned into equivalent
+    ``nn.Linear`` layers first.
+    """
+    if Conv1D is not None:
+        _replace_conv1d(model)
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _replace_conv1d(module):
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = nn.Linear(in_features, out_features)
+            # Conv1D stores the weight as (in, out)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _replace_conv1d(child)
+
+
+def model_footprint_bytes(model) -> int:
+    """Bytes held by a model's weights, including packed quantized weights"""
+    total = 0
+    for value in model.state_dict().values():
+        tensors = value if isinstance(value, (tuple, list)) else (value,)
+        for tensor in tensors:
+            if TORCH_AVAILABLE and isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident memory of this process, where the platform exposes it"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def measure_tokens_per_second(model, tokenizer, new_tokens: int = 32) -> float:
+    """Greedy-generate ``new_tokens`` tokens from a fixed prompt and return the rate"""
+    inputs = tokenizer(BENCHMARK_PROMPT, return_tensors="pt")
+    with inference_context():
+        start = time.perf_counter()
+        model.generate(
+            **inputs,
+            max_new_tokens=new_tokens,
+            min_new_tokens=new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+        elapsed = time.perf_counter() - start
+    return new_tokens / elapsed
+
+
+def startup_report(chat_model=None, tokenizer=None, embedding_model=None) -> Dict[str, Any]:
+    """Memory footprint and generation speed of the loaded models in the current mode"""
+    report: Dict[str, Any] = {
+        "quantization": settings.MODEL_QUANTIZATION,
+        "inference_mode": settings.TORCH_INFERENCE_MODE,
+        "threads": torch.get_num_threads() if TORCH_AVAILABLE else None,
+    }
+    if chat_model is not None:
+        report["chat_model_mb"] = round(model_footprint_bytes(chat_model) / 2**20, 1)
+        if tokenizer is not None:
+            report["tokens_per_second"] = round(measure_tokens_per_second(chat_model, tokenizer), 1)
+    if embedding_model is not None:
+        report["embedding_model_mb"] = round(model_footprint_bytes(embedding_model) / 2**20, 1)
+    rss = process_rss_bytes()
+    if rss is not None:
+        report["process_rss_mb"] = round(rss / 2**20, 1)
+    return report
@@ -0,0 +1,298 @@
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from prometheus_client import Counter
+from app.config import settings
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+FANOUT_FRAMES = Counter(
+    "websocket_fanout_frames_total",
+    "Frames routed through the fan-out bus (published, received, dropped)",
+    ["result"]
+)
+FANOUT_BATCHES = Counter(
+    "websocket_fanout_batches_total",
+    "Batched messages published to other workers"
+)
+
+# Frames buffered for other workers before the oldest are dropped
+_MAX_PENDING = 10000
+
+MessageHandler = Callable[[str], None]
+Deliver = Callable[[int, str], int]
+
+
+class InMemoryBroker:
+    """Process-local broker with the subset of Redis pub/sub the fan-out needs.
+
+    Several buses sharing one instance behave like workers sharing a Redis
+    server, which makes it usable as a fake broker for local runs.
+    """
+
+    def __init__(self):
+        self._sets: Dict[str, Set[str]] = defaultdict(set)
+        self._handlers: Dict[str, List[MessageHandler]] = defaultdict(list)
+
+    async def add_member(self, keys: Iterable[str], member: str, ttl: float):
+        for key in keys:
+            self._sets[key].add(member)
+
+    async def remove_member(self, key: str, member: str):
+        members = self._sets.get(key)
+        if members is not None:
+            members.discard(member)
+            if not members:
+                del self._sets[key]
+
+    async def members(self, keys: List[str]) -> List[Set[str]]:
+        return [set(self._sets.get(key, ())) for key in keys]
+
+    async def publish(self, messages: Dict[str, str]):
+        loop = asyncio.get_running_loop()
+        for channel, data in messages.items():
+            for handler in self._handlers.get(channel, ()):
+                # Deliver asynchronously, like a real broker
+                loop.call_soon(handler, data)
+
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        self._handlers[channel].append(handler)
+
+    async def unsubscribe(self, channel: str, handler: MessageHandler):
+        if handler in self._handlers.get(channel, ()):
+            self._handlers[channel].remove(handler)
+
+    async def close(self):
+        pass
+
+
+class RedisBroker:
+    """Presence sets and worker channels on Redis"""
+
+    def __init__(self, url: str, db: int = 0):
+        self._redis = aioredis.from_url(url, db=db, decode_responses=True)
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, MessageHandler] = {}
+
+    async def add_member(self, keys: Iterable[str], member: str, ttl: float):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.sadd(key, member)
+                pipe.expire(key, int(ttl))
+            await pipe.execute()
+
+    async def remove_member(self, key: str, member: str):
+        await self._redis.srem(key, member)
+
+    async def members(self, keys: List[str]) -> List[Set[str]]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.smembers(key)
+            return await pipe.execute()
+
+    async def publish(self, messages: Dict[str, str]):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for channel, data in messages.items():
+                pipe.publish(channel, data)
+            await pipe.execute()
+
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        if self._pubsub is None:
+            self._pubsub = self._redis.pubsub()
+        self._handlers[channel] = handler
+        await self._pubsub.subscribe(channel)
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read_loop())
+
+    async def unsubscribe(self, channel: str, handler: MessageHandler):
+        self._handlers.pop(channel, None)
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(channel)
+
+    async def _read_loop(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis pub/sub read failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None:
+                continue
+            handler = self._handlers.get(message["channel"])
+            if handler is not None:
+                handler(message["data"])
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self._redis.aclose()
+
+
+class FanoutBus:
+    """Routes WebSocket frames to the workers that hold a user's sockets.
+
+    Each worker records which users it has connected in a per-user presence
+    set and listens on its own channel. Frames for users connected elsewhere
+    are buffered, then published as one message per destination worker.
+    """
+
+    def __init__(
+        self,
+        broker,
+        worker_id: Optional[str] = None,
+        batch_size: int = settings.WS_FANOUT_BATCH_SIZE,
+        batch_wait_ms: float = settings.WS_FANOUT_BATCH_WAIT_MS,
+        presence_ttl: float = settings.WS_PRESENCE_TTL_SECONDS
+    ):
+        self.broker = broker
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.presence_ttl = presence_ttl
+        self._buffer: List[Tuple[int, str]] = []
+        self._wakeup = asyncio.Event()
+        self._deliver: Optional[Deliver] = None
+        self._local_users: Callable[[], Iterable[int]] = lambda: ()
+        self._tasks: List[asyncio.Task] = []
+
+    @staticmethod
+    def presence_key(user_id: int) -> str:
+        return f"chat:presence:{user_id}"
+
+    @staticmethod
+    def worker_channel(worker_id: str) -> str:
+        return f"chat:worker:{worker_id}"
+
+    async def start(self, deliver: Deliver, local_users: Callable[[], Iterable[int]]):
+        """Subscribe to this worker's channel and start the flush and presence loops"""
+        self._deliver = deliver
+        self._local_users = local_users
+        await self.broker.subscribe(self.worker_channel(self.worker_id), self._on_message)
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._presence_loop()),
+        ]
+
+    async def join(self, user_id: int):
+        """Advertise that this worker holds sockets for the user"""
+        try:
+            await self.broker.add_member([self.presence_key(user_id)], self.worker_id, self.presence_ttl)
+        except Exception as e:
+            logger.error(f"Failed to record presence for user {user_id}: {e}")
+
+    async def leave(self, user_id: int):
+        try:
+            await self.broker.remove_member(self.presence_key(user_id), self.worker_id)
+        except Exception as e:
+            logger.error(f"Failed to clear presence for user {user_id}: {e}")
+
+    def publish(self, user_id: int, frame: str):
+        """Queue a frame for the user's sockets on other workers"""
+        if len(self._buffer) >= _MAX_PENDING:
+            self._buffer.pop(0)
+            FANOUT_FRAMES.labels(result="dropped").inc()
+        self._buffer.append((user_id, frame))
+        self._wakeup.set()
+
+    async def _flush_loop(self):
+        # A single flusher keeps frames for a user in order
+        while True:
+            await self._wakeup.wait()
+            if len(self._buffer) < self.batch_size:
+                await asyncio.sleep(self.batch_wait)
+            self._wakeup.clear()
+
+            pending, self._buffer = self._buffer, []
+            for start in range(0, len(pending), self.batch_size):
+                try:
+                    await self._send(pending[start:start + self.batch_size])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"WebSocket fan-out publish failed: {e}")
+                    FANOUT_FRAMES.labels(result="dropped").inc(len(pending) - start)
+                    break
+
+    async def _send(self, batch: List[Tuple[int, str]]):
+        user_ids = list(dict.fromkeys(user_id for user_id, _ in batch))
+        workers_by_user = dict(zip(
+            user_ids,
+            await self.broker.members([self.presence_key(user_id) for user_id in user_ids])
+        ))
+
+        per_worker: Dict[str, List[Tuple[int, str]]] = defaultdict(list)
+        for user_id, frame in batch:
+            for worker_id in workers_by_user[user_id]:
+                if worker_id != self.worker_id:
+                    per_worker[worker_id].append((user_id, frame))
+
+        if not per_worker:
+            return
+        await self.broker.publish({
+            self.worker_channel(worker_id): json.dumps(entries)
+            for worker_id, entries in per_worker.items()
+        })
+        FANOUT_BATCHES.inc(len(per_worker))
+        FANOUT_FRAMES.labels(result="published").inc(sum(len(e) for e in per_worker.values()))
+
+    def _on_message(self, data: str):
+        try:
+            entries = json.loads(data)
+        except ValueError as e:
+            logger.warning(f"Ignoring malformed fan-out message: {e}")
+            return
+        FANOUT_FRAMES.labels(result="received").inc(len(entries))
+        for user_id, frame in entries:
+            self._deliver(user_id, frame)
+
+    async def _presence_loop(self):
+        # Presence sets expire, so a crashed worker stops receiving traffic
+        while True:
+            await asyncio.sleep(self.presence_ttl / 3)
+            keys = [self.presence_key(user_id) for user_id in self._local_users()]
+            if not keys:
+                continue
+            try:
+                await self.broker.add_member(keys, self.worker_id, self.presence_ttl)
+            except Exception as e:
+                logger.error(f"Failed to refresh WebSocket presence: {e}")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        for user_id in list(self._local_users()):
+            await self.leave(user_id)
+        await self.broker.unsubscribe(self.worker_channel(self.worker_id), self._on_message)
+        await self.broker.close()
+
+
+def create_fanout_bus(backend: str = settings.WS_FANOUT_BACKEND) -> FanoutBus:
+    """Build the fan-out bus for the configured backend"""
+    if backend == "redis":
+        if REDIS_AVAILABLE:
+            return FanoutBus(RedisBroker(settings.REDIS_URL, settings.REDIS_DB))
+        logger.warning("redis is not installed; WebSocket fan-out stays in-process")
+    elif backend != "memory":
+        logger.warning(f"Unknown WebSocket fan-out backend {backend!r}; using in-process")
+    return FanoutBus(InMemoryBroker())
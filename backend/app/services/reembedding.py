@@ -0,0 +1,384 @@
+from typing import Any, Dict, List, Optional
+from prometheus_client import Counter, Gauge
+from sqlalchemy import bindparam, func, or_, select
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.embedding import encode_embedding
+from app.models.faq import FAQ, FAQStatus, content_hash
+from app.services.faq_index import FAQEmbeddingIndex
+from app.services.lease import Lease
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+REEMBEDDING_RUNNING = Gauge(
+    "faq_reembedding_running",
+    "1 while a FAQ re-embedding job is running"
+)
+REEMBEDDING_PROGRESS = Gauge(
+    "faq_reembedding_faqs",
+    "FAQs in the running re-embedding job by state (total, done)",
+    ["state"]
+)
+REEMBEDDING_EMBEDDED = Counter(
+    "faq_reembedding_embedded_total",
+    "FAQs re-embedded with a new embedding model"
+)
+REEMBEDDING_RATE = Gauge(
+    "faq_reembedding_rows_per_second",
+    "Re-embedding throughput of the running job"
+)
+
+_faqs = FAQ.__table__
+
+LEASE_NAME = "faq_reembedding"
+
+
+def _stale(version: str):
+    """FAQs whose embeddings weren't produced by ``version`` (including untagged and unembedded rows)"""
+    return or_(FAQ.embedding_model.is_(None), FAQ.embedding_model != version)
+
+
+class ReembeddingJob:
+    """Moves every FAQ embedding to a new embedding model in the background.
+
+    The new model is loaded next to the serving one. FAQs still tagged with
+    another model are re-embedded in throttled batches (``batch_size`` FAQs,
+    then a ``pause_ms`` pause) on the embedding pool, so chat traffic keeps
+    its share of it. Meanwhile the current model and index keep answering
+    queries. Once the corpus is done a shadow index is built from the new
+    vectors, and the serving model and index are switched in one step. A last
+    pass picks up FAQs edited with the old model while the job ran.
+
+    Each batch is written only where the FAQ's text is unchanged, and only
+    stale rows are selected, so a cancelled job simply resumes on its next run.
+    """
+
+    def __init__(
+        self,
+        ai_service,
+        model_name: str,
+        session_factory=AsyncSessionLocal,
+        batch_size: int = settings.EMBEDDING_REEMBED_BATCH_SIZE,
+        pause_ms: float = settings.EMBEDDING_REEMBED_PAUSE_MS,
+        max_passes: int = 3
+    ):
+        self.ai_service = ai_service
+        self.model_name = model_name
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.pause = pause_ms / 1000.0
+        self.max_passes = max_passes
+        self.state = "pending"
+        self.target_version: Optional[str] = None
+        self.total = 0
+        self.done = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self.state in ("pending", "loading", "embedding", "swapping")
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "model": self.model_name,
+            "target_version": self.target_version,
+            "serving_version": self.ai_service.embedding_model_version,
+            "total": self.total,
+            "done": self.done,
+            "rows_per_second": round(self.rows_per_second, 1),
+            "error": self.error,
+        }
+
+    async def run(self):
+        REEMBEDDING_RUNNING.set(1)
+        self.started_at = time.monotonic()
+        try:
+            self.state = "loading"
+            model, self.target_version = await asyncio.to_thread(self.ai_service.load_embedding_model, self.model_name)
+            if self.target_version == "simple-fallback":
+                # Never overwrite real embeddings with the hash-based fallback
+                raise RuntimeError(f"embedding model {self.model_name} is not available")
+            logger.info(f"Re-embedding FAQs with {self.target_version}")
+
+            self.state = "embedding"
+            for _ in range(self.max_passes):
+                remaining = await self._count_stale()
+                if not remaining:
+                    break
+                self.total = self.done + remaining
+                REEMBEDDING_PROGRESS.labels(state="total").set(self.total)
+                await self._reembed(model)
+
+            self.state = "swapping"
+            await self._swap(model)
+            # FAQs edited through the API before the swap were embedded with the old model
+            self.total = self.done + await self._count_stale()
+            await self._reembed(model, update_index=True)
+            self.state = "done"
+            logger.info(f"Re-embedding finished: {self.done} FAQs in {time.monotonic() - self.started_at:.0f}s")
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error(f"Re-embedding with {self.model_name} failed: {e}")
+        finally:
+            self.finished_at = time.monotonic()
+            REEMBEDDING_RUNNING.set(0)
+            REEMBEDDING_RATE.set(0)
+
+    async def _count_stale(self) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(select(func.count(FAQ.id)).where(_stale(self.target_version)))
+            return result.scalar() or 0
+
+    async def _reembed(self, model, update_index: bool = False):
+        """One pass over the stale FAQs in id order"""
+        last_id = 0
+        while True:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(FAQ.id, FAQ.question, FAQ.answer)
+                    .where(FAQ.id > last_id, _stale(self.target_version))
+                    .order_by(FAQ.id)
+                    .limit(self.batch_size)
+                )
+                rows = result.all()
+            if not rows:
+                return
+
+            texts = [row.question for row in rows] + [row.answer for row in rows]
+            vectors = await self.ai_service.embedding_pool.run(self.ai_service.encode_with, model, texts)
+            updated = await self._write(rows, vectors)
+            if update_index and updated:
+                await self._upsert(updated)
+
+            self.done += len(updated)
+            REEMBEDDING_EMBEDDED.inc(len(updated))
+            REEMBEDDING_PROGRESS.labels(state="done").set(self.done)
+            REEMBEDDING_RATE.set(self.rows_per_second)
+            last_id = rows[-1].id
+            await asyncio.sleep(self.pause)
+
+    async def _write(self, rows, vectors) -> List[int]:
+        """Store new embeddings for FAQs whose text is still what was embedded"""
+        count = len(rows)
+        statement = (
+            _faqs.update()
+            .where(
+                _faqs.c.id == bindparam("faq_id"),
+                _faqs.c.question == bindparam("embedded_question"),
+                _faqs.c.answer == bindparam("embedded_answer"),
+            )
+            .values(
+                question_embedding=bindparam("new_question_embedding"),
+                answer_embedding=bindparam("new_answer_embedding"),
+                embedding_model=bindparam("new_embedding_model"),
+                question_hash=bindparam("new_question_hash"),
+                answer_hash=bindparam("new_answer_hash"),
+            )
+        )
+        params = [
+            {
+                "faq_id": row.id,
+                "embedded_question": row.question,
+                "embedded_answer": row.answer,
+                "new_question_embedding": encode_embedding(vectors[i], model=self.target_version),
+                "new_answer_embedding": encode_embedding(vectors[count + i], model=self.target_version),
+                "new_embedding_model": self.target_version,
+                "new_question_hash": content_hash(row.question),
+                "new_answer_hash": content_hash(row.answer),
+            }
+            for i, row in enumerate(rows)
+        ]
+        async with self.session_factory() as db:
+            await db.execute(statement, params)
+            await db.commit()
+            # Rows edited since they were read keep their tag and come round again
+            result = await db.execute(
+                select(FAQ.id).where(
+                    FAQ.id.in_([row.id for row in rows]),
+                    FAQ.embedding_model == self.target_version
+                )
+            )
+            return list(result.scalars().all())
+
+    async def _upsert(self, faq_ids: List[int]):
+        async with self.session_factory() as db:
+            result = await db.execute(select(FAQ).where(FAQ.id.in_(faq_ids)))
+            for faq in result.scalars().all():
+                self.ai_service.faq_service.index.upsert(faq)
+
+    async def _swap(self, model):
+        """Build the new index off the event loop, then switch model and index together"""
+        index = self.ai_service.faq_service.index
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(FAQ).where(FAQ.status == FAQStatus.PUBLISHED, FAQ.embedding_model == self.target_version)
+            )
+            faqs = result.scalars().all()
+        shadow = FAQEmbeddingIndex(backend=index.backend, path=index.path, min_partition_size=index.min_partition_size)
+        await asyncio.to_thread(shadow.load, faqs, self.target_version, False)
+
+        # No awaits between these: queries see either the old pair or the new one
+        self.ai_service.swap_embedding_model(model, self.model_name)
+        index.replace_with(shadow)
+        await asyncio.to_thread(index.save)
+
+
+_current_job: Optional[ReembeddingJob] = None
+_current_task: Optional[asyncio.Task] = None
+_follow_task: Optional[asyncio.Task] = None
+
+
+def current_job() -> Optional[ReembeddingJob]:
+    return _current_job
+
+
+def _lease(session_factory) -> Lease:
+    return Lease(LEASE_NAME, settings.EMBEDDING_REEMBED_LEASE_SECONDS, session_factory=session_factory)
+
+
+async def start_reembedding(ai_service, session_factory=AsyncSessionLocal) -> ReembeddingJob:
+    """Start a background job moving FAQs to LOCAL_EMBEDDING_MODEL; at most one runs across all workers.
+
+    The job runs under a lease in the database. RuntimeError if this or
+    another worker is already running one. The target always comes from the
+    config, which every worker and restart reads, so they all converge on the
+    same model.
+    """
+    global _current_job, _current_task
+    if _current_job is not None and _current_job.running:
+        raise RuntimeError(f"A re-embedding job for {_current_job.model_name} is already running")
+    lease = _lease(session_factory)
+    if not await lease.acquire():
+        raise RuntimeError("A re-embedding job is already running on another worker")
+    _current_job = ReembeddingJob(ai_service, settings.LOCAL_EMBEDDING_MODEL, session_factory=session_factory)
+    _current_task = asyncio.create_task(_run_leased(_current_job, lease))
+    return _current_job
+
+
+async def _run_leased(job: ReembeddingJob, lease: Lease):
+    """Run the job while renewing its lease; the job is cancelled if the lease is lost"""
+    task = asyncio.current_task()
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(lease.ttl / 3)
+            try:
+                renewed = await lease.renew()
+            except Exception as e:
+                logger.warning(f"Could not renew the re-embedding lease: {e}")
+                continue
+            if not renewed:
+                logger.error("Re-embedding lease was taken over by another worker; stopping this job")
+                task.cancel()
+                return
+
+    renewing = asyncio.create_task(heartbeat())
+    try:
+        await job.run()
+    finally:
+        renewing.cancel()
+        try:
+            await lease.release()
+        except Exception as e:
+            logger.warning(f"Could not release the re-embedding lease; it lapses in {lease.ttl:.0f}s: {e}")
+
+
+async def _follow(ai_service, session_factory):
+    """On a worker without the lease: once the job elsewhere ends, serve its model and index.
+
+    Only the lease holder loads a second model and writes the shared index
+    files; followers switch over once, after its swap.
+    """
+    lease = _lease(session_factory)
+    while await lease.held_elsewhere():
+        await asyncio.sleep(lease.ttl / 3)
+
+    model, version = await asyncio.to_thread(ai_service.load_embedding_model, settings.LOCAL_EMBEDDING_MODEL)
+    async with session_factory() as db:
+        result = await db.execute(
+            select(func.count(FAQ.id)).where(FAQ.status == FAQStatus.PUBLISHED, _stale(version))
+        )
+        remaining = result.scalar() or 0
+    if remaining:
+        logger.warning(
+            f"Re-embedding on another worker ended with {remaining} FAQs not on {version}; "
+            "keeping the current model (POST /api/v1/faqs/reembed retries)"
+        )
+        return
+
+    if ai_service.embedding_model_version != version:
+        ai_service.swap_embedding_model(model, settings.LOCAL_EMBEDDING_MODEL)
+    async with session_factory() as db:
+        await ai_service.faq_service.load_index(db)
+    logger.info(f"FAQ index reloaded after re-embedding with {version} on another worker")
+
+
+async def resume_if_needed(ai_service, session_factory=AsyncSessionLocal) -> Optional[ReembeddingJob]:
+    """At startup: if stored FAQ embeddings come from another model, keep serving that model and migrate.
+
+    The stored model is loaded as the serving model when it can be, so search
+    quality holds while the job runs. Otherwise search runs on the configured
+    model, and the vector side covers only migrated FAQs until the job finishes.
+    The first worker to take the lease runs the job; the others return None
+    and switch to the new model and index when it is done.
+    """
+    global _follow_task
+    configured = ai_service.embedding_model_version
+    if configured == "simple-fallback":
+        return None
+    async with session_factory() as db:
+        result = await db.execute(
+            select(FAQ.embedding_model, func.count(FAQ.id))
+            .where(FAQ.status == FAQStatus.PUBLISHED, _stale(configured))
+            .group_by(FAQ.embedding_model)
+            .order_by(func.count(FAQ.id).desc())
+        )
+        stale = result.all()
+    if not stale:
+        return None
+
+    stored = stale[0][0]
+    logger.warning(f"{sum(count for _, count in stale)} published FAQs have embeddings from another model (mostly {stored})")
+    if stored and stored != "simple-fallback":
+        try:
+            model, version = await asyncio.to_thread(ai_service.load_embedding_model, stored.split("+")[0])
+            if version == stored:
+                ai_service.swap_embedding_model(model, stored.split("+")[0])
+                async with session_factory() as db:
+                    await ai_service.faq_service.load_index(db)
+        except Exception as e:
+            logger.warning(f"Could not load the stored embedding model {stored}; serving {configured}: {e}")
+    try:
+        return await start_reembedding(ai_service, session_factory)
+    except RuntimeError as e:
+        logger.info(f"{e}; this worker switches over when it is done")
+        _follow_task = asyncio.create_task(_follow(ai_service, session_factory))
+        return None
+
+
+async def shutdown():
+    """Stop a running job; it resumes from the remaining stale FAQs on the next start"""
+    for task in (_current_task, _follow_task):
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
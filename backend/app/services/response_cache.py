@@ -0,0 +1,189 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from prometheus_client import Counter
+from app.config import settings
+from app.services.faq_index import FAQEmbeddingIndex
+import numpy as np
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_REQUESTS = Counter(
+    "response_cache_requests_total",
+    "Chat response cache lookups by result (exact_hit, semantic_hit, miss)",
+    ["result"]
+)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+CacheKey = Tuple[str, str]
+
+
+def normalize_question(text: str) -> str:
+    """Case, whitespace and punctuation-insensitive form of a question"""
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+class _Entry:
+    __slots__ = ("key", "slot", "response", "faq_ids", "version", "expires_at")
+
+    def __init__(self, key: CacheKey, slot: Optional[int], response: Dict[str, Any], faq_ids: List[int], version: int, expires_at: float):
+        self.key = key
+        self.slot = slot
+        self.response = response
+        self.faq_ids = faq_ids
+        self.version = version
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Answers to context-free questions, reused for repeats and near-repeats.
+
+    A lookup first tries the normalized question text, then the most similar
+    cached question embedding of the same language above ``similarity``.
+    Entries remember the FAQ index version they were generated at and the FAQs
+    they drew on; they are dropped once any of those FAQs changes, a FAQ is
+    added in their language, or the index is reloaded. Entries also expire
+    after ``ttl_seconds`` and the least recently used are evicted beyond
+    ``max_entries``.
+    """
+
+    def __init__(
+        self,
+        index: FAQEmbeddingIndex,
+        max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = settings.RESPONSE_CACHE_TTL_SECONDS,
+        similarity: float = settings.RESPONSE_CACHE_SIMILARITY
+    ):
+        self.index = index
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        # Question embeddings live in preallocated slots so a lookup is one matrix-vector product
+        self._vectors: Optional[np.ndarray] = None
+        self._reset_slots()
+
+    async def get(
+        self,
+        question: str,
+        language: str,
+        embed: Optional[Callable[[str], Awaitable[Optional[List[float]]]]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Cached answer for a question, or None.
+
+        ``embed`` produces the question embedding for the similarity tier; it
+        is only called when the exact tier misses, and may return None to skip
+        that tier.
+        """
+        entry = self._entries.get((language, normalize_question(question)))
+        if entry is not None and self._fresh(entry):
+            self._entries.move_to_end(entry.key)
+            RESPONSE_CACHE_REQUESTS.labels(result="exact_hit").inc()
+            return entry.response
+
+        if embed is not None and self._vectors is not None and len(self._entries):
+            embedding = await embed(question)
+            entry = self._most_similar(embedding, language) if embedding is not None else None
+            if entry is not None:
+                self._entries.move_to_end(entry.key)
+                RESPONSE_CACHE_REQUESTS.labels(result="semantic_hit").inc()
+                return entry.response
+
+        RESPONSE_CACHE_REQUESTS.labels(result="miss").inc()
+        return None
+
+    def _most_similar(self, embedding: List[float], language: str) -> Optional[_Entry]:
+        query = self._normalize(embedding)
+        if query is None or query.shape[0] != self._vectors.shape[1]:
+            return None
+        scores = self._vectors @ query
+        scores[self._languages != self._language_codes.get(language, -2)] = -1.0
+        # Walk down from the best match past stale entries
+        best = np.argpartition(-scores, 7)[:8] if scores.size > 8 else np.arange(scores.size)
+        for slot in best[np.argsort(-scores[best])]:
+            if scores[slot] < self.similarity:
+                break
+            entry = self._slot_entries[slot]
+            if entry is not None and self._fresh(entry):
+                return entry
+        return None
+
+    def put(
+        self,
+        question: str,
+        language: str,
+        embedding: Optional[List[float]],
+        response: Dict[str, Any],
+        version: int
+    ):
+        """Cache a generated answer; ``version`` is the FAQ index version it was generated at"""
+        key = (language, normalize_question(question))
+        self._drop(key)
+        while len(self._entries) >= self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+        faq_ids = [faq["id"] for faq in response.get("relevant_faqs", []) if "id" in faq]
+        slot = None
+        query = self._normalize(embedding) if embedding is not None else None
+        if query is not None:
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self._reset_vectors(query.shape[0])
+            slot = self._free_slots.pop()
+            self._vectors[slot] = query
+            self._languages[slot] = self._language_codes.setdefault(language, len(self._language_codes))
+
+        entry = _Entry(key, slot, response, faq_ids, version, time.monotonic() + self.ttl_seconds)
+        self._entries[key] = entry
+        if slot is not None:
+            self._slot_entries[slot] = entry
+
+    def _fresh(self, entry: _Entry) -> bool:
+        if entry.expires_at < time.monotonic() or self.index.changed_since(entry.version, entry.faq_ids, entry.key[0]):
+            self._drop(entry.key)
+            return False
+        return True
+
+    def _drop(self, key: CacheKey):
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.slot is None:
+            return
+        self._vectors[entry.slot] = 0.0
+        self._languages[entry.slot] = -1
+        self._slot_entries[entry.slot] = None
+        self._free_slots.append(entry.slot)
+
+    def _reset_vectors(self, dim: int):
+        """Start a fresh embedding matrix (first use, or the embedding model changed)"""
+        for entry in self._entries.values():
+            entry.slot = None
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._reset_slots()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if vector.ndim != 1 or norm == 0:
+            return None
+        return vector / norm
+
+    def clear(self):
+        self._entries.clear()
+        self._vectors = None
+        self._reset_slots()
+
+    def _reset_slots(self):
+        self._language_codes: Dict[str, int] = {}
+        self._languages = np.full(self.max_entries, -1, dtype=np.int32)
+        self._slot_entries: List[Optional[_Entry]] = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "semantic_entries": self.max_entries - len(self._free_slots),
+        }
@@ -0,0 +1,125 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Set
+from prometheus_client import Counter
+from app.config import settings
+import copy
+import logging
+import re
+import threading
+
+try:
+    from transformers import AutoTokenizer
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+    AutoTokenizer = None
+
+logger = logging.getLogger(__name__)
+
+CHAT_TOKENS = Counter(
+    "chat_tokens_total",
+    "Tokens processed for chat turns by kind (prompt, completion)",
+    ["user_id", "kind", "model"]
+)
+
+# User ids with their own chat_tokens_total series (TOKEN_METRICS_PER_USER)
+_labelled_users: Set[int] = set()
+_labelled_users_lock = threading.Lock()
+
+# Words and individual punctuation marks; close to BPE counts for English text
+_APPROXIMATE_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# Tokens the OpenAI chat format adds per message and to prime the reply
+_CHAT_MESSAGE_OVERHEAD = 3
+_CHAT_REPLY_PRIMING = 3
+
+
+def load_tokenizer(name: str):
+    """Load a fast tokenizer for counting, or None if it isn't available"""
+    if not name or not TRANSFORMERS_AVAILABLE:
+        return None
+    try:
+        return AutoTokenizer.from_pretrained(name, use_fast=True)
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer {name}; token counts are approximate: {e}")
+        return None
+
+
+class TokenCounter:
+    """Counts and truncates text in model tokens.
+
+    Uses the chat model's tokenizer when one is loaded, and a word/punctuation
+    approximation otherwise. Counts are memoized per text, since the same
+    history messages and FAQ answers are counted again on every turn.
+    """
+
+    def __init__(self, tokenizer=None, cache_size: int = settings.TOKEN_COUNT_CACHE_SIZE):
+        # A private copy: fast tokenizers fail when another thread changes
+        # their truncation settings mid-call, as generate's encode does
+        self.tokenizer = copy.deepcopy(tokenizer) if tokenizer is not None else None
+        self._lock = threading.Lock()
+        self._cached_count = lru_cache(maxsize=cache_size)(self._count)
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return self._cached_count(text)
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Prompt tokens of an OpenAI-style chat message list"""
+        return sum(
+            self.count(message.get("content", "")) + _CHAT_MESSAGE_OVERHEAD for message in messages
+        ) + _CHAT_REPLY_PRIMING
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut ``text`` to at most ``max_tokens`` tokens"""
+        if not text or max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.tokenizer is not None:
+            ids = self._encode(text)
+            with self._lock:
+                return self.tokenizer.decode(ids[:max_tokens], skip_special_tokens=True).rstrip() + "…"
+
+        matches = list(_APPROXIMATE_TOKEN.finditer(text))
+        return text[:matches[max_tokens - 1].end()] + "…"
+
+    def _count(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self._encode(text))
+        return len(_APPROXIMATE_TOKEN.findall(text))
+
+    def _encode(self, text: str) -> List[int]:
+        with self._lock:
+            return self.tokenizer.encode(text, add_special_tokens=False)
+
+
+def _user_label(user_id: int) -> str:
+    """Metric label for a user, bounded so the metric can't grow one series per user forever.
+
+    The first TOKEN_METRICS_MAX_USERS users seen by the worker get their own
+    label; everyone after shares "other".
+    """
+    if not settings.TOKEN_METRICS_PER_USER:
+        return "all"
+    with _labelled_users_lock:
+        if user_id not in _labelled_users:
+            if len(_labelled_users) >= settings.TOKEN_METRICS_MAX_USERS:
+                return "other"
+            _labelled_users.add(user_id)
+    return str(user_id)
+
+
+def record_token_usage(user_id: int, ai_response: Dict[str, Any]):
+    """Count a turn's tokens towards the token rate metrics"""
+    user_label = _user_label(user_id)
+    model = ai_response.get("model_used") or "unknown"
+    for kind in ("prompt", "completion"):
+        tokens = ai_response.get(f"{kind}_tokens") or 0
+        if tokens:
+            CHAT_TOKENS.labels(user_id=user_label, kind=kind, model=model).inc(tokens)
@@ -0,0 +1,79 @@
+"""Memory footprint and speed of the local models in each CPU inference mode.
+
+Loads the chat and embedding models once per mode (fp32 and dynamic int8,
+each with and without torch.inference_mode) and reports weight memory, the
+process RSS after loading, generation tokens/sec and embedding texts/sec.
+Use it to pick MODEL_QUANTIZATION and TORCH_NUM_THREADS, and from the RSS,
+how many workers fit on a node.
+
+Usage (from the backend directory):
+    python -m benchmarks.cpu_inference
+    python -m benchmarks.cpu_inference --threads 4 --new-tokens 64
+"""
+import argparse
+import gc
+import time
+
+import torch
+from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer
+
+from app.config import settings
+from app.services.model_loader import (
+    inference_context, load_chat_model, measure_tokens_per_second, model_footprint_bytes,
+    prepare_embedding_model, process_rss_bytes
+)
+
+EMBEDDING_TEXTS = ["How do I reset my password?", "Where can I download my invoices?"] * 32
+
+
+def embeddings_per_second(model) -> float:
+    with inference_context():
+        model.encode(EMBEDDING_TEXTS[:2])
+        start = time.perf_counter()
+        model.encode(EMBEDDING_TEXTS, batch_size=settings.EMBEDDING_BATCH_SIZE)
+        elapsed = time.perf_counter() - start
+    return len(EMBEDDING_TEXTS) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chat-model", default=settings.LOCAL_CHAT_MODEL)
+    parser.add_argument("--embedding-model", default=settings.LOCAL_EMBEDDING_MODEL)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads; 0 keeps the default")
+    parser.add_argument("--new-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.chat_model)
+    print(f"{args.chat_model} + {args.embedding_model}, {torch.get_num_threads()} threads\n")
+    print(f"{'mode':<24}{'chat MB':>9}{'embed MB':>10}{'RSS MB':>9}{'tokens/s':>10}{'embeds/s':>10}")
+
+    for quantization in ("none", "int8"):
+        for use_inference_mode in (False, True):
+            settings.TORCH_INFERENCE_MODE = use_inference_mode
+            chat_model = load_chat_model(args.chat_model, quantization)
+            embedding_model = prepare_embedding_model(SentenceTransformer(args.embedding_model), quantization)
+            rss = process_rss_bytes()
+
+            # One untimed pass so lazy initialization isn't measured
+            measure_tokens_per_second(chat_model, tokenizer, new_tokens=2)
+            tokens_per_second = measure_tokens_per_second(chat_model, tokenizer, new_tokens=args.new_tokens)
+
+            label = f"{'fp32' if quantization == 'none' else quantization}{' + inference_mode' if use_inference_mode else ''}"
+            print(
+                f"{label:<24}"
+                f"{model_footprint_bytes(chat_model) / 2**20:>9.1f}"
+                f"{model_footprint_bytes(embedding_model) / 2**20:>10.1f}"
+                f"{(rss or 0) / 2**20:>9.0f}"
+                f"{tokens_per_second:>10.1f}"
+                f"{embeddings_per_second(embedding_model):>10.1f}"
+            )
+
+            del chat_model, embedding_model
+            gc.collect()
+
+
+if __name__ == "__main__":
+    main()
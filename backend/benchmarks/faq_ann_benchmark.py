@@ -0,0 +1,106 @@
+"""Recall-vs-latency benchmark for the FAQ retrieval index.
+
+Compares the approximate backends (IVF, and FAISS HNSW when installed) with
+exact scoring on a synthetic clustered corpus shaped like FAQ embeddings.
+
+Usage (from the backend directory):
+    python -m benchmarks.faq_ann_benchmark --faqs 100000 --queries 200
+"""
+from types import SimpleNamespace
+from typing import List, Tuple
+import argparse
+import time
+import numpy as np
+
+from app.models.faq import FAQStatus
+from app.services.ann_index import FAISS_AVAILABLE
+from app.services.faq_index import FAQEmbeddingIndex
+
+
+def synthetic_faqs(count: int, dim: int, topics: int, spread: float, seed: int) -> Tuple[list, np.ndarray]:
+    """Clustered question/answer vectors plus noisy queries near random FAQs"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim)).astype(np.float32)
+    topic = rng.integers(0, topics, size=count)
+    questions = centers[topic] + spread * rng.normal(size=(count, dim)).astype(np.float32)
+    answers = questions + 0.5 * rng.normal(size=(count, dim)).astype(np.float32)
+
+    faqs = [
+        SimpleNamespace(
+            id=i + 1,
+            status=FAQStatus.PUBLISHED,
+            language="en",
+            category_id=1,
+            question=f"question {i}",
+            answer=f"answer {i}",
+            question_embedding=questions[i],
+            answer_embedding=answers[i],
+        )
+        for i in range(count)
+    ]
+    return faqs, questions
+
+
+def run(index: FAQEmbeddingIndex, queries: np.ndarray, k: int) -> Tuple[List[List[int]], float]:
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append([hit["id"] for hit in index.search(query, limit=k)])
+    elapsed = time.perf_counter() - start
+    return results, elapsed * 1000 / len(queries)
+
+
+def recall(truth: List[List[int]], found: List[List[int]]) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / max(sum(len(t) for t in truth), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faqs", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=2.0, help="Within-topic noise relative to topic separation")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faqs, questions = synthetic_faqs(args.faqs, args.dim, args.topics, args.spread, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, args.faqs, size=args.queries)
+    queries = questions[picks] + args.spread * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+    print(f"{args.faqs} FAQs, dim {args.dim}, {args.queries} queries, top-{args.k}\n")
+    print(f"{'backend':<24}{'build s':>10}{'ms/query':>12}{'recall':>10}")
+
+    def measure(label: str, backend: str, **overrides):
+        from app.config import settings
+        for name, value in overrides.items():
+            setattr(settings, name, value)
+        index = FAQEmbeddingIndex(backend=backend, path="", min_partition_size=0)
+        start = time.perf_counter()
+        index.load(faqs)
+        build = time.perf_counter() - start
+        found, latency = run(index, queries, args.k)
+        return label, build, latency, found
+
+    label, build, latency, truth = measure("exact", "exact")
+    print(f"{label:<24}{build:>10.2f}{latency:>12.3f}{1.0:>10.3f}")
+
+    for nprobe in args.nprobe:
+        label, build, latency, found = measure(f"ivf nprobe={nprobe}", "ivf", FAQ_IVF_NPROBE=nprobe)
+        print(f"{label:<24}{build:>10.2f}{latency:>12.3f}{recall(truth, found):>10.3f}")
+
+    if FAISS_AVAILABLE:
+        for ef in args.ef_search:
+            label, build, latency, found = measure(f"faiss hnsw ef={ef}", "faiss", FAQ_HNSW_EF_SEARCH=ef)
+            print(f"{label:<24}{build:>10.2f}{latency:>12.3f}{recall(truth, found):>10.3f}")
+    else:
+        print("faiss not installed; skipping HNSW")
+
+
+if __name__ == "__main__":
+    main()
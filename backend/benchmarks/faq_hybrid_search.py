@@ -0,0 +1,127 @@
+"""Latency and relevance of keyword, vector and hybrid FAQ search.
+
+Builds a synthetic corpus where every FAQ has topic words, a clustered
+embedding and one rare identifier (an error code) in its keywords, then runs
+two query sets: exact identifier queries, which embeddings tend to blur, and
+paraphrase queries given as noisy embeddings plus a few topic words. Reports
+ms/query, MRR and recall@k for a substring scan (the old ``search_text``),
+BM25 alone, vectors alone and their reciprocal-rank fusion.
+
+Usage (from the backend directory):
+    python -m benchmarks.faq_hybrid_search --faqs 50000 --queries 200
+"""
+from types import SimpleNamespace
+from typing import Callable, List, Tuple
+import argparse
+import time
+import numpy as np
+
+from app.models.faq import FAQStatus
+from app.services.faq_index import FAQEmbeddingIndex
+from app.services.faq_service import FAQService
+from app.services.lexical_index import LexicalFAQIndex
+
+TOPIC_WORDS = [
+    "password", "invoice", "billing", "account", "refund", "shipping", "order", "login", "email",
+    "subscription", "plan", "upgrade", "export", "report", "team", "invite", "api", "token", "webhook",
+    "integration", "mobile", "notification", "language", "timezone", "security", "backup", "storage",
+]
+
+
+def synthetic_corpus(count: int, dim: int, topics: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim)).astype(np.float32)
+    topic = rng.integers(0, topics, size=count)
+    topic_words = [rng.choice(TOPIC_WORDS, size=3, replace=False) for _ in range(topics)]
+    questions = centers[topic] + 2.0 * rng.normal(size=(count, dim)).astype(np.float32)
+
+    faqs = []
+    for i in range(count):
+        words = " ".join(topic_words[topic[i]])
+        faqs.append(SimpleNamespace(
+            id=i + 1,
+            status=FAQStatus.PUBLISHED,
+            language="en",
+            category_id=1,
+            question=f"What does error E{i:06d} mean for my {words}?",
+            answer=f"Error E{i:06d} appears when the {words} settings are out of date. Refresh them and retry.",
+            keywords=[f"E{i:06d}", *topic_words[topic[i]]],
+            question_embedding=questions[i],
+            answer_embedding=questions[i] + 0.5 * rng.normal(size=dim).astype(np.float32),
+        ))
+    return faqs, questions, centers, topic, topic_words
+
+
+def evaluate(search: Callable[[int], List[int]], targets: np.ndarray, k: int) -> Tuple[float, float, float]:
+    reciprocal_ranks, hits = [], 0
+    start = time.perf_counter()
+    for query, target in enumerate(targets):
+        found = search(query)[:k]
+        rank = found.index(target) + 1 if target in found else 0
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        hits += bool(rank)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / len(targets), float(np.mean(reciprocal_ranks)), hits / len(targets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faqs", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faqs, questions, centers, topic, topic_words = synthetic_corpus(args.faqs, args.dim, args.topics, args.seed)
+    index = FAQEmbeddingIndex(backend="exact", path="")
+    lexical = LexicalFAQIndex()
+    start = time.perf_counter()
+    index.load(faqs)
+    vector_build = time.perf_counter() - start
+    start = time.perf_counter()
+    lexical.load(faqs)
+    lexical_build = time.perf_counter() - start
+    service = FAQService(index, lexical)
+    lowered = [(faq.id, faq.question.lower()) for faq in faqs]
+
+    rng = np.random.default_rng(args.seed + 1)
+    targets = rng.integers(0, args.faqs, size=args.queries)
+    noisy = questions[targets] + 2.0 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    query_sets = {
+        "exact identifier": (
+            [f"E{t:06d}" for t in targets],
+            # An identifier says little to an embedding model: only the topic comes through
+            centers[topic[targets]] + 2.0 * rng.normal(size=noisy.shape).astype(np.float32),
+        ),
+        "paraphrase": (
+            [" ".join(topic_words[topic[t]][:2]) for t in targets],
+            noisy,
+        ),
+    }
+
+    print(f"{args.faqs} FAQs, dim {args.dim}, {args.queries} queries per set, top-{args.k}")
+    print(f"build: vectors {vector_build:.2f}s, BM25 {lexical_build:.2f}s\n")
+    print(f"{'queries':<18}{'method':<16}{'ms/query':>10}{'MRR':>8}{'recall':>8}")
+    candidates = max(args.k, 20)
+    for name, (texts, vectors) in query_sets.items():
+        methods = {
+            "substring scan": lambda q: [faq_id for faq_id, text in lowered if texts[q].lower() in text][:args.k],
+            "bm25": lambda q: [hit["id"] for hit in lexical.search(texts[q], args.k)],
+            "vector": lambda q: [hit["id"] for hit in index.search(vectors[q], limit=args.k)],
+            "hybrid (rrf)": lambda q: [hit["id"] for hit in service._fuse(
+                texts[q],
+                vectors[q],
+                index.search(vectors[q], limit=candidates),
+                lexical.search(texts[q], candidates),
+                args.k
+            )],
+        }
+        for method, search in methods.items():
+            latency, mrr, recall = evaluate(search, targets + 1, args.k)
+            print(f"{name:<18}{method:<16}{latency:>10.3f}{mrr:>8.3f}{recall:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Local generation throughput under concurrency, with and without batching.
+
+Sends ``--concurrency`` prompts at once, first one ``generate`` call at a
+time as the unbatched path does, then through the GenerationScheduler, and
+reports total generated tokens/sec and mean latency for each. Use it to pick
+GENERATION_MAX_BATCH_SIZE and GENERATION_MAX_WAIT_MS.
+
+Usage (from the backend directory):
+    python -m benchmarks.generation_batching
+    python -m benchmarks.generation_batching --concurrency 16 --batch-size 16
+"""
+import argparse
+import asyncio
+import time
+
+import torch
+from transformers import AutoTokenizer
+
+from app.config import settings
+from app.services.generation_scheduler import GenerationScheduler
+from app.services.model_loader import inference_context, load_chat_model
+
+PROMPTS = [
+    "User: How do I reset my password?\nAssistant:",
+    "User: Where can I download my invoices?\nAssistant:",
+    "User: Can I change the email address on my account?\nAssistant:",
+    "User: What payment methods do you accept?\nAssistant:",
+]
+
+
+def run_sequential(model, tokenizer, prompts, new_tokens: int):
+    latencies, tokens = [], 0
+    start = time.perf_counter()
+    with inference_context():
+        for prompt in prompts:
+            inputs = tokenizer(prompt, return_tensors="pt")
+            outputs = model.generate(
+                **inputs, max_new_tokens=new_tokens, do_sample=True, temperature=0.7, pad_token_id=tokenizer.eos_token_id
+            )
+            tokens += outputs.shape[-1] - inputs["input_ids"].shape[-1]
+            # Every request arrived at the start, so latency includes time spent queued
+            latencies.append(time.perf_counter() - start)
+    return tokens, time.perf_counter() - start, sum(latencies) / len(latencies)
+
+
+async def run_batched(scheduler, tokenizer, prompts):
+    start = time.perf_counter()
+
+    async def one(prompt):
+        text = await scheduler.generate(prompt)
+        return len(tokenizer.encode(text)), time.perf_counter() - start
+
+    results = await asyncio.gather(*(one(prompt) for prompt in prompts))
+    elapsed = time.perf_counter() - start
+    return sum(tokens for tokens, _ in results), elapsed, sum(latency for _, latency in results) / len(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chat-model", default=settings.LOCAL_CHAT_MODEL)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=settings.GENERATION_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.GENERATION_MAX_WAIT_MS)
+    parser.add_argument("--new-tokens", type=int, default=settings.GENERATION_MAX_NEW_TOKENS)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads; 0 keeps the default")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.chat_model)
+    model = load_chat_model(args.chat_model)
+    prompts = [PROMPTS[i % len(PROMPTS)] for i in range(args.concurrency)]
+    print(f"{args.chat_model}, {args.concurrency} concurrent prompts, {args.new_tokens} new tokens, {torch.get_num_threads()} threads\n")
+    print(f"{'mode':<28}{'tokens':>8}{'seconds':>9}{'tokens/s':>10}{'mean latency s':>16}")
+
+    def report(label, tokens, elapsed, latency):
+        print(f"{label:<28}{tokens:>8}{elapsed:>9.2f}{tokens / elapsed:>10.1f}{latency:>16.2f}")
+
+    run_sequential(model, tokenizer, prompts[:1], 2)
+    report("sequential generate", *run_sequential(model, tokenizer, prompts, args.new_tokens))
+
+    scheduler = GenerationScheduler(
+        model, tokenizer,
+        max_batch_size=args.batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_new_tokens=args.new_tokens,
+        max_queue=max(args.concurrency, settings.INFERENCE_MAX_QUEUE)
+    )
+    scheduler.start()
+    try:
+        report(f"scheduler (batch {args.batch_size})", *asyncio.run(run_batched(scheduler, tokenizer, prompts)))
+    finally:
+        scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+from app.services.ann_index import FAISS_AVAILABLE, FaissHNSWIndex, IVFIndex, create_ann_index
+from app.models.faq import FAQ, FAQStatus
+from app.services.faq_index import FAQEmbeddingIndex
+
+DIM = 32
+
+
+def normalized(vectors):
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture
+def corpus():
+    """Clustered unit vectors, the shape real question embeddings have"""
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(20, DIM))
+    vectors = centers[rng.integers(0, 20, size=1000)] + 0.3 * rng.normal(size=(1000, DIM))
+    return normalized(vectors)
+
+
+@pytest.fixture
+def queries(corpus):
+    rng = np.random.default_rng(2)
+    return normalized(corpus[rng.choice(len(corpus), 50, replace=False)] + 0.1 * rng.normal(size=(50, DIM)))
+
+
+def make_faqs(vectors):
+    return [
+        FAQ(
+            id=i + 1, category_id=1, language="en", status=FAQStatus.PUBLISHED,
+            question=f"Question {i + 1}", answer=f"Answer {i + 1}",
+            question_embedding=vector, answer_embedding=vector
+        )
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def exact_top(corpus, query, k):
+    return set(np.argsort(-(corpus @ query))[:k].tolist())
+
+
+def recall(ann, corpus, queries, k=10):
+    """Share of the exact top-k ids that the ANN candidates contain"""
+    found = sum(len(exact_top(corpus, query, k) & set(ann.candidates(query, k).tolist())) for query in queries)
+    return found / (k * len(queries))
+
+
+def test_ivf_recall_against_exact(corpus, queries):
+    ann = IVFIndex(nprobe=4)
+    ann.build(np.arange(len(corpus)), [corpus])
+
+    assert recall(ann, corpus, queries) >= 0.95
+    # ...while scoring only a fraction of the corpus
+    assert np.mean([len(ann.candidates(query, 10)) for query in queries]) < 0.25 * len(corpus)
+    # Probing every list is exhaustive
+    ann.nprobe = len(ann.lists)
+    assert recall(ann, corpus, queries) == 1.0
+
+
+def test_ivf_add_remove_and_rebuild_threshold(corpus):
+    ann = IVFIndex(nprobe=4)
+    ann.build(np.arange(100), [corpus[:100]])
+
+    ann.remove(7)
+    assert 7 not in ann.candidates(corpus[7], 10)
+    ann.add(7, [corpus[7]])
+    assert 7 in ann.candidates(corpus[7], 10)
+
+    assert not ann.needs_rebuild
+    for faq_id in range(100, 401):
+        ann.add(faq_id, [corpus[faq_id]])
+    assert ann.needs_rebuild
+
+
+def test_ivf_save_and_load(corpus, tmp_path):
+    ann = IVFIndex(nprobe=4)
+    ann.build(np.arange(200), [corpus[:200]])
+    ann.save(str(tmp_path / "ivf"))
+
+    restored = IVFIndex(nprobe=4)
+    assert restored.load(str(tmp_path / "ivf"), np.arange(200), [corpus[:200]])
+    np.testing.assert_array_equal(restored.centroids, ann.centroids)
+    assert restored.assignments == ann.assignments
+    assert not IVFIndex().load(str(tmp_path / "missing"), np.arange(200), [corpus[:200]])
+
+
+def test_ivf_index_search_matches_exact_backend(corpus, queries):
+    faqs = make_faqs(corpus[:300])
+    exact = FAQEmbeddingIndex(backend="exact", path="")
+    exact.load(faqs, restore=False)
+    ivf = FAQEmbeddingIndex(backend="ivf", path="", min_partition_size=50)
+    ivf.load(faqs, restore=False)
+    assert ivf._partitions[("en", 1)].ann is not None
+
+    matches = sum(
+        [hit["id"] for hit in ivf.search(query, limit=5)] == [hit["id"] for hit in exact.search(query, limit=5)]
+        for query in queries
+    )
+    assert matches >= 0.9 * len(queries)
+
+
+def test_unknown_backend_is_rejected():
+    assert create_ann_index("exact") is None
+    with pytest.raises(ValueError):
+        create_ann_index("annoy")
+
+
+@pytest.mark.skipif(not FAISS_AVAILABLE, reason="faiss is not installed")
+def test_hnsw_recall_against_exact(corpus, queries):
+    ann = FaissHNSWIndex()
+    ann.build(np.arange(len(corpus)), [corpus])
+
+    assert recall(ann, corpus, queries) >= 0.95
+
+
+@pytest.mark.skipif(not FAISS_AVAILABLE, reason="faiss is not installed")
+def test_hnsw_tombstones_and_rebuild_threshold(corpus):
+    ann = FaissHNSWIndex()
+    ann.build(np.arange(100), [corpus[:100]])
+
+    ann.remove(7)
+    assert 7 not in ann.candidates(corpus[7], 10)
+    assert not ann.needs_rebuild
+    for faq_id in range(8, 20):
+        ann.remove(faq_id)
+    assert ann.needs_rebuild
+
+    # Re-adding a removed id leaves its old vectors in the graph
+    fresh = FaissHNSWIndex()
+    fresh.build(np.arange(100), [corpus[:100]])
+    fresh.add(3, [corpus[50]])
+    assert fresh.needs_rebuild
@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+
+from app.api import chat
+from app.auth import get_current_user
+from app.database import get_db
+from app.models.conversation import Message
+from app.models.user import User
+from app.services import chat_store
+from app.services.ai_service import get_ai_service
+from app.services.history_cache import HistoryCache
+from app.services.inference_pool import InferenceOverloadedError
+from app.services.message_writer import MessageWriteBehind
+from sqlalchemy import func, select
+
+
+class FakeAIService:
+    """Streams a fixed reply without loading any model"""
+
+    def __init__(self):
+        self.summarizer = SimpleNamespace(schedule=lambda conversation: None)
+
+    async def stream_response(self, message, conversation_history, user_context=None, language="en"):
+        reply = f"Reply to {message} ({len(conversation_history)} in history)"
+        yield {"type": "token", "content": reply}
+        yield {"type": "done", "content": reply, "tokens_used": 5, "model_used": "fake", "relevant_faqs": []}
+
+
+class OverloadedAIService(FakeAIService):
+    """Rejects every turn the way a saturated inference pool does"""
+
+    async def stream_response(self, message, conversation_history, user_context=None, language="en"):
+        raise InferenceOverloadedError("queue full")
+        yield
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest_asyncio.fixture
+async def writer(session_factory, tmp_path, monkeypatch):
+    writer = MessageWriteBehind(journal_path=str(tmp_path / "journal.jsonl"), session_factory=session_factory)
+    await writer.start()
+    monkeypatch.setattr(chat_store, "message_writer", writer)
+    monkeypatch.setattr(chat_store, "history_cache", HistoryCache(window=chat_store.HISTORY_LIMIT - 1))
+    yield writer
+    await writer.close()
+
+
+@pytest_asyncio.fixture
+async def client(session_factory, writer, monkeypatch):
+    async with session_factory() as db:
+        user = User(email="user@example.com", username="user", hashed_password="x")
+        db.add(user)
+        await db.commit()
+
+    async def get_test_db():
+        async with session_factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_ai_service] = FakeAIService
+    monkeypatch.setattr(chat, "AsyncSessionLocal", session_factory)
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+
+async def send(client, message, conversation_id=None):
+    response = await client.post("/chat/send/stream", json={"message": message, "conversation_id": conversation_id})
+    assert response.status_code == 200
+    events = parse_events(response.text)
+    assert [name for name, _ in events] == ["token", "done"], events
+    return events[-1][1]
+
+
+async def test_stream_second_turn_with_write_behind(client, writer, session_factory):
+    first = await send(client, "hello")
+    conversation_id = first["conversation"]["id"]
+
+    second = await send(client, "and again", conversation_id)
+
+    assert second["conversation"]["id"] == conversation_id
+    assert second["conversation"]["message_count"] == 4
+    assert len(writer.pending(conversation_id)) == 4
+    history = await chat_store.history_cache.get(conversation_id, 4)
+    assert [entry["content"] for entry in history] == [
+        "hello", first["message"]["content"], "and again", second["message"]["content"]
+    ]
+
+    await writer.close()
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Message.id, Message.content).where(Message.conversation_id == conversation_id).order_by(Message.id)
+        )
+        stored = result.all()
+    assert len(stored) == 4
+    # Queued replies were returned with the ids they were stored under
+    assert (first["message"]["id"], first["message"]["content"]) in stored
+    assert (second["message"]["id"], second["message"]["content"]) in stored
+
+
+async def test_overloaded_stream_keeps_user_message(client, session_factory):
+    first = await send(client, "hello")
+    conversation_id = first["conversation"]["id"]
+
+    client._transport.app.dependency_overrides[get_ai_service] = OverloadedAIService
+    response = await client.post("/chat/send/stream", json={"message": "are you there?", "conversation_id": conversation_id})
+    assert [name for name, _ in parse_events(response.text)] == ["error"]
+
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Message.content).where(Message.conversation_id == conversation_id).order_by(Message.id)
+        )
+        stored = list(result.scalars().all())
+    # The first turn is still in the write-behind queue; the unanswered message was written directly
+    assert stored == ["are you there?"]
+    history = await chat_store.history_cache.get(conversation_id, 3)
+    assert [entry["content"] for entry in history] == ["hello", first["message"]["content"], "are you there?"]
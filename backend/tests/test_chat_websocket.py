@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+import asyncio
+import json
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import chat
+from app.config import settings
+from app.services.ai_service import get_ai_service
+
+
+class HeldAIService:
+    """Streams one token per turn, but only once the test releases it"""
+
+    def __init__(self):
+        self.summarizer = SimpleNamespace(schedule=lambda conversation: None)
+        self.release = threading.Event()
+
+    async def stream_response(self, message, conversation_history, user_context=None, language="en"):
+        await asyncio.to_thread(self.release.wait)
+        yield {"type": "token", "content": f"Reply to {message}"}
+
+
+def test_socket_rejects_messages_beyond_the_queue_limit(monkeypatch):
+    ai_service = HeldAIService()
+    user = SimpleNamespace(id=7)
+
+    async def authenticate(websocket, user_id):
+        return user
+
+    async def load_turn(db, user_id, chat_request):
+        return SimpleNamespace(id=1, context=None), []
+
+    monkeypatch.setattr(chat, "_authenticate_websocket", authenticate)
+    monkeypatch.setattr(chat, "load_turn", load_turn)
+    monkeypatch.setattr(settings, "WS_MAX_QUEUED_TURNS", 2)
+
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.dependency_overrides[get_ai_service] = lambda: ai_service
+
+    with TestClient(app) as client, client.websocket_connect("/chat/ws/7") as websocket:
+        # One turn generating and two waiting fill the socket's queue
+        for number in range(4):
+            websocket.send_text(json.dumps({"message": f"message {number}"}))
+        rejected = json.loads(websocket.receive_text())
+        assert rejected["type"] == "error"
+        assert "Too many messages" in rejected["detail"]
+
+        ai_service.release.set()
+        replies = [json.loads(websocket.receive_text()) for _ in range(3)]
+        assert [reply["content"] for reply in replies] == [f"Reply to message {number}" for number in range(3)]
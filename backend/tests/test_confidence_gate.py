@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services.ai_service import AIService
+
+
+class StubFAQService:
+    def __init__(self, results):
+        self.results = results
+        self.index = SimpleNamespace(version=1)
+        self.viewed = []
+
+    async def search_semantic(self, query, limit=5, language="en"):
+        return self.results
+
+    def increment_view_count(self, faq_id):
+        self.viewed.append(faq_id)
+
+
+class GatedAIService(AIService):
+    """Just the pieces of AIService the gate and its callers use; no models are loaded"""
+
+    embedding_model_version = "real-model"
+
+    def __init__(self, results):
+        self.faq_service = StubFAQService(results)
+        self.ai_provider = "openai"
+        self.response_cache = None
+        self.token_counter = SimpleNamespace(count=lambda text: len(text.split()))
+        self.grounding = None
+
+    def _prompt_tokens(self, message, conversation_history, relevant_faqs):
+        return 0
+
+    async def _generate_openai_response(self, message, conversation_history, relevant_faqs):
+        self.grounding = relevant_faqs
+        return "generated reply", None
+
+
+def hit(faq_id, similarity=None):
+    faq = {"id": faq_id, "question": f"Question {faq_id}", "answer": f"Answer {faq_id}"}
+    if similarity is not None:
+        faq["similarity"] = similarity
+    return faq
+
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    monkeypatch.setattr(settings, "FAQ_DIRECT_ANSWER_THRESHOLD", 0.9)
+    monkeypatch.setattr(settings, "FAQ_GROUNDING_THRESHOLD", 0.6)
+
+
+@pytest.mark.parametrize("similarity, tier", [(0.95, "direct"), (0.9, "direct"), (0.75, "grounded"), (0.6, "grounded"), (0.3, "free")])
+def test_tiers_follow_the_top_similarity(similarity, tier):
+    results = [hit(1, 0.2), hit(2, similarity), hit(3, 0.1)]
+
+    chosen, grounding = GatedAIService(results)._confidence_gate(results)
+
+    assert chosen == tier
+    # Hybrid search ranks by fused rank; the most similar FAQ is the one trusted
+    assert grounding == ([] if tier == "free" else [results[1]])
+
+
+def test_unscored_or_fallback_results_pass_through_ungated(monkeypatch):
+    unscored = [hit(1), hit(2)]
+    assert GatedAIService(unscored)._confidence_gate(unscored) == (None, unscored)
+
+    monkeypatch.setattr(GatedAIService, "embedding_model_version", "simple-fallback")
+    scored = [hit(1, 0.99)]
+    assert GatedAIService(scored)._confidence_gate(scored) == (None, scored)
+
+    assert GatedAIService([])._confidence_gate([]) == ("free", [])
+
+
+async def test_direct_tier_answers_without_the_model():
+    service = GatedAIService([hit(1, 0.97), hit(2, 0.5)])
+
+    result = await service.generate_response("How do I reset my password?")
+
+    assert result["content"] == "Answer 1"
+    assert result["model_used"] == "faq-direct"
+    assert result["tokens_used"] == 0
+    assert service.grounding is None
+    assert service.faq_service.viewed == [1, 2]
+
+
+async def test_grounded_and_free_tiers_limit_what_the_model_sees():
+    grounded = GatedAIService([hit(1, 0.7), hit(2, 0.65)])
+    result = await grounded.generate_response("How do I reset my password?")
+    assert result["content"] == "generated reply"
+    assert grounded.grounding == [hit(1, 0.7)]
+    # The reply still lists every retrieved FAQ
+    assert result["relevant_faqs"] == [hit(1, 0.7), hit(2, 0.65)]
+
+    free = GatedAIService([hit(1, 0.4)])
+    await free.generate_response("Tell me a joke")
+    assert free.grounding == []
@@ -0,0 +1,23 @@
+import numpy as np
+
+from app.models.embedding import EmbeddingVector, decode_embedding, embedding_model, encode_embedding
+
+
+def test_header_carries_the_given_model_version():
+    blob = encode_embedding([0.5, 1.0, 2.0], model="all-MiniLM-L6-v2+int8")
+
+    assert embedding_model(blob) == "all-MiniLM-L6-v2+int8"
+    assert decode_embedding(blob).tolist() == [0.5, 1.0, 2.0]
+
+
+def test_unknown_model_is_not_recorded():
+    blob = EmbeddingVector().process_bind_param(np.ones(4, dtype=np.float32), dialect=None)
+
+    assert embedding_model(blob) is None
+    assert decode_embedding(blob).shape == (4,)
+
+
+def test_encoded_blobs_are_stored_as_given():
+    blob = encode_embedding([1.0, 2.0], model="simple-fallback")
+
+    assert EmbeddingVector().process_bind_param(blob, dialect=None) == blob
@@ -0,0 +1,75 @@
+import asyncio
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+
+from app.services import embedding_cache
+from app.services.embedding_cache import EmbeddingCache
+
+
+def vector(i):
+    return np.array([i, 1.0, 2.0], dtype=np.float32)
+
+
+def stored_rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+
+
+async def test_vectors_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(max_bytes=1 << 20, persist_path=path)
+    for i in range(3):
+        cache.put(f"text {i}", "model", vector(i))
+    cache.close()
+
+    cache = EmbeddingCache(max_bytes=1 << 20, persist_path=path)
+    found = await cache.get_many(["text 0", "text 2", "unknown"], "model")
+    assert sorted(found) == ["text 0", "text 2"]
+    np.testing.assert_array_equal(found["text 2"], vector(2))
+    assert await cache.get("text 1", "other-model") is None
+    assert (cache.disk_hits, cache.misses) == (2, 2)
+    cache.close()
+
+
+async def test_store_reads_run_off_the_event_loop(tmp_path, monkeypatch):
+    cache = EmbeddingCache(max_bytes=1 << 20, persist_path=str(tmp_path / "cache.sqlite3"))
+    threads = []
+    load = cache._load
+    monkeypatch.setattr(cache, "_load", lambda keys: threads.append(threading.current_thread()) or load(keys))
+
+    await cache.get("text", "model")
+    assert threads and threads[0] is not threading.main_thread()
+    cache.close()
+
+
+async def test_unwritten_vectors_are_served_after_eviction(tmp_path, monkeypatch):
+    # Keep the writer from flushing so the vectors stay pending
+    monkeypatch.setattr(embedding_cache, "_WRITE_INTERVAL", 60)
+    cache = EmbeddingCache(max_bytes=vector(0).nbytes, persist_path=str(tmp_path / "cache.sqlite3"))
+    cache.put("first", "model", vector(1))
+    cache.put("second", "model", vector(2))
+
+    np.testing.assert_array_equal(await cache.get("first", "model"), vector(1))
+    assert cache.hits == 1
+    cache.close()
+
+
+async def test_writer_prunes_the_store_as_it_grows(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_WRITE_INTERVAL", 0.01)
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(max_bytes=1 << 20, persist_path=path, max_persisted_entries=10)
+    for i in range(30):
+        cache.put(f"text {i}", "model", vector(i))
+        await asyncio.sleep(0.005)
+
+    for _ in range(200):
+        if cache.stats()["pending_writes"] == 0 and stored_rows(path) <= 11:
+            break
+        await asyncio.sleep(0.01)
+    else:
+        pytest.fail("the store was not pruned while the cache was open")
+    cache.close()
+    assert stored_rows(path) == 10
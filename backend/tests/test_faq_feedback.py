@@ -0,0 +1,73 @@
+from sqlalchemy import func, select
+import pytest
+
+from app.models.faq import FAQ, FAQCategory, FAQFeedbackEntry, FAQStatus
+from app.models.user import User
+from app.services.faq_counters import FAQCounterAggregator
+from app.services.faq_index import FAQEmbeddingIndex
+from app.services.faq_service import FAQService
+from app.services.lexical_index import LexicalFAQIndex
+
+
+@pytest.fixture
+def counters(session_factory):
+    return FAQCounterAggregator(session_factory=session_factory)
+
+
+@pytest.fixture
+def faq_service(tmp_path, counters):
+    return FAQService(FAQEmbeddingIndex(backend="exact", path=str(tmp_path / "index")), LexicalFAQIndex(), counters)
+
+
+@pytest.fixture
+async def faq_id(session_factory):
+    async with session_factory() as db:
+        db.add(FAQCategory(id=1, name="General", slug="general"))
+        db.add_all([
+            User(id=user_id, email=f"user{user_id}@example.com", username=f"user{user_id}", hashed_password="x")
+            for user_id in (1, 2)
+        ])
+        faq = FAQ(category_id=1, question="How?", answer="Like this.", slug="how", status=FAQStatus.PUBLISHED)
+        db.add(faq)
+        await db.commit()
+        return faq.id
+
+
+async def counts(session_factory, faq_id):
+    async with session_factory() as db:
+        faq = await db.get(FAQ, faq_id)
+        return faq.helpful_count, faq.not_helpful_count
+
+
+async def test_repeated_votes_count_once_per_user(session_factory, faq_service, counters, faq_id):
+    async with session_factory() as db:
+        for _ in range(3):
+            await faq_service.record_feedback(db, faq_id, 1, True)
+        await faq_service.record_feedback(db, faq_id, 2, True, "Clear answer")
+    await counters.flush()
+
+    assert await counts(session_factory, faq_id) == (2, 0)
+    async with session_factory() as db:
+        assert await db.scalar(select(func.count()).select_from(FAQFeedbackEntry)) == 2
+        entry = await db.scalar(select(FAQFeedbackEntry).where(FAQFeedbackEntry.user_id == 2))
+        assert entry.feedback_text == "Clear answer"
+
+
+async def test_changed_vote_moves_between_counts(session_factory, faq_service, counters, faq_id):
+    async with session_factory() as db:
+        await faq_service.record_feedback(db, faq_id, 1, True)
+        await counters.flush()
+        await faq_service.record_feedback(db, faq_id, 1, False, "Out of date")
+    await counters.flush()
+
+    assert await counts(session_factory, faq_id) == (0, 1)
+    async with session_factory() as db:
+        entry = await db.scalar(select(FAQFeedbackEntry))
+        assert (entry.is_helpful, entry.feedback_text) == (False, "Out of date")
+
+
+async def test_unknown_faq_is_not_recorded(session_factory, faq_service, counters, faq_id):
+    async with session_factory() as db:
+        assert await faq_service.record_feedback(db, faq_id + 1, 1, True) is None
+        assert await db.scalar(select(func.count()).select_from(FAQFeedbackEntry)) == 0
+    assert not counters._pending
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.models.faq import FAQ, FAQStatus
+from app.services.faq_index import FAQEmbeddingIndex
+
+DIM = 16
+
+
+def make_faqs(vectors, start=1):
+    return [
+        FAQ(
+            id=start + i, category_id=1, language="en", status=FAQStatus.PUBLISHED,
+            question=f"Question {start + i}", answer=f"Answer {start + i}",
+            question_embedding=vector, answer_embedding=vector
+        )
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def exact_ids(vectors, query, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return list(np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:k] + 1)
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(48, DIM)).astype(np.float32)
+
+
+async def test_searches_stay_exact_while_ann_rebuilds_off_the_loop(vectors, monkeypatch):
+    index = FAQEmbeddingIndex(backend="ivf", path="", min_partition_size=8)
+    index.load(make_faqs(vectors[:8]))
+    built_on = []
+    build = index._built_ann
+    monkeypatch.setattr(
+        index, "_built_ann", lambda *args, **kwargs: built_on.append(threading.current_thread()) or build(*args, **kwargs)
+    )
+
+    # Growing the partition past 4x its trained size makes the IVF lists due for retraining
+    for faq in make_faqs(vectors[8:], start=9):
+        index.upsert(faq)
+    partition = index._partitions[("en", 1)]
+    assert partition.ann.needs_rebuild and partition.rebuild is not None
+
+    query = vectors[30]
+    assert [hit["id"] for hit in index.search(query, limit=5)] == exact_ids(vectors, query, 5)
+    assert built_on == []
+
+    await partition.rebuild
+    assert built_on and all(thread is not threading.main_thread() for thread in built_on)
+    assert not partition.ann.needs_rebuild
+    assert partition.ann.trained_size == 48
+
+
+async def test_rebuild_is_redone_when_rows_change_meanwhile(vectors, monkeypatch):
+    index = FAQEmbeddingIndex(backend="ivf", path="", min_partition_size=8)
+    index.load(make_faqs(vectors[:8]))
+    started, proceed = threading.Event(), threading.Event()
+    builds = []
+    build = index._built_ann
+
+    def held_build(key, ids, *args, **kwargs):
+        builds.append(len(ids))
+        if len(builds) == 1:
+            started.set()
+            proceed.wait(5)
+        return build(key, ids, *args, **kwargs)
+
+    monkeypatch.setattr(index, "_built_ann", held_build)
+    for faq in make_faqs(vectors[8:40], start=9):
+        index.upsert(faq)
+    partition = index._partitions[("en", 1)]
+    while not started.is_set():
+        await asyncio.sleep(0.01)
+
+    # Written while the first build runs in its thread
+    for faq in make_faqs(vectors[40:], start=41):
+        index.upsert(faq)
+    proceed.set()
+    await partition.rebuild
+
+    assert builds == [40, 48]
+    assert partition.ann.trained_size == 48
+    assert set(partition.ann.assignments) == set(range(1, 49))
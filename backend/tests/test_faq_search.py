@@ -0,0 +1,135 @@
+from sqlalchemy import func, select
+import pytest
+
+from app.config import settings
+
+from app.models.faq import FAQ, FAQCategory, FAQStatus
+from app.services.faq_index import FAQEmbeddingIndex
+from app.services.faq_service import FAQService
+from app.services.inference_pool import EmbeddingUnavailableError
+from app.services.lexical_index import LexicalFAQIndex, tokenize
+
+
+class FailingAIService:
+    """An embedding model that is loaded but fails every encode"""
+
+    embedding_model_version = "real-model"
+
+    async def generate_embeddings(self, text):
+        raise EmbeddingUnavailableError("model crashed")
+
+    async def generate_embeddings_batch(self, texts, cache=True):
+        raise EmbeddingUnavailableError("model crashed")
+
+
+def faq(faq_id, question, answer, language="en", keywords=(), category_id=1, embedding=None, status=FAQStatus.PUBLISHED):
+    return FAQ(
+        id=faq_id, category_id=category_id, question=question, answer=answer, keywords=list(keywords),
+        language=language, status=status, question_embedding=embedding, answer_embedding=embedding
+    )
+
+
+@pytest.fixture
+def faq_service(tmp_path):
+    service = FAQService(FAQEmbeddingIndex(backend="exact", path=str(tmp_path / "index")), LexicalFAQIndex())
+    service.lexical_index.load([
+        faq(1, "How do I reset my password?", "Use the reset link on the login page."),
+        faq(2, "Where is my invoice?", "Invoices are under Billing."),
+    ])
+    service.set_ai_service(FailingAIService())
+    return service
+
+
+async def test_failed_query_embedding_uses_text_search(faq_service):
+    results = await faq_service.search_semantic("reset password", limit=3)
+
+    assert [result["id"] for result in results] == [1]
+    # No similarity, so the confidence gate doesn't treat the match as scored
+    assert "similarity" not in results[0]
+
+
+async def test_failed_embedding_does_not_store_the_faq(session_factory, faq_service):
+    async with session_factory() as db:
+        db.add(FAQCategory(id=1, name="General", slug="general"))
+        await db.commit()
+
+        with pytest.raises(EmbeddingUnavailableError):
+            await faq_service.create_faq(db, {"question": "New?", "answer": "Yes.", "category_id": 1})
+        assert await db.scalar(select(func.count()).select_from(FAQ)) == 0
+
+
+def test_tokenize_by_language():
+    assert tokenize("Where are my Invoices?") == ["invoice"]
+    assert tokenize("Wie ist mein Passwort", "de-AT") == ["passwort"]
+    assert tokenize("密码重置", "zh") == ["密码", "码重", "重置"]
+
+
+def test_bm25_prefers_keyword_and_rare_term_matches():
+    index = LexicalFAQIndex()
+    index.load([
+        faq(1, "Billing overview", "You can change the plan from settings."),
+        faq(2, "Change your plan", "Plans are listed in settings.", keywords=["upgrade"]),
+        faq(3, "Settings", "Everything about settings and the upgrade page."),
+        faq(4, "Draft", "upgrade upgrade upgrade", status=FAQStatus.DRAFT),
+    ])
+
+    # A keyword hit outranks the same word in an answer; drafts aren't indexed
+    assert [hit["id"] for hit in index.search("upgrade")] == [2, 3]
+    # "settings" appears everywhere, so the rarer "plan" decides over repeated "settings"
+    assert [hit["id"] for hit in index.search("plan settings")] == [2, 1, 3]
+    assert index.scores("upgrade", [1, 2]) == {1: 0.0, 2: index.search("upgrade")[0]["lexical_score"]}
+
+
+def test_bm25_keeps_languages_and_categories_apart():
+    index = LexicalFAQIndex()
+    index.load([
+        faq(1, "Reset password", "Use the link."),
+        faq(2, "Reset password", "Nutze den Link.", language="de"),
+        faq(3, "Reset password for admins", "Ask support.", category_id=2),
+    ])
+
+    assert {hit["id"] for hit in index.search("password")} == {1, 3}
+    assert [hit["id"] for hit in index.search("password", category_id=2)] == [3]
+    assert [hit["id"] for hit in index.search("password", language="de")] == [2]
+
+    index.upsert(faq(1, "Reset password", "Use the link.", status=FAQStatus.ARCHIVED))
+    index.remove(3)
+    assert index.search("password") == []
+    assert len(index) == 1
+
+
+@pytest.fixture
+def hybrid_service(tmp_path):
+    # Vectors make the FAQs progressively closer to the query [1, 0]
+    faqs = [
+        faq(1, "Close account", "Closing removes the account.", embedding=[0.2, 1.0]),
+        faq(2, "Rename account", "Names change with the account.", embedding=[0.6, 1.0]),
+        faq(3, "Account email", "Updates reach the account.", embedding=[1.0, 0.3]),
+        faq(4, "Export data", "Download an archive of everything.", embedding=[1.0, 0.1]),
+    ]
+    index = FAQEmbeddingIndex(backend="exact", path=str(tmp_path / "index"))
+    index.load(faqs)
+    service = FAQService(index, LexicalFAQIndex())
+    service.lexical_index.load(faqs)
+    return service
+
+
+def test_fuse_shares_ranks_between_tied_lexical_scores(hybrid_service):
+    query = [1.0, 0.0]
+    vector_hits = hybrid_service.index.search(query, limit=2)
+    lexical_hits = hybrid_service.lexical_index.search("account", limit=3)
+    # "account" matches FAQs 1-3 equally often in equally long documents
+    assert [hit["id"] for hit in vector_hits] == [4, 3]
+    assert len({round(hit["lexical_score"], 9) for hit in lexical_hits}) == 1
+
+    fused = hybrid_service._fuse("account", query, vector_hits, lexical_hits, limit=4)
+
+    # Tied lexical scores all count as rank 1, so the vector order decides among FAQs 1-3
+    assert [hit["id"] for hit in fused] == [3, 2, 1, 4]
+    k = settings.FAQ_RRF_K
+    by_id = {hit["id"]: hit for hit in fused}
+    assert by_id[3]["rrf_score"] == pytest.approx(1 / (k + 2) + 1 / (k + 1))
+    assert by_id[1]["rrf_score"] == pytest.approx(1 / (k + 4) + 1 / (k + 1))
+    assert by_id[4]["rrf_score"] == pytest.approx(1 / (k + 1))
+    # Lexical-only candidates get their vector similarity for the confidence gate
+    assert by_id[1]["similarity"] == pytest.approx(hybrid_service.index.similarities(query, [1])[1])
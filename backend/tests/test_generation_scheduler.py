@@ -0,0 +1,153 @@
+from types import SimpleNamespace
+import asyncio
+import threading
+import time
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from app.services.generation_scheduler import GenerationScheduler  # noqa: E402
+from app.services.inference_pool import InferenceOverloadedError  # noqa: E402
+
+VOCAB = 10
+EOS = 9
+
+
+class LetterTokenizer:
+    """One lowercase letter per token; ``j`` is end of sequence"""
+
+    eos_token_id = EOS
+    pad_token_id = None
+
+    def encode(self, text):
+        return [ord(char) - ord("a") for char in text]
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(ord("a") + token) for token in ids if not (skip_special_tokens and token == EOS))
+
+
+def next_token(total):
+    return 1 + total % (VOCAB - 1)
+
+
+def reference(prompt, max_new_tokens):
+    """What a single, unbatched sequence generates"""
+    tokens = LetterTokenizer().encode(prompt)
+    generated = []
+    while len(generated) < max_new_tokens:
+        token = next_token(sum(tokens) + sum(generated))
+        if token == EOS:
+            break
+        generated.append(token)
+    return LetterTokenizer().decode(generated)
+
+
+class SumModel:
+    """A one-layer causal LM whose next token depends on every token it attends to.
+
+    The cache stores each position's token id, so left padding, merged
+    batches or dropped columns that don't line up with the attention mask
+    produce a different continuation than ``reference``.
+    """
+
+    def __init__(self, step_seconds=0.0, hold=None):
+        self.step_seconds = step_seconds
+        self.hold = hold
+        self.batch_sizes = []
+
+    def __call__(self, input_ids, attention_mask, position_ids, past_key_values=None, use_cache=True):
+        if self.hold is not None:
+            self.hold.wait(5)
+        time.sleep(self.step_seconds)
+        self.batch_sizes.append(input_ids.shape[0])
+        new = input_ids[:, None, :, None].float()
+        keys = new if past_key_values is None else torch.cat([past_key_values[0][0], new], dim=2)
+        assert attention_mask.shape == keys.shape[:1] + keys.shape[2:3]
+
+        total = (keys[:, 0, :, 0] * attention_mask).sum(dim=1).long()
+        logits = torch.full((input_ids.shape[0], input_ids.shape[1], VOCAB), -1e9)
+        logits[torch.arange(input_ids.shape[0]), -1, next_token(total)] = 0.0
+        return SimpleNamespace(logits=logits, past_key_values=((keys, keys),))
+
+
+def scheduler_for(model, **kwargs):
+    options = {"max_batch_size": 4, "max_wait_ms": 20, "max_new_tokens": 12, "max_queue": 16, "temperature": 0}
+    options.update(kwargs)
+    scheduler = GenerationScheduler(model, LetterTokenizer(), **options)
+    scheduler.start()
+    return scheduler
+
+
+async def test_batched_prompts_match_unbatched_generation():
+    model = SumModel()
+    scheduler = scheduler_for(model)
+    prompts = ["abc", "hello", "ai", "fedcba"]
+    try:
+        outputs = await asyncio.gather(*(scheduler.generate(prompt) for prompt in prompts))
+    finally:
+        scheduler.shutdown()
+
+    assert outputs == [reference(prompt, 12) for prompt in prompts]
+    # All four were prefilled together after the wait for company
+    assert model.batch_sizes[0] == 4
+
+
+async def test_prompts_join_and_leave_a_running_batch():
+    model = SumModel(step_seconds=0.005)
+    scheduler = scheduler_for(model, max_wait_ms=0, max_new_tokens=30)
+    try:
+        first = asyncio.create_task(scheduler.generate("abc", max_new_tokens=30))
+        await asyncio.sleep(0.05)
+        # Admitted mid-generation with a different prompt length; the short one retires first
+        second, third = await asyncio.gather(
+            scheduler.generate("bbbbbbb", max_new_tokens=3),
+            scheduler.generate("cd", max_new_tokens=20)
+        )
+        assert await first == reference("abc", 30)
+    finally:
+        scheduler.shutdown()
+
+    assert second == reference("bbbbbbb", 3)
+    assert third == reference("cd", 20)
+    assert max(model.batch_sizes) == 3
+
+
+async def test_abandoned_stream_is_retired():
+    model = SumModel(step_seconds=0.005)
+    scheduler = scheduler_for(model, max_wait_ms=0, max_new_tokens=200)
+    try:
+        stream = scheduler.stream("abc")
+        assert await stream.__anext__()
+        await stream.aclose()
+        # The model thread drops the sequence and goes idle instead of decoding all 200 tokens
+        calls = len(model.batch_sizes)
+        await asyncio.sleep(0.1)
+        assert len(model.batch_sizes) - calls <= 2
+        assert await scheduler.generate("ab", max_new_tokens=5) == reference("ab", 5)
+    finally:
+        scheduler.shutdown()
+
+
+async def test_full_queue_rejects_and_shutdown_refuses_new_prompts():
+    release = threading.Event()
+    model = SumModel(hold=release)
+    scheduler = scheduler_for(model, max_queue=1)
+    try:
+        # The model thread is held in the first prefill, so the next prompt stays queued
+        running = asyncio.create_task(scheduler.generate("a", max_new_tokens=2))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(scheduler.generate("b", max_new_tokens=2))
+        await asyncio.sleep(0)
+        with pytest.raises(InferenceOverloadedError):
+            await scheduler.generate("c")
+
+        release.set()
+        assert await running == reference("a", 2)
+        assert await queued == reference("b", 2)
+    finally:
+        release.set()
+        scheduler.shutdown()
+
+    with pytest.raises(RuntimeError):
+        await scheduler.generate("d")
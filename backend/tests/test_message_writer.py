@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+import asyncio
+import json
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+import pytest
+
+from app.models.conversation import Conversation, Message, MessageStatus, MessageType
+from app.services.id_blocks import IdAllocator
+from app.services.message_writer import MessageWriteBehind
+
+
+def message(conversation_id, content, offset):
+    return {
+        "conversation_id": conversation_id,
+        "user_id": 1,
+        "content": content,
+        "message_type": MessageType.USER,
+        "status": MessageStatus.SENT,
+        "tokens_used": 0,
+        "model_used": None,
+        "response_time_ms": None,
+        "message_metadata": None,
+        "created_at": datetime(2026, 1, 1) + timedelta(seconds=offset),
+    }
+
+
+@pytest.fixture
+async def conversation_id(session_factory):
+    async with session_factory() as db:
+        conversation = Conversation(user_id=1, title="Chat", message_count=0, total_tokens=0)
+        db.add(conversation)
+        await db.commit()
+        return conversation.id
+
+
+def writer_for(session_factory, tmp_path):
+    return MessageWriteBehind(
+        journal_path=str(tmp_path / "journal.jsonl"), batch_size=10, flush_interval_ms=10,
+        max_attempts=2, session_factory=session_factory
+    )
+
+
+async def stored_messages(session_factory):
+    async with session_factory() as db:
+        return (await db.execute(select(Message.content).order_by(Message.created_at))).scalars().all()
+
+
+async def wait_until(condition, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        if await condition():
+            return
+        await asyncio.sleep(0.01)
+    pytest.fail("condition not reached")
+
+
+async def test_rejected_message_is_set_aside_and_the_rest_written(session_factory, tmp_path, conversation_id):
+    writer = writer_for(session_factory, tmp_path)
+    await writer.start()
+    # content is NOT NULL, so this row fails every time
+    assert writer.enqueue([message(conversation_id, "first", 0), message(conversation_id, None, 1)])
+    assert writer.enqueue([message(conversation_id, "third", 2)])
+
+    async def written():
+        return len(await stored_messages(session_factory)) == 2
+    await wait_until(written)
+    await writer.close()
+
+    assert await stored_messages(session_factory) == ["first", "third"]
+    with open(writer.dead_letter_path, encoding="utf-8") as dead_letters:
+        records = [json.loads(line) for line in dead_letters]
+    assert [record["row"]["content"] for record in records] == [None]
+    async with session_factory() as db:
+        assert (await db.get(Conversation, conversation_id)).message_count == 2
+
+    # Everything was acknowledged, so nothing is replayed
+    writer = writer_for(session_factory, tmp_path)
+    await writer.start()
+    assert not writer._queue
+    await writer.close()
+
+
+async def test_connection_errors_keep_messages_queued(session_factory, tmp_path, conversation_id, monkeypatch):
+    writer = writer_for(session_factory, tmp_path)
+    writer.flush_interval = 0.001
+    await writer.start()
+    attempts = []
+
+    async def unavailable(rows):
+        attempts.append(len(rows))
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(writer, "_write", unavailable)
+    assert writer.enqueue([message(conversation_id, "first", 0), message(conversation_id, "second", 1)])
+
+    async def tried_one_by_one():
+        return len(attempts) > writer.max_attempts
+    await wait_until(tried_one_by_one)
+
+    assert attempts[:writer.max_attempts] == [2] * writer.max_attempts and attempts[writer.max_attempts] == 1
+    assert [row["content"] for row in writer.pending(conversation_id)] == ["first", "second"]
+    assert not (tmp_path / "journal.dead.jsonl").exists()
+
+    # Once the database is back the queue drains in order
+    monkeypatch.undo()
+    await writer.close()
+    assert await stored_messages(session_factory) == ["first", "second"]
+
+
+async def test_reserved_ids_are_disjoint_and_skip_existing_rows(session_factory, conversation_id):
+    async with session_factory() as db:
+        db.add(Message(**message(conversation_id, "already stored", 0)))
+        await db.commit()
+        existing = await db.scalar(select(func.max(Message.id)))
+
+    first = IdAllocator(Message.id, block_size=3, session_factory=session_factory)
+    second = IdAllocator(Message.id, block_size=3, session_factory=session_factory)
+    ids = await first.take(2) + await second.take(2) + await first.take(2)
+
+    assert min(ids) > existing
+    assert len(set(ids)) == len(ids)
+    # The first worker used up its block and reserved the one after the second worker's
+    assert ids == [existing + 1, existing + 2, existing + 4, existing + 5, existing + 3, existing + 7]
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest_asyncio
+
+from app.services.pubsub import FanoutBus, InMemoryBroker
+
+
+class Worker:
+    """One worker's bus plus the frames it delivered to local sockets"""
+
+    def __init__(self, broker, worker_id):
+        self.bus = FanoutBus(broker, worker_id=worker_id, batch_size=4, batch_wait_ms=1, presence_ttl=30)
+        self.users = set()
+        self.delivered = []
+
+    def deliver(self, user_id, frame):
+        self.delivered.append((user_id, frame))
+        return 1
+
+    async def start(self):
+        await self.bus.start(self.deliver, lambda: self.users)
+
+    async def connect(self, user_id):
+        self.users.add(user_id)
+        await self.bus.join(user_id)
+
+    async def disconnect(self, user_id):
+        self.users.discard(user_id)
+        await self.bus.leave(user_id)
+
+
+async def settle(condition=lambda: False, timeout=0.2):
+    """Let the flush loops and broker callbacks run until ``condition`` holds or ``timeout`` passes"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.005)
+
+
+@pytest_asyncio.fixture
+async def workers():
+    broker = InMemoryBroker()
+    first, second = Worker(broker, "worker-1"), Worker(broker, "worker-2")
+    await first.start()
+    await second.start()
+    yield first, second
+    await first.bus.close()
+    await second.bus.close()
+
+
+async def test_frames_reach_the_worker_holding_the_user(workers):
+    first, second = workers
+    await second.connect(7)
+
+    first.bus.publish(7, "hello")
+    first.bus.publish(8, "nobody is connected")
+    await settle(lambda: second.delivered)
+    await settle()
+
+    assert second.delivered == [(7, "hello")]
+    assert first.delivered == []
+
+
+async def test_publisher_does_not_receive_its_own_frames(workers):
+    first, second = workers
+    await first.connect(7)
+    await second.connect(7)
+
+    first.bus.publish(7, "hello")
+    await settle(lambda: second.delivered)
+    await settle()
+
+    assert second.delivered == [(7, "hello")]
+    assert first.delivered == []
+
+
+async def test_frames_of_a_conversation_keep_their_order(workers):
+    first, second = workers
+    await second.connect(7)
+    await second.connect(9)
+
+    # Interleaved streams, larger than one batch
+    sent = []
+    for token in range(25):
+        for user_id, conversation_id in ((7, 1), (7, 2), (9, 3)):
+            frame = json.dumps({"conversation_id": conversation_id, "token": token})
+            sent.append((user_id, frame))
+            first.bus.publish(user_id, frame)
+    await settle(lambda: len(second.delivered) == len(sent))
+
+    assert len(second.delivered) == len(sent)
+    for conversation_id in (1, 2, 3):
+        tokens = [
+            json.loads(frame)["token"] for _, frame in second.delivered
+            if json.loads(frame)["conversation_id"] == conversation_id
+        ]
+        assert tokens == list(range(25))
+
+
+async def test_no_delivery_after_leaving(workers):
+    first, second = workers
+    await second.connect(7)
+    await second.disconnect(7)
+
+    first.bus.publish(7, "too late")
+    await settle()
+
+    assert second.delivered == []
+
+
+async def test_closed_worker_is_unsubscribed():
+    broker = InMemoryBroker()
+    first, second = Worker(broker, "worker-1"), Worker(broker, "worker-2")
+    await first.start()
+    await second.start()
+    await second.connect(7)
+
+    await second.bus.close()
+    assert await broker.members([FanoutBus.presence_key(7)]) == [set()]
+    await broker.publish({FanoutBus.worker_channel("worker-2"): json.dumps([[7, "stale"]])})
+    await settle()
+
+    assert second.delivered == []
+    await first.bus.close()
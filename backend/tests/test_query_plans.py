@@ -0,0 +1,140 @@
+"""EXPLAIN-based regression test for the hot read paths.
+
+Fails if the history window, conversation listing or FAQ retrieval queries
+scan a whole table, or sort rows an index should already return in order.
+By default the plans come from a seeded temporary SQLite database. Set
+QUERY_PLANS_DATABASE_URL to check an existing database instead. On
+PostgreSQL, sequential scans are disabled for the check, so it verifies that
+a usable index exists rather than what the planner picks for a small table.
+"""
+from typing import Callable, List, NamedTuple
+import os
+import re
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models.conversation import Conversation, Message, MessageType
+from app.models.faq import FAQ, FAQCategory, FAQStatus
+from app.models.user import User
+from app.services.chat_store import history_query
+
+
+class HotQuery(NamedTuple):
+    name: str
+    build: Callable
+    ordered: bool  # The index should also provide the ORDER BY
+
+
+HOT_QUERIES = [
+    HotQuery("message history window", lambda: history_query(1), True),
+    HotQuery(
+        "user conversations by recency",
+        lambda: select(Conversation)
+        .where(Conversation.user_id == 1)
+        .order_by(Conversation.last_message_at.desc())
+        .limit(20),
+        True
+    ),
+    HotQuery(
+        "published FAQs by language",
+        lambda: select(FAQ).where(FAQ.status == FAQStatus.PUBLISHED, FAQ.language == "en"),
+        False
+    ),
+    HotQuery(
+        "published FAQs by language and category",
+        lambda: select(FAQ).where(
+            FAQ.status == FAQStatus.PUBLISHED, FAQ.language == "en", FAQ.category_id == 1
+        ),
+        False
+    ),
+]
+
+
+def seed(session: Session, users: int = 20, conversations: int = 10, messages: int = 20, faqs: int = 500):
+    """Enough rows for the planner statistics to be meaningful"""
+    category = FAQCategory(name="General", slug="general")
+    session.add(category)
+    for u in range(users):
+        user = User(email=f"user{u}@chatbot.local", username=f"user{u}", hashed_password="x")
+        session.add(user)
+        session.flush()
+        for c in range(conversations):
+            conversation = Conversation(user_id=user.id, title=f"conversation {c}")
+            session.add(conversation)
+            session.flush()
+            session.add_all(
+                Message(
+                    conversation_id=conversation.id,
+                    user_id=user.id,
+                    content=f"message {m}",
+                    message_type=MessageType.USER if m % 2 == 0 else MessageType.BOT
+                )
+                for m in range(messages)
+            )
+    session.flush()
+    session.add_all(
+        FAQ(
+            category_id=category.id,
+            question=f"question {i}",
+            answer=f"answer {i}",
+            status=FAQStatus.PUBLISHED if i % 3 else FAQStatus.DRAFT,
+            language=("en", "es", "fr")[i % 3]
+        )
+        for i in range(faqs)
+    )
+    session.commit()
+
+
+def explain(session: Session, statement) -> List[str]:
+    dialect = session.get_bind().dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    if dialect.name == "sqlite":
+        return [row[-1] for row in session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    return [row[0] for row in session.execute(text(f"EXPLAIN {sql}"))]
+
+
+def problems(plan: List[str], ordered: bool) -> List[str]:
+    found = []
+    for line in plan:
+        # SQLite: "SCAN messages" is a full scan, "SCAN messages USING INDEX ..." is not
+        if re.match(r"\s*SCAN \w+$", line) or "Seq Scan" in line:
+            found.append(f"full table scan: {line.strip()}")
+        if ordered and ("USE TEMP B-TREE FOR ORDER BY" in line or re.match(r"\s*(->\s*)?Sort\b", line)):
+            found.append(f"sort not served by an index: {line.strip()}")
+    return found
+
+
+@pytest.fixture(scope="module")
+def plan_session(tmp_path_factory):
+    url = os.environ.get("QUERY_PLANS_DATABASE_URL")
+    seeded = not url
+    if seeded:
+        url = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}"
+
+    engine = create_engine(url)
+    with Session(engine) as session:
+        if seeded:
+            Base.metadata.create_all(engine)
+            seed(session)
+            session.execute(text("ANALYZE"))
+        if engine.dialect.name == "postgresql":
+            session.execute(text("SET enable_seqscan = off"))
+        yield session
+    engine.dispose()
+
+
+@pytest.mark.parametrize("query", HOT_QUERIES, ids=[query.name for query in HOT_QUERIES])
+def test_hot_query_uses_an_index(plan_session, query):
+    plan = explain(plan_session, query.build())
+    issues = problems(plan, query.ordered)
+    assert not issues, "\n".join(["plan:", *plan, "problems:", *issues])
+
+
+def test_checker_flags_scans_and_sorts():
+    assert problems(["SCAN messages"], ordered=False) == ["full table scan: SCAN messages"]
+    assert problems(["SEARCH messages USING INDEX ix_messages_conversation_created (conversation_id=?)"], ordered=True) == []
+    assert problems(["USE TEMP B-TREE FOR ORDER BY"], ordered=True)
+    assert problems(["  ->  Seq Scan on faqs"], ordered=False)
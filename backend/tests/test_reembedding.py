@@ -0,0 +1,152 @@
+import asyncio
+from functools import partial
+
+from sqlalchemy import select, text
+import numpy as np
+import pytest
+
+from app.models.embedding import embedding_model
+from app.models.faq import FAQ, FAQCategory, FAQStatus
+from app.services import reembedding
+from app.services.faq_index import FAQEmbeddingIndex
+from app.services.faq_service import FAQService
+from app.services.lease import Lease
+from app.services.lexical_index import LexicalFAQIndex
+
+
+class InlinePool:
+    async def run(self, fn, *args):
+        return fn(*args)
+
+
+class FakeAIService:
+    """Embeds text length plus a per-model marker, so vectors show which model made them"""
+
+    def __init__(self, index_path):
+        self.embedding_model_name = self.embedding_model_version = "old-model"
+        self.embedding_pool = InlinePool()
+        self.faq_service = FAQService(FAQEmbeddingIndex(backend="exact", path=index_path), LexicalFAQIndex())
+        self.faq_service.set_ai_service(self)
+
+    def load_embedding_model(self, name):
+        # Quantized, so the version differs from the configured model name
+        return name, f"{name}+int8"
+
+    def swap_embedding_model(self, model, name):
+        self.embedding_model_name = name
+        self.embedding_model_version = f"{name}+int8"
+
+    def encode_with(self, model, texts):
+        marker = 1.0 if model == "new-model" else 0.0
+        return np.array([[len(text), marker, 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def ai_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(reembedding.settings, "LOCAL_EMBEDDING_MODEL", "new-model")
+    return FakeAIService(str(tmp_path / "index"))
+
+
+async def add_faqs(session_factory, count):
+    async with session_factory() as db:
+        db.add(FAQCategory(id=1, name="General", slug="general"))
+        for i in range(count):
+            vector = np.array([1.0, 0.0, 1.0], dtype=np.float32)
+            db.add(FAQ(
+                category_id=1, question=f"Question {i}", answer=f"Answer {i}", slug=f"faq-{i}",
+                status=FAQStatus.PUBLISHED, question_embedding=vector, answer_embedding=vector,
+                embedding_model="old-model" if i % 3 else None
+            ))
+        await db.commit()
+
+
+async def test_job_moves_corpus_and_index_to_new_model(session_factory, ai_service):
+    await add_faqs(session_factory, 10)
+    async with session_factory() as db:
+        await ai_service.faq_service.load_index(db)
+
+    job = reembedding.ReembeddingJob(ai_service, "new-model", session_factory=session_factory, batch_size=3, pause_ms=0)
+    await job.run()
+
+    assert job.state == "done", job.error
+    assert job.done == job.total == 10
+    assert ai_service.embedding_model_version == "new-model+int8"
+    assert ai_service.faq_service.index.model == "new-model+int8"
+    assert len(ai_service.faq_service.index) == 10
+    async with session_factory() as db:
+        faqs = (await db.execute(select(FAQ))).scalars().all()
+    assert {faq.embedding_model for faq in faqs} == {"new-model+int8"}
+    assert all(faq.question_embedding[1] == 1.0 for faq in faqs)
+
+
+async def test_written_headers_name_the_target_model(session_factory, ai_service):
+    await add_faqs(session_factory, 2)
+    job = reembedding.ReembeddingJob(ai_service, "new-model", session_factory=session_factory, pause_ms=0)
+    await job.run()
+
+    async with session_factory() as db:
+        blobs = (await db.execute(text("SELECT question_embedding FROM faqs"))).scalars().all()
+    assert [embedding_model(bytes(blob)) for blob in blobs] == ["new-model+int8", "new-model+int8"]
+
+
+async def test_refuses_fallback_embedder(session_factory, ai_service):
+    await add_faqs(session_factory, 2)
+    ai_service.load_embedding_model = lambda name: (None, "simple-fallback")
+    job = reembedding.ReembeddingJob(ai_service, "new-model", session_factory=session_factory, pause_ms=0)
+    await job.run()
+
+    assert job.state == "failed"
+    async with session_factory() as db:
+        models = (await db.execute(select(FAQ.embedding_model))).scalars().all()
+    assert "simple-fallback" not in models
+
+
+async def test_start_targets_configured_model(session_factory, ai_service, monkeypatch):
+    job_class = partial(reembedding.ReembeddingJob, session_factory=session_factory, pause_ms=0)
+    monkeypatch.setattr(reembedding, "ReembeddingJob", job_class)
+    monkeypatch.setattr(reembedding, "_current_job", None)
+    await add_faqs(session_factory, 1)
+
+    job = await reembedding.start_reembedding(ai_service, session_factory)
+    with pytest.raises(RuntimeError):
+        await reembedding.start_reembedding(ai_service, session_factory)
+    await reembedding._current_task
+
+    assert job.model_name == "new-model"
+    assert job.state == "done", job.error
+    # The lease is released, so the job can run again
+    assert not await Lease(reembedding.LEASE_NAME, 60, session_factory=session_factory).held_elsewhere()
+
+
+async def test_only_one_worker_runs_the_job(session_factory, ai_service, monkeypatch):
+    monkeypatch.setattr(reembedding, "_current_job", None)
+    await add_faqs(session_factory, 1)
+    other_worker = Lease(reembedding.LEASE_NAME, 60, session_factory=session_factory, owner="other-worker")
+    assert await other_worker.acquire()
+
+    with pytest.raises(RuntimeError, match="another worker"):
+        await reembedding.start_reembedding(ai_service, session_factory)
+    assert reembedding.current_job() is None
+
+
+async def test_waiting_worker_switches_after_the_job(session_factory, ai_service, tmp_path, monkeypatch):
+    monkeypatch.setattr(reembedding.settings, "EMBEDDING_REEMBED_LEASE_SECONDS", 0.1)
+    monkeypatch.setattr(reembedding, "_current_job", None)
+    await add_faqs(session_factory, 4)
+    leader = Lease(reembedding.LEASE_NAME, 60, session_factory=session_factory, owner="other-worker")
+    assert await leader.acquire()
+
+    assert await reembedding.resume_if_needed(ai_service, session_factory) is None
+    assert ai_service.embedding_model_version == "old-model"
+
+    # The other worker runs the job and lets go of the lease
+    job = reembedding.ReembeddingJob(
+        FakeAIService(str(tmp_path / "leader-index")), "new-model", session_factory=session_factory, pause_ms=0
+    )
+    await job.run()
+    await leader.release()
+    await asyncio.wait_for(reembedding._follow_task, 5)
+
+    assert ai_service.embedding_model_version == "new-model+int8"
+    assert ai_service.faq_service.index.model == "new-model+int8"
+    assert len(ai_service.faq_service.index) == 4
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from app.models.faq import FAQ, FAQStatus
+from app.services.faq_index import FAQEmbeddingIndex
+from app.services.response_cache import ResponseCache, normalize_question
+
+DIM = 8
+
+
+def faq(faq_id, language="en", vector=None):
+    vector = vector if vector is not None else np.eye(DIM, dtype=np.float32)[faq_id % DIM]
+    return FAQ(
+        id=faq_id, category_id=1, language=language, status=FAQStatus.PUBLISHED,
+        question=f"Question {faq_id}", answer=f"Answer {faq_id}",
+        question_embedding=vector, answer_embedding=vector
+    )
+
+
+def answer(content, *faq_ids):
+    return {"content": content, "relevant_faqs": [{"id": faq_id} for faq_id in faq_ids]}
+
+
+def embedder(vectors):
+    """An ``embed`` callback that records the questions it was asked to embed"""
+    calls = []
+
+    async def embed(question):
+        calls.append(question)
+        return vectors.get(question)
+
+    embed.calls = calls
+    return embed
+
+
+@pytest.fixture
+def index():
+    index = FAQEmbeddingIndex(backend="exact", path="")
+    index.load([faq(1), faq(2), faq(3, language="de")])
+    return index
+
+
+@pytest.fixture
+def cache(index):
+    return ResponseCache(index, max_entries=4, ttl_seconds=60, similarity=0.9)
+
+
+def test_normalize_question_ignores_case_spacing_and_punctuation():
+    assert normalize_question("  How do I RESET my password?! ") == "how do i reset my password"
+
+
+async def test_exact_tier_matches_normalized_text_without_embedding(cache, index):
+    cache.put("How do I reset my password?", "en", None, answer("Use the link", 1), index.version)
+    embed = embedder({})
+
+    assert (await cache.get("how do i reset   my password", "en", embed))["content"] == "Use the link"
+    assert embed.calls == []
+    assert await cache.get("how do i reset my password", "de", embed) is None
+
+
+async def test_semantic_tier_matches_near_questions_of_the_same_language(cache, index):
+    stored = np.ones(DIM, dtype=np.float32)
+    near = stored + 0.1 * np.eye(DIM, dtype=np.float32)[0]
+    far = np.eye(DIM, dtype=np.float32)[0]
+    cache.put("How do I reset my password?", "en", stored.tolist(), answer("Use the link", 1), index.version)
+    embed = embedder({"Forgot my password": near.tolist(), "Something else": far.tolist()})
+
+    assert (await cache.get("Forgot my password", "en", embed))["content"] == "Use the link"
+    assert await cache.get("Something else", "en", embed) is None
+    assert await cache.get("Forgot my password", "de", embed) is None
+    # No embedding (e.g. the model is unavailable) skips the similarity tier
+    assert await cache.get("Unknown question", "en", embedder({})) is None
+
+
+async def test_changed_faq_invalidates_answers_that_used_it(cache, index):
+    cache.put("first", "en", None, answer("One", 1), index.version)
+    cache.put("second", "en", None, answer("Two", 2), index.version)
+
+    index.upsert(faq(1, vector=np.ones(DIM, dtype=np.float32)))
+
+    assert await cache.get("first", "en") is None
+    assert (await cache.get("second", "en"))["content"] == "Two"
+
+
+async def test_new_faq_invalidates_answers_in_its_language_only(cache, index):
+    cache.put("english", "en", None, answer("One", 1), index.version)
+    cache.put("german", "de", None, answer("Drei", 3), index.version)
+
+    index.upsert(faq(4))
+
+    assert await cache.get("english", "en") is None
+    assert (await cache.get("german", "de"))["content"] == "Drei"
+
+
+async def test_reload_invalidates_everything(cache, index):
+    cache.put("german", "de", None, answer("Drei", 3), index.version)
+
+    index.load([faq(1), faq(2), faq(3, language="de")])
+
+    assert await cache.get("german", "de") is None
+
+
+async def test_expired_and_least_recently_used_entries_are_dropped(index):
+    expired = ResponseCache(index, max_entries=4, ttl_seconds=-1)
+    expired.put("question", "en", None, answer("Old"), index.version)
+    assert await expired.get("question", "en") is None
+
+    cache = ResponseCache(index, max_entries=2, ttl_seconds=60)
+    cache.put("a", "en", [1.0] * DIM, answer("A"), index.version)
+    cache.put("b", "en", [1.0] * DIM, answer("B"), index.version)
+    await cache.get("a", "en")
+    cache.put("c", "en", [1.0] * DIM, answer("C"), index.version)
+
+    assert await cache.get("b", "en") is None
+    assert [(await cache.get(question, "en"))["content"] for question in ("a", "c")] == ["A", "C"]
+    assert cache.stats()["semantic_entries"] == 2
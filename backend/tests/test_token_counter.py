@@ -0,0 +1,30 @@
+from prometheus_client import REGISTRY
+
+from app.services import token_counter
+from app.services.token_counter import record_token_usage
+
+
+def tokens(user_label, model):
+    return REGISTRY.get_sample_value(
+        "chat_tokens_total", {"user_id": user_label, "kind": "prompt", "model": model}
+    ) or 0
+
+
+def test_per_user_labels_are_off_by_default():
+    record_token_usage(1, {"model_used": "default-labels", "prompt_tokens": 5})
+    assert tokens("all", "default-labels") == 5
+    assert tokens("1", "default-labels") == 0
+
+
+def test_per_user_labels_are_bounded(monkeypatch):
+    monkeypatch.setattr(token_counter.settings, "TOKEN_METRICS_PER_USER", True)
+    monkeypatch.setattr(token_counter.settings, "TOKEN_METRICS_MAX_USERS", 2)
+    monkeypatch.setattr(token_counter, "_labelled_users", set())
+
+    for user_id in (1, 2, 3, 4, 1):
+        record_token_usage(user_id, {"model_used": "bounded-labels", "prompt_tokens": 10})
+
+    assert tokens("1", "bounded-labels") == 20
+    assert tokens("2", "bounded-labels") == 10
+    assert tokens("other", "bounded-labels") == 20
+    assert tokens("3", "bounded-labels") == 0